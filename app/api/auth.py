@@ -1,4 +1,4 @@
-from datetime import datetime, timedelta, timezone
+from datetime import timedelta
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlmodel import Session
@@ -12,6 +12,7 @@ from ..core.auth import (
 from ..core.config import settings
 from ..core.database import get_session
 from ..models import Token, User, UserLogin, UserRead, UserUpdate
+from ..models.utils import utc_now
 
 router = APIRouter(prefix='/auth', tags=['authentication'])
 
@@ -63,8 +64,7 @@ def update_me(
     for key, value in user_data_dict.items():
         setattr(current_user, key, value)
 
-    current_user.updated_at = datetime.now(timezone.utc)
+    current_user.updated_at = utc_now()
     session.add(current_user)
     session.commit()
-    session.refresh(current_user)
     return current_user
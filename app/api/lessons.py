@@ -1,15 +1,52 @@
-from datetime import datetime, timezone
-from typing import List, Optional
+import csv
+import io
+import json
+import re
+import time
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import AsyncIterator, Iterator, List, Literal, Optional
 
 import httpx
-from fastapi import APIRouter, Depends, HTTPException
+import orjson
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
 from fastapi.params import Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import column, delete, distinct, func, insert, literal, literal_column, or_, table, update
+from sqlalchemy.orm import aliased, load_only, selectinload
 from sqlmodel import Session, select
 
 from ..core.auth import get_current_active_user
 from ..core.config import settings
 from ..core.database import get_session
-from ..models import Company, Lesson, LessonCreate, LessonRead, LessonStudent, LessonTutor, LessonUpdate, Student, User
+from ..core.etags import etag_not_modified, make_etag
+from ..core.events import EventBroker, get_event_broker
+from ..core.responses import APIResponse, direct_response, negotiated_media_type
+from ..core.tags import lesson_ids_with_tag, set_lesson_tags
+from ..models import (
+    Company,
+    Lesson,
+    LessonBulkCreateResult,
+    LessonBulkError,
+    LessonChanges,
+    LessonCreate,
+    LessonRead,
+    LessonSearchResults,
+    LessonStatus,
+    LessonStudent,
+    LessonTag,
+    LessonTutor,
+    LessonUpdate,
+    Student,
+    Tag,
+    TagCount,
+    TagKind,
+    Tombstone,
+    TombstoneType,
+    User,
+)
+from ..models.lesson import LESSON_SEARCH_COLUMNS
+from ..models.utils import as_naive_utc, utc_now
 
 router = APIRouter(prefix='/lessons', tags=['lessons'])
 
@@ -43,25 +80,246 @@ def _get_lessons_for_user(session: Session, current_user: User, base_query=None)
         return base_query.where(Lesson.company_id.in_(current_user.company_ids))
 
 
-def build_lesson_read(lesson: Lesson) -> LessonRead:
-    """Helper function to build LessonRead with computed fields"""
-    tutorcruncher_url = None
-    if lesson.company and lesson.tc_path and lesson.company.tutorcruncher_domain:
-        tutorcruncher_url = f'{lesson.company.tutorcruncher_domain.rstrip("/")}/{lesson.tc_path.lstrip("/")}'
+def _get_lesson_tombstones_for_user(current_user: User, base_query):
+    """Scope a query on lesson tombstones in the same way _get_lessons_for_user scopes the lessons themselves."""
+    base_query = base_query.where(Tombstone.object_type == TombstoneType.LESSON)
+    if current_user.is_tutor:
+        return base_query.where(Tombstone.tutor_id == current_user.id)
+    else:
+        assert current_user.is_admin
+        if not current_user.company_ids:
+            return base_query
+        return base_query.where(Tombstone.company_id.in_(current_user.company_ids))
+
+
+def _student_lessons_query(session: Session, current_user: User, student_id: int):
+    """The lessons of a student that the user can see, raising a 404 if the student doesn't exist"""
+    # Check if student exists
+    student = session.get(Student, student_id)
+    if not student:
+        raise HTTPException(status_code=404, detail='Student not found')
+
+    # Query lessons through junction table
+    base_query = (
+        select(Lesson)
+        .join(LessonStudent, Lesson.id == LessonStudent.lesson_id)
+        .where(LessonStudent.student_id == student_id)
+    )
+    # Apply user-based filtering
+    return _get_lessons_for_user(session, current_user, base_query)
+
+
+def _record_lesson_tombstones(session: Session, lesson_ids):
+    """Record the deletion of lessons with one INSERT ... SELECT, before the lessons and their tutors are deleted."""
+    tombstone_query = (
+        select(
+            literal(TombstoneType.LESSON, Tombstone.__table__.c.object_type.type),
+            Lesson.id,
+            Lesson.company_id,
+            LessonTutor.tutor_id,
+            literal(utc_now(), Tombstone.__table__.c.deleted_at.type),
+        )
+        .outerjoin(LessonTutor, LessonTutor.lesson_id == Lesson.id)
+        .where(Lesson.id.in_(lesson_ids))
+    )
+    session.execute(
+        insert(Tombstone).from_select(
+            ['object_type', 'object_id', 'company_id', 'tutor_id', 'deleted_at'], tombstone_query
+        )
+    )
+
+
+def _touch_students(session: Session, student_ids):
+    """
+    Mark students as changed when a roster they're on changes, since lessons_completed is part of what the student
+    change feed and ETags cover. student_ids can be a list of ids or a select of them.
+    """
+    session.execute(update(Student).where(Student.id.in_(student_ids)).values(updated_at=utc_now()))
+
+
+def _filter_lessons(
+    query, start_after: Optional[datetime], start_before: Optional[datetime], status: Optional[LessonStatus]
+):
+    """
+    Apply the date range and status filters used by the lesson listings. start_after is inclusive and start_before
+    is exclusive, so consecutive ranges (e.g. weeks) don't overlap. Results are ordered by start_dt, which the
+    (company_id, start_dt) and (status, start_dt) indexes can serve directly.
+    """
+    if start_after:
+        query = query.where(Lesson.start_dt >= as_naive_utc(start_after))
+    if start_before:
+        query = query.where(Lesson.start_dt < as_naive_utc(start_before))
+    if status:
+        query = query.where(Lesson.status == status)
+    return query.order_by(Lesson.start_dt, Lesson.id)
+
+
+def _lessons_version(session: Session, query) -> tuple:
+    """
+    A cheap fingerprint of the lessons a query matches, from a single aggregate query that loads no rows. Lessons
+    bump updated_at whenever they or their roster change, and the students' and company's updated_at cover the
+    details of them embedded in each lesson.
+    """
+    roster = aliased(LessonStudent)
+    roster_student = aliased(Student)
+    lesson_company = aliased(Company)
+    version_query = (
+        query.with_only_columns(
+            func.count(distinct(Lesson.id)),
+            func.max(Lesson.created_at),
+            func.max(Lesson.updated_at),
+            func.max(roster_student.updated_at),
+            func.max(lesson_company.updated_at),
+        )
+        .outerjoin(roster, roster.lesson_id == Lesson.id)
+        .outerjoin(roster_student, roster_student.id == roster.student_id)
+        .outerjoin(lesson_company, lesson_company.id == Lesson.company_id)
+        .order_by(None)
+    )
+    return tuple(session.execute(version_query).one())
+
+
+def _lessons_etag(request: Request, current_user: User, version: tuple) -> str:
+    """
+    ETag for a lesson response, scoped to the URL and the user since both change which lessons are returned, and to
+    the negotiated format since JSON and MessagePack bodies differ
+    """
+    return make_etag(
+        request.url.path,
+        request.url.query,
+        current_user.id,
+        current_user.company_ids,
+        negotiated_media_type(),
+        *version,
+    )
+
+
+def _lesson_events(session: Session, event_type: str, lesson_ids) -> list[dict]:
+    """
+    Build the stream events for existing lessons. Each event carries the lesson's company and tutors, so streams can
+    be scoped in the same way as _get_lessons_for_user without querying the database per event.
+    """
+    rows = session.execute(
+        select(Lesson.id, Lesson.company_id, LessonTutor.tutor_id)
+        .outerjoin(LessonTutor, LessonTutor.lesson_id == Lesson.id)
+        .where(Lesson.id.in_(lesson_ids))
+    ).all()
+    events = {}
+    for lesson_id, company_id, tutor_id in rows:
+        event = events.setdefault(
+            lesson_id, {'type': event_type, 'lesson_id': lesson_id, 'company_id': company_id, 'tutor_ids': []}
+        )
+        if tutor_id is not None:
+            event['tutor_ids'].append(tutor_id)
+    return list(events.values())
+
+
+def _lesson_event_visible(event: dict, current_user: User) -> bool:
+    """Whether a lesson event should be sent to the user, mirroring _get_lessons_for_user"""
+    if current_user.is_tutor:
+        return current_user.id in event['tutor_ids']
+    else:
+        assert current_user.is_admin
+        if not current_user.company_ids:
+            return True
+        return event['company_id'] in current_user.company_ids
+
+
+# Eager loads for everything build_lesson_read uses, so building a response doesn't lazy load row by row
+_lesson_read_options = (
+    selectinload(Lesson.lesson_students).selectinload(LessonStudent.student),
+    selectinload(Lesson.company),
+)
+
+
+# Fields that can be picked with fields=, students are added with include=students
+LESSON_FIELDS = tuple(field for field in LessonRead.model_fields if field != 'students')
+LESSON_INCLUDES = ('students',)
+
+
+def _parse_lesson_fieldset(fields: Optional[str], include: Optional[str]) -> tuple[Optional[list[str]], set[str]]:
+    """
+    Parse the comma separated fields and include query parameters. Returns None for the fields when the full
+    LessonRead shape was asked for, otherwise the fields to return, which always include the id.
+    """
+    includes = {name.strip() for name in (include or '').split(',') if name.strip()}
+    if unknown := includes - set(LESSON_INCLUDES):
+        raise HTTPException(status_code=400, detail=f'Unknown include: {", ".join(sorted(unknown))}')
+    if fields is None:
+        return None, includes
+
+    field_names = list(dict.fromkeys(['id', *(name.strip() for name in fields.split(',') if name.strip())]))
+    if unknown := [name for name in field_names if name not in LESSON_FIELDS]:
+        raise HTTPException(status_code=400, detail=f'Unknown lesson field: {", ".join(unknown)}')
+    return field_names, includes
 
-    # Build the lesson read with students
-    lesson_data = lesson.model_dump(exclude={'company'})
-    lesson_data['students'] = lesson.students  # Use the property to get students
-    return LessonRead(**lesson_data, tutorcruncher_url=tutorcruncher_url)
+
+def _lesson_fieldset_options(fields: list[str], includes: set[str]) -> list:
+    """
+    Loader options for a sparse fieldset, so the columns that weren't asked for (e.g. the JSON analysis lists) are
+    never selected, and students are only loaded when included.
+    """
+    options = [load_only(*(getattr(Lesson, field) for field in fields))]
+    if 'students' in includes:
+        options.append(selectinload(Lesson.lesson_students).selectinload(LessonStudent.student))
+    return options
+
+
+def _sparse_lessons_response(
+    lessons: List[Lesson], fields: list[str], includes: set[str], response: Response
+) -> APIResponse:
+    """Serialize lessons with only the requested fields, which response_model=LessonRead would reject"""
+    rows = []
+    for lesson in lessons:
+        row = {field: getattr(lesson, field) for field in fields}
+        if 'students' in includes:
+            row['students'] = [_build_lesson_student(student) for student in lesson.students]
+        rows.append(row)
+    return direct_response(rows, response)
+
+
+# The fields of the students embedded in LessonRead
+_LESSON_STUDENT_FIELDS = tuple(Student.model_fields)
+
+
+def _build_lesson_student(student: Student) -> dict:
+    return {field: getattr(student, field) for field in _LESSON_STUDENT_FIELDS}
+
+
+def build_lesson_read(lesson: Lesson) -> dict:
+    """
+    Build the LessonRead shape for a lesson as plain data, read straight from the loaded attributes. Endpoints return
+    it with direct_response, so it's built once rather than dumped, validated into LessonRead and serialized again.
+    """
+    data = {field: getattr(lesson, field) for field in LESSON_FIELDS}
+    data['students'] = [_build_lesson_student(student) for student in lesson.students]
+    return data
 
 
 @router.get('/', response_model=List[LessonRead], name='get_lessons')
 def get_lessons(
     student_id: Optional[int] = Query(None, description='Filter by student ID'),
+    start_after: Optional[datetime] = Query(None, description='Only lessons starting at or after this time'),
+    start_before: Optional[datetime] = Query(None, description='Only lessons starting before this time'),
+    status: Optional[LessonStatus] = Query(None, description='Filter by lesson status'),
+    fields: Optional[str] = Query(None, description='Comma separated lesson fields to return, e.g. start_dt,subject'),
+    include: Optional[str] = Query(None, description='Add students to a response that uses fields'),
+    tag: Optional[List[str]] = Query(None, description='Only lessons with all of these tags'),
+    tag_kind: Optional[TagKind] = Query(None, description='Only match tags in this list, e.g. skills_practiced'),
+    *,
+    request: Request,
+    response: Response,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_active_user),
 ):
-    """Get all lessons, optionally filtered by student"""
+    """
+    Get all lessons, optionally filtered by student, start time, status and tags. Responds with 304 Not Modified when
+    If-None-Match matches the current ETag.
+
+    With fields, only those fields (and the id) are selected and returned, and students are only added with
+    include=students. Without fields the full LessonRead is returned.
+    """
+    field_names, includes = _parse_lesson_fieldset(fields, include)
     if student_id:
         # Filter by student using junction table
         base_query = (
@@ -74,23 +332,205 @@ def get_lessons(
 
     # Apply user-based filtering
     query = _get_lessons_for_user(session, current_user, base_query)
-    results = session.exec(query).all()
-    return [build_lesson_read(lesson) for lesson in results]
+    query = _filter_lessons(query, start_after, start_before, status)
+    for name in tag or []:
+        query = query.where(Lesson.id.in_(lesson_ids_with_tag(name, tag_kind)))
+
+    etag = _lessons_etag(request, current_user, _lessons_version(session, query))
+    if not_modified := etag_not_modified(request, response, etag):
+        return not_modified
+
+    if field_names is not None:
+        lessons = session.exec(query.options(*_lesson_fieldset_options(field_names, includes))).all()
+        return _sparse_lessons_response(lessons, field_names, includes, response)
+
+    results = session.exec(query.options(*_lesson_read_options)).all()
+    return direct_response([build_lesson_read(lesson) for lesson in results], response)
+
+
+@router.get('/changes', response_model=LessonChanges, name='get_lesson_changes')
+def get_lesson_changes(
+    since: Optional[datetime] = Query(None, description='Cursor from a previous response, omit for a full sync'),
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Get the lessons created, updated or deleted since a cursor. Pass the returned cursor as since on the next call,
+    so polling clients only download what changed. Changes just before the cursor are sent again, so clients should
+    upsert lessons and apply deletions by id.
+    """
+    base_query = select(Lesson).options(*_lesson_read_options)
+    tombstones = []
+    change_times = []
+    if since:
+        since = as_naive_utc(since)
+        change_times.append(since)
+        # Changes just behind the cursor are sent again, see settings.change_feed_overlap_seconds
+        window_start = since - timedelta(seconds=settings.change_feed_overlap_seconds)
+        base_query = base_query.where(or_(Lesson.created_at >= window_start, Lesson.updated_at >= window_start))
+        tombstone_query = select(Tombstone.object_id, Tombstone.deleted_at).where(Tombstone.deleted_at >= window_start)
+        tombstones = session.exec(_get_lesson_tombstones_for_user(current_user, tombstone_query)).all()
+
+    lessons = session.exec(_get_lessons_for_user(session, current_user, base_query)).all()
+
+    change_times += [lesson.updated_at or lesson.created_at for lesson in lessons]
+    change_times += [deleted_at for _, deleted_at in tombstones]
+    return direct_response(
+        {
+            'cursor': max(change_times, default=None),
+            'lessons': [build_lesson_read(lesson) for lesson in lessons],
+            'deleted_ids': sorted({lesson_id for lesson_id, _ in tombstones}),
+        }
+    )
+
+
+@router.get('/tags', response_model=List[TagCount], name='get_lesson_tags')
+def get_lesson_tags(
+    kind: Optional[TagKind] = Query(None, description='Only count tags in this list, e.g. skills_practiced'),
+    *,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_active_user),
+):
+    """Count the lessons the user can see with each tag, most used first"""
+    lesson_ids = _get_lessons_for_user(session, current_user, select(Lesson.id))
+    query = (
+        select(Tag.name, LessonTag.kind, func.count().label('count'))
+        .join(Tag, Tag.id == LessonTag.tag_id)
+        .where(LessonTag.lesson_id.in_(lesson_ids))
+        .group_by(Tag.name, LessonTag.kind)
+        .order_by(func.count().desc(), Tag.name, LessonTag.kind)
+    )
+    if kind:
+        query = query.where(LessonTag.kind == kind)
+    return direct_response([row._asdict() for row in session.execute(query)])
+
+
+# How much a match in each column counts in SQLite, in line with the Postgres setweight classes
+_LESSON_SEARCH_WEIGHTS = {'topic': 10.0, 'subject': 10.0, 'tutor_tips': 4.0, 'skills_practiced': 4.0, 'notes': 1.0}
+
+
+def _lesson_search_query(session: Session, q: str):
+    """
+    A query for the lessons matching a search with the expression to rank them by, best first. Postgres searches the
+    generated search_vector column, SQLite (tests and local development) its FTS5 index of the same columns.
+    """
+    if session.get_bind().dialect.name == 'postgresql':
+        search_vector = literal_column('lesson.search_vector')
+        ts_query = func.websearch_to_tsquery('english', q)
+        query = select(Lesson).where(search_vector.op('@@')(ts_query))
+        return query, func.ts_rank_cd(search_vector, ts_query).desc()
+
+    # Each word is quoted so FTS5 syntax in the search (AND, NEAR, column filters...) is matched as plain text
+    match = ' '.join(f'"{word}"' for word in re.findall(r'\w+', q))
+    lesson_search = table('lesson_search', column('rowid'))
+    query = (
+        select(Lesson)
+        .join(lesson_search, lesson_search.c.rowid == Lesson.id)
+        .where(literal_column('lesson_search').op('MATCH')(match))
+    )
+    # bm25 scores are negative, lower is a better match
+    return query, func.bm25(
+        literal_column('lesson_search'), *(_LESSON_SEARCH_WEIGHTS[name] for name in LESSON_SEARCH_COLUMNS)
+    )
+
+
+@router.get('/search', response_model=LessonSearchResults, name='search_lessons')
+def search_lessons(
+    q: str = Query(..., min_length=1, description='Words to search lesson topics, subjects, notes and tutor tips for'),
+    limit: int = Query(20, ge=1, le=100, description='Number of lessons to return'),
+    offset: int = Query(0, ge=0, description='Number of lessons to skip'),
+    *,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Search the lessons the user can see by topic, subject, notes, tutor tips and skills practiced, best match first.
+    Pages through the matches with limit and offset, with the total number of matches.
+    """
+    if not re.search(r'\w', q):
+        return direct_response({'total': 0, 'lessons': []})
+
+    base_query, rank = _lesson_search_query(session, q)
+    query = _get_lessons_for_user(session, current_user, base_query)
+    total = session.exec(select(func.count()).select_from(query.subquery())).one()
+    lessons = session.exec(query.options(*_lesson_read_options).order_by(rank, Lesson.id).limit(limit).offset(offset))
+    return direct_response({'total': total, 'lessons': [build_lesson_read(lesson) for lesson in lessons]})
+
+
+_open_lesson_streams = 0
+
+
+async def _lesson_event_stream(
+    event_broker: EventBroker, current_user: User, last_event_id: Optional[str]
+) -> AsyncIterator[str]:
+    """
+    Yield the lesson events visible to the user in the SSE format, starting after last_event_id when a client
+    resumes. A comment is sent as a heartbeat whenever nothing has been sent for a while, so proxies don't close
+    idle connections.
+    """
+    global _open_lesson_streams
+    _open_lesson_streams += 1
+    try:
+        if last_event_id is None or not event_broker.is_valid_id(last_event_id):
+            last_event_id = await event_broker.latest_id()
+        yield 'retry: 5000\n\n'
+        last_sent = time.monotonic()
+        while True:
+            events = await event_broker.read(last_event_id, timeout=settings.lesson_stream_heartbeat_seconds)
+            for event_id, event in events:
+                last_event_id = event_id
+                if _lesson_event_visible(event, current_user):
+                    data = json.dumps({'lesson_id': event['lesson_id']})
+                    yield f'id: {event_id}\nevent: {event["type"]}\ndata: {data}\n\n'
+                    last_sent = time.monotonic()
+            if time.monotonic() - last_sent >= settings.lesson_stream_heartbeat_seconds:
+                yield ': heartbeat\n\n'
+                last_sent = time.monotonic()
+    finally:
+        _open_lesson_streams -= 1
+
+
+@router.get('/stream', name='stream_lesson_events')
+async def stream_lesson_events(
+    last_event_id: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_active_user),
+    event_broker: EventBroker = Depends(get_event_broker),
+):
+    """
+    Stream lesson.created, lesson.updated and lesson.deleted events as server-sent events, for the lessons the user
+    can see. Clients reconnecting with a Last-Event-ID header are sent the events they missed.
+    """
+    # The stream itself takes and releases its slot, so a response that is never iterated doesn't hold one
+    if _open_lesson_streams >= settings.lesson_stream_max_connections:
+        raise HTTPException(status_code=503, detail='Too many open lesson streams, try again later.')
+    return StreamingResponse(
+        _lesson_event_stream(event_broker, current_user, last_event_id),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
 
 
 @router.get('/{lesson_id}', response_model=LessonRead, name='get_lesson')
 def get_lesson(
-    lesson_id: int, session: Session = Depends(get_session), current_user: User = Depends(get_current_active_user)
+    lesson_id: int,
+    request: Request,
+    response: Response,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_active_user),
 ):
-    """Get a specific lesson by ID"""
+    """Get a specific lesson by ID. Responds with 304 Not Modified when If-None-Match matches the current ETag."""
     base_query = select(Lesson).where(Lesson.id == lesson_id)
     query = _get_lessons_for_user(session, current_user, base_query)
-    lesson = session.exec(query).first()
 
-    if not lesson:
+    version = _lessons_version(session, query)
+    if not version[0]:
         raise HTTPException(status_code=404, detail='Lesson not found')
+    if not_modified := etag_not_modified(request, response, _lessons_etag(request, current_user, version)):
+        return not_modified
 
-    return build_lesson_read(lesson)
+    lesson = session.exec(query.options(*_lesson_read_options)).first()
+
+    return direct_response(build_lesson_read(lesson), response)
 
 
 @router.post('/', response_model=LessonRead, name='create_lesson')
@@ -98,12 +538,15 @@ def create_lesson(
     lesson_data: LessonCreate,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_active_user),
+    event_broker: EventBroker = Depends(get_event_broker),
 ):
     """Create a new lesson"""
-    # Validate student existence
-    for student_id in lesson_data.student_ids:
-        student = session.get(Student, student_id)
-        if not student:
+    # Validate student existence with a single query
+    students = []
+    if lesson_data.student_ids:
+        student_ids = list(dict.fromkeys(lesson_data.student_ids))
+        students = session.exec(select(Student).where(Student.id.in_(student_ids))).all()
+        if len(students) != len(student_ids):
             raise HTTPException(status_code=404, detail='Student not found')
 
     # Validate company if provided
@@ -119,28 +562,125 @@ def create_lesson(
     if lesson_data.end_dt <= lesson_data.start_dt:
         raise HTTPException(status_code=400, detail='End date must be after start date.')
 
-    # Create lesson without student_ids (they are not part of the base model)
+    # Create the lesson together with its student and tutor associations so they are inserted in one flush, and
+    # the relationships needed for the response are already populated without a refresh
     lesson_dict = lesson_data.model_dump(exclude={'student_ids'})
-    lesson = Lesson(**lesson_dict)
+    lesson = Lesson(
+        **lesson_dict,
+        lesson_students=[LessonStudent(student=student) for student in students],
+        lesson_tutors=[LessonTutor(tutor_id=current_user.id)],
+    )
     session.add(lesson)
+    session.flush()
+    set_lesson_tags(session, {lesson.id: lesson})
+    if students:
+        _touch_students(session, [student.id for student in students])
     session.commit()
-    session.refresh(lesson)
+    event_broker.publish(
+        [
+            {
+                'type': 'lesson.created',
+                'lesson_id': lesson.id,
+                'company_id': lesson.company_id,
+                'tutor_ids': [current_user.id],
+            }
+        ]
+    )
 
-    # Create junction table entries for each student
-    for student_id in lesson_data.student_ids:
-        student = session.get(Student, student_id)
-        if student:
-            lesson_student = LessonStudent(lesson_id=lesson.id, student_id=student.id)
-            session.add(lesson_student)
+    return direct_response(build_lesson_read(lesson))
 
-    # Create tutor association
-    lesson_tutor = LessonTutor(lesson_id=lesson.id, tutor_id=current_user.id)
-    session.add(lesson_tutor)
 
+@router.post('/bulk', response_model=LessonBulkCreateResult, name='create_lessons_bulk')
+def create_lessons_bulk(
+    lessons_data: List[LessonCreate],
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_active_user),
+    event_broker: EventBroker = Depends(get_event_broker),
+):
+    """
+    Create many lessons in a single transaction. Referenced students and companies are validated with one query
+    each, and lessons that fail validation are reported by their index in the request rather than failing the
+    whole batch.
+    """
+    if len(lessons_data) > settings.lesson_bulk_max_size:
+        raise HTTPException(
+            status_code=400, detail=f'Cannot create more than {settings.lesson_bulk_max_size} lessons at once.'
+        )
+
+    student_ids = {student_id for lesson_data in lessons_data for student_id in lesson_data.student_ids}
+    company_ids = {lesson_data.company_id for lesson_data in lessons_data if lesson_data.company_id}
+    existing_student_ids = set()
+    if student_ids:
+        existing_student_ids = set(session.exec(select(Student.id).where(Student.id.in_(student_ids))).all())
+    existing_company_ids = set()
+    if company_ids:
+        existing_company_ids = set(session.exec(select(Company.id).where(Company.id.in_(company_ids))).all())
+
+    errors = []
+    valid_lessons = []
+    for index, lesson_data in enumerate(lessons_data):
+        if any(student_id not in existing_student_ids for student_id in lesson_data.student_ids):
+            errors.append(LessonBulkError(index=index, detail='Student not found'))
+        elif lesson_data.company_id and lesson_data.company_id not in existing_company_ids:
+            errors.append(LessonBulkError(index=index, detail='Company not found'))
+        elif (
+            lesson_data.company_id
+            and not current_user.is_tutor
+            and lesson_data.company_id not in current_user.company_ids
+        ):
+            errors.append(LessonBulkError(index=index, detail='Not authorized to create lessons for this company'))
+        elif lesson_data.end_dt <= lesson_data.start_dt:
+            errors.append(LessonBulkError(index=index, detail='End date must be after start date.'))
+        else:
+            valid_lessons.append(lesson_data)
+
+    if not valid_lessons:
+        return direct_response({'created': [], 'errors': [error.model_dump() for error in errors]})
+
+    # Build the rows through the table model so that defaults such as created_at are applied
+    lesson_rows = [
+        Lesson(**lesson_data.model_dump(exclude={'student_ids'})).model_dump(exclude={'id'})
+        for lesson_data in valid_lessons
+    ]
+    lesson_ids = session.scalars(insert(Lesson).returning(Lesson.id, sort_by_parameter_order=True), lesson_rows).all()
+    set_lesson_tags(session, dict(zip(lesson_ids, valid_lessons)))
+
+    lesson_student_rows = [
+        {'lesson_id': lesson_id, 'student_id': student_id}
+        for lesson_id, lesson_data in zip(lesson_ids, valid_lessons)
+        for student_id in dict.fromkeys(lesson_data.student_ids)
+    ]
+    if lesson_student_rows:
+        session.execute(insert(LessonStudent), lesson_student_rows)
+        _touch_students(session, {row['student_id'] for row in lesson_student_rows})
+
+    now = utc_now()
+    session.execute(
+        insert(LessonTutor),
+        [{'lesson_id': lesson_id, 'tutor_id': current_user.id, 'created_at': now} for lesson_id in lesson_ids],
+    )
     session.commit()
-    session.refresh(lesson)  # Refresh to load relationships
+    event_broker.publish(
+        [
+            {
+                'type': 'lesson.created',
+                'lesson_id': lesson_id,
+                'company_id': lesson_data.company_id,
+                'tutor_ids': [current_user.id],
+            }
+            for lesson_id, lesson_data in zip(lesson_ids, valid_lessons)
+        ]
+    )
 
-    return build_lesson_read(lesson)
+    lessons = session.exec(
+        select(Lesson).where(Lesson.id.in_(lesson_ids)).options(*_lesson_read_options).order_by(Lesson.id)
+    ).all()
+    return direct_response(
+        {
+            'created': [build_lesson_read(lesson) for lesson in lessons],
+            'errors': [error.model_dump() for error in errors],
+        }
+    )
 
 
 @router.put('/{lesson_id}', response_model=LessonRead, name='update_lesson')
@@ -149,12 +689,13 @@ def update_lesson(
     lesson_data: LessonUpdate,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_active_user),
+    event_broker: EventBroker = Depends(get_event_broker),
 ):
     """Update a lesson (only basic fields can be updated)"""
     # First check if user has access to this lesson
     base_query = select(Lesson).where(Lesson.id == lesson_id)
     query = _get_lessons_for_user(session, current_user, base_query)
-    lesson = session.exec(query).first()
+    lesson = session.exec(query.options(*_lesson_read_options)).first()
 
     if not lesson:
         raise HTTPException(status_code=404, detail='Lesson not found')
@@ -177,40 +718,57 @@ def update_lesson(
 
     # Handle student association updates
     if lesson_data.student_ids is not None:
-        # Verify all students exist
-        students = []
+        # Verify all students exist with a single query, which also loads them for the response
+        student_ids = set(lesson_data.student_ids)
+        existing_student_ids = set()
+        if student_ids:
+            students = session.exec(select(Student).where(Student.id.in_(student_ids))).all()
+            existing_student_ids = {student.id for student in students}
         for student_id in lesson_data.student_ids:
-            student = session.get(Student, student_id)
-            if not student:
+            if student_id not in existing_student_ids:
                 raise HTTPException(status_code=404, detail=f'Student with ID {student_id} not found')
-            students.append(student)
-
-        # Remove existing student associations
-        existing_associations = session.exec(select(LessonStudent).where(LessonStudent.lesson_id == lesson_id)).all()
-        for association in existing_associations:
-            session.delete(association)
 
-        # Add new student associations
-        for student in students:
-            lesson_student = LessonStudent(lesson_id=lesson.id, student_id=student.id)
-            session.add(lesson_student)
+        # Only touch the associations that actually changed
+        current_student_ids = set(
+            session.exec(select(LessonStudent.student_id).where(LessonStudent.lesson_id == lesson_id)).all()
+        )
+        removed_student_ids = current_student_ids - student_ids
+        added_student_ids = student_ids - current_student_ids
+        if removed_student_ids:
+            session.execute(
+                delete(LessonStudent).where(
+                    LessonStudent.lesson_id == lesson_id, LessonStudent.student_id.in_(removed_student_ids)
+                )
+            )
+        if added_student_ids:
+            session.execute(
+                insert(LessonStudent),
+                [{'lesson_id': lesson_id, 'student_id': student_id} for student_id in added_student_ids],
+            )
+        if removed_student_ids or added_student_ids:
+            _touch_students(session, removed_student_ids | added_student_ids)
+            session.expire(lesson, ['lesson_students'])
 
     # Update basic lesson fields (exclude student_ids as it's handled above)
     lesson_data_dict = lesson_data.model_dump(exclude_unset=True, exclude={'student_ids'})
     for key, value in lesson_data_dict.items():
         setattr(lesson, key, value)
 
-    lesson.updated_at = datetime.now(timezone.utc)
+    lesson.updated_at = utc_now()
     session.add(lesson)
+    events = _lesson_events(session, 'lesson.updated', [lesson_id])
     session.commit()
-    session.refresh(lesson)
+    event_broker.publish(events)
 
-    return build_lesson_read(lesson)
+    return direct_response(build_lesson_read(lesson))
 
 
 @router.delete('/{lesson_id}', name='delete_lesson')
 def delete_lesson(
-    lesson_id: int, session: Session = Depends(get_session), current_user: User = Depends(get_current_active_user)
+    lesson_id: int,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_active_user),
+    event_broker: EventBroker = Depends(get_event_broker),
 ):
     """Delete a lesson"""
     # First check if user has access to this lesson
@@ -228,41 +786,154 @@ def delete_lesson(
             detail='Cannot delete lesson that is linked to a company. Lessons linked to companies are read-only.',
         )
 
-    # Delete associated LessonStudent entries first (cascade delete)
-    lesson_students = session.exec(select(LessonStudent).where(LessonStudent.lesson_id == lesson_id)).all()
-    for lesson_student in lesson_students:
-        session.delete(lesson_student)
-
-    # Delete associated LessonTutor entries
-    lesson_tutors = session.exec(select(LessonTutor).where(LessonTutor.lesson_id == lesson_id)).all()
-    for lesson_tutor in lesson_tutors:
-        session.delete(lesson_tutor)
-
-    session.delete(lesson)
+    # LessonStudent and LessonTutor rows are removed by ON DELETE CASCADE
+    events = _lesson_events(session, 'lesson.deleted', [lesson_id])
+    _touch_students(session, select(LessonStudent.student_id).where(LessonStudent.lesson_id == lesson_id))
+    _record_lesson_tombstones(session, [lesson_id])
+    session.execute(delete(Lesson).where(Lesson.id == lesson_id))
     session.commit()
+    event_broker.publish(events)
     return {'message': 'Lesson deleted successfully'}
 
 
+@router.delete('/', name='delete_lessons')
+def delete_lessons(
+    lesson_ids: List[int] = Query(..., description='IDs of the lessons to delete'),
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_active_user),
+    event_broker: EventBroker = Depends(get_event_broker),
+):
+    """
+    Delete many lessons with a single statement. Lessons that don't exist, aren't visible to the user or are linked
+    to a company are skipped and returned in skipped_ids.
+    """
+    if len(lesson_ids) > settings.lesson_bulk_max_size:
+        raise HTTPException(
+            status_code=400, detail=f'Cannot delete more than {settings.lesson_bulk_max_size} lessons at once.'
+        )
+
+    base_query = select(Lesson.id).where(Lesson.id.in_(lesson_ids), Lesson.company_id.is_(None))
+    query = _get_lessons_for_user(session, current_user, base_query)
+    deleted_ids = set(session.exec(query).all())
+
+    if deleted_ids:
+        # LessonStudent and LessonTutor rows are removed by ON DELETE CASCADE
+        events = _lesson_events(session, 'lesson.deleted', deleted_ids)
+        _touch_students(session, select(LessonStudent.student_id).where(LessonStudent.lesson_id.in_(deleted_ids)))
+        _record_lesson_tombstones(session, deleted_ids)
+        session.execute(delete(Lesson).where(Lesson.id.in_(deleted_ids)))
+        session.commit()
+        event_broker.publish(events)
+
+    return {
+        'message': f'{len(deleted_ids)} lessons deleted successfully',
+        'deleted_ids': sorted(deleted_ids),
+        'skipped_ids': sorted(set(lesson_ids) - deleted_ids),
+    }
+
+
 @router.get('/student/{student_id}', response_model=List[LessonRead], name='get_lessons_for_student')
 def get_lessons_for_student(
-    student_id: int, session: Session = Depends(get_session), current_user: User = Depends(get_current_active_user)
+    student_id: int,
+    start_after: Optional[datetime] = Query(None, description='Only lessons starting at or after this time'),
+    start_before: Optional[datetime] = Query(None, description='Only lessons starting before this time'),
+    status: Optional[LessonStatus] = Query(None, description='Filter by lesson status'),
+    fields: Optional[str] = Query(None, description='Comma separated lesson fields to return, e.g. start_dt,subject'),
+    include: Optional[str] = Query(None, description='Add students to a response that uses fields'),
+    *,
+    request: Request,
+    response: Response,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_active_user),
 ):
-    """Get all lessons for a specific student"""
-    # Check if student exists
-    student = session.get(Student, student_id)
-    if not student:
-        raise HTTPException(status_code=404, detail='Student not found')
+    """
+    Get all lessons for a specific student, optionally filtered by start time and status. Responds with 304 Not
+    Modified when If-None-Match matches the current ETag. fields and include work as for get_lessons.
+    """
+    field_names, includes = _parse_lesson_fieldset(fields, include)
+    query = _student_lessons_query(session, current_user, student_id)
+    query = _filter_lessons(query, start_after, start_before, status)
 
-    # Query lessons through junction table
-    base_query = (
-        select(Lesson)
-        .join(LessonStudent, Lesson.id == LessonStudent.lesson_id)
-        .where(LessonStudent.student_id == student_id)
+    etag = _lessons_etag(request, current_user, _lessons_version(session, query))
+    if not_modified := etag_not_modified(request, response, etag):
+        return not_modified
+
+    if field_names is not None:
+        lessons = session.exec(query.options(*_lesson_fieldset_options(field_names, includes))).all()
+        return _sparse_lessons_response(lessons, field_names, includes, response)
+
+    lessons = session.exec(query.options(*_lesson_read_options)).all()
+    return direct_response([build_lesson_read(lesson) for lesson in lessons], response)
+
+
+def _lesson_csv_value(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return '; '.join(str(item) for item in value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return str(value)
+
+
+def _lesson_export_rows(bind, query, export_format: str) -> Iterator[bytes]:
+    """
+    Yield the lessons matched by query as NDJSON lines or CSV rows, a batch at a time. The rows are read with
+    yield_per (a server side cursor on Postgres) so memory use stays flat however many lessons the student has.
+
+    This runs as the response is sent, after get_session has closed the request's session, so it uses a session
+    of its own on the same engine.
+    """
+    with Session(bind) as session:
+        if export_format == 'csv':
+            columns = [*LESSON_FIELDS, 'students']
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            yield buffer.getvalue().encode()
+
+        results = session.exec(
+            query.options(*_lesson_read_options).execution_options(yield_per=settings.lesson_export_batch_size)
+        )
+        for lessons in results.partitions():
+            if export_format == 'csv':
+                buffer.seek(0)
+                buffer.truncate()
+                for lesson in lessons:
+                    row = [_lesson_csv_value(getattr(lesson, field)) for field in LESSON_FIELDS]
+                    row.append('; '.join(f'{student.first_name} {student.last_name}' for student in lesson.students))
+                    writer.writerow(row)
+                yield buffer.getvalue().encode()
+            else:
+                yield b''.join(
+                    orjson.dumps(build_lesson_read(lesson), option=orjson.OPT_APPEND_NEWLINE) for lesson in lessons
+                )
+
+
+@router.get('/student/{student_id}/export', name='export_lessons_for_student')
+def export_lessons_for_student(
+    student_id: int,
+    export_format: Literal['ndjson', 'csv'] = Query('ndjson', alias='format', description='ndjson or csv'),
+    start_after: Optional[datetime] = Query(None, description='Only lessons starting at or after this time'),
+    start_before: Optional[datetime] = Query(None, description='Only lessons starting before this time'),
+    status: Optional[LessonStatus] = Query(None, description='Filter by lesson status'),
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Export a student's full lesson history, oldest first, as NDJSON (one LessonRead per line) or CSV. The response
+    is streamed as the lessons are read, rather than built in memory first as get_lessons_for_student does.
+    """
+    query = _student_lessons_query(session, current_user, student_id)
+    query = _filter_lessons(query, start_after, start_before, status).order_by(Lesson.start_dt, Lesson.id)
+    media_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    return StreamingResponse(
+        _lesson_export_rows(session.get_bind(), query, export_format),
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename="student-{student_id}-lessons.{export_format}"'},
     )
-    # Apply user-based filtering
-    query = _get_lessons_for_user(session, current_user, base_query)
-    lessons = session.exec(query).all()
-    return [build_lesson_read(lesson) for lesson in lessons]
 
 
 @router.post('/{lesson_id}/eurus-space', name='create_eurus_space')
@@ -1,88 +1,287 @@
-from datetime import UTC, datetime
+from datetime import datetime, timedelta
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import delete, distinct, false, func, insert, literal, or_, update
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased, selectinload
 from sqlmodel import Session, select
 
 from app.models.tutor_student import TutorStudent
 
+from ..core.analytics import student_analytics
 from ..core.auth import get_current_active_user
+from ..core.config import settings
 from ..core.database import get_session
-from ..models import Client, Company, Student, StudentCreate, StudentRead, StudentUpdate, User
+from ..core.etags import etag_not_modified, make_etag
+from ..core.responses import direct_response, negotiated_media_type
+from ..core.tags import set_student_tags, student_ids_with_tag
+from ..models import (
+    Client,
+    Company,
+    Lesson,
+    LessonStudent,
+    Student,
+    StudentAnalytics,
+    StudentChanges,
+    StudentCreate,
+    StudentRead,
+    StudentUpdate,
+    TagKind,
+    Tombstone,
+    TombstoneType,
+    User,
+)
+from ..models.utils import as_naive_utc, utc_now
 
 router = APIRouter(prefix='/students', tags=['students'])
 
 
-def _get_students_for_user(session: Session, current_user: User):
+def _get_students_for_user(session: Session, current_user: User, base_query=None):
     """
     Get all students viewable by the current user. If the user is a tutor, return all students that have a linked
     TutorStudent with that Tutor. If the user is an admin, return all students that have a linked company_id and
     where the company_id is in the user's company_ids. If the admin has no company_ids, return no students.
+
+    Args:
+        session: The database session
+        current_user: The current user
+        base_query: Optional base query to apply the filtering to. If not provided, starts with select(Student)
+    """
+    if not current_user.is_tutor and not current_user.company_ids:
+        return []
+    query = _filter_students_for_user(current_user, base_query)
+    return session.exec(query.order_by(Student.last_name, Student.first_name)).all()
+
+
+def _filter_students_for_user(current_user: User, base_query=None):
+    """
+    Apply the filtering described in _get_students_for_user to a query. For an admin with no company_ids the query
+    matches no students.
     """
+    if base_query is None:
+        base_query = select(Student)
+
     if current_user.is_tutor:
         # Only students linked to this tutor
-        query = (
-            select(Student)
-            .join(TutorStudent, TutorStudent.student_id == Student.id)
-            .where(TutorStudent.tutor_id == current_user.id)
-            .order_by(Student.last_name, Student.first_name)
+        return base_query.join(TutorStudent, TutorStudent.student_id == Student.id).where(
+            TutorStudent.tutor_id == current_user.id
         )
-        return session.exec(query).all()
     else:
         assert current_user.is_admin
         # For admins, if they have company_ids, filter by them; else, return no students
         if current_user.company_ids:
-            query = select(Student).where(Student.company_id.in_(current_user.company_ids))
-            return session.exec(query).all()
-        else:
-            return []
+            return base_query.where(Student.company_id.in_(current_user.company_ids))
+        return base_query.where(false())
+
+
+def _get_student_tombstones_for_user(current_user: User, base_query):
+    """Scope a query on student tombstones in the same way as the students themselves."""
+    base_query = base_query.where(Tombstone.object_type == TombstoneType.STUDENT)
+    if current_user.is_tutor:
+        return base_query.where(Tombstone.tutor_id == current_user.id)
+    else:
+        assert current_user.is_admin
+        if current_user.company_ids:
+            return base_query.where(Tombstone.company_id.in_(current_user.company_ids))
+        return base_query.where(false())
+
+
+def _students_version(session: Session, query) -> tuple:
+    """
+    A cheap fingerprint of the students a query matches, from a single aggregate query that loads no rows. The
+    roster count and the lessons' timestamps cover lessons_completed, which changes without touching the student, and
+    the company's updated_at covers company_name and tutorcruncher_url.
+    """
+    roster = aliased(LessonStudent)
+    roster_lesson = aliased(Lesson)
+    student_company = aliased(Company)
+    version_query = (
+        query.with_only_columns(
+            func.count(distinct(Student.id)),
+            func.max(Student.created_at),
+            func.max(Student.updated_at),
+            func.count(roster.lesson_id),
+            func.max(roster_lesson.created_at),
+            func.max(roster_lesson.updated_at),
+            func.max(student_company.updated_at),
+        )
+        .outerjoin(roster, roster.student_id == Student.id)
+        .outerjoin(roster_lesson, roster_lesson.id == roster.lesson_id)
+        .outerjoin(student_company, student_company.id == Student.company_id)
+        .order_by(None)
+    )
+    return tuple(session.execute(version_query).one())
 
 
-def build_student_read(student: Student) -> StudentRead:
-    """Build a StudentRead model from a Student model."""
+def _students_etag(request: Request, current_user: User, version: tuple) -> str:
+    """
+    ETag for a student response, scoped to the URL and the user since both change which students are returned, and to
+    the negotiated format since JSON and MessagePack bodies differ
+    """
+    return make_etag(
+        request.url.path,
+        request.url.query,
+        current_user.id,
+        current_user.company_ids,
+        negotiated_media_type(),
+        *version,
+    )
+
+
+def _touch_student_lessons(session: Session, student_id: int):
+    """Mark the student's lessons as changed for the lesson change feed, since lessons embed their students"""
+    session.execute(
+        update(Lesson)
+        .where(Lesson.id.in_(select(LessonStudent.lesson_id).where(LessonStudent.student_id == student_id)))
+        .values(updated_at=utc_now())
+        .execution_options(synchronize_session=False)
+    )
+
+
+# The StudentRead fields read straight from the student, the rest are computed in build_student_read
+_STUDENT_FIELDS = tuple(
+    field
+    for field in StudentRead.model_fields
+    if field not in {'lessons_completed', 'company_name', 'tutorcruncher_url'}
+)
+
+
+def build_student_read(student: Student) -> dict:
+    """
+    Build the StudentRead shape for a student as plain data. Endpoints return it with direct_response, so it's built
+    once rather than dumped, validated into StudentRead and serialized again.
+    """
     company_name = student.company.name if student.company else None
     tutorcruncher_url = None
     if student.company and student.tc_path and student.company.tutorcruncher_domain:
         tutorcruncher_url = f'{student.company.tutorcruncher_domain.rstrip("/")}/{student.tc_path.lstrip("/")}'
 
-    base_data = student.model_dump(
-        exclude={'created_at', 'updated_at', 'lesson_students', 'client', 'student_tutors', 'company'}
-    )
-    return StudentRead(
-        **base_data,
-        created_at=student.created_at,
-        updated_at=student.updated_at,
-        lessons_completed=student.lessons_completed,
-        company_name=company_name,
-        tutorcruncher_url=tutorcruncher_url,
+    data = {field: getattr(student, field) for field in _STUDENT_FIELDS}
+    data.update(
+        lessons_completed=student.lessons_completed, company_name=company_name, tutorcruncher_url=tutorcruncher_url
     )
+    return data
+
+
+def _raise_for_integrity_error(
+    session: Session, exc: IntegrityError, student_data: StudentCreate | StudentUpdate, student_id: Optional[int] = None
+):
+    """
+    Raise the HTTPException for a student write that failed a database constraint, or re-raise the error if it isn't
+    one the client can fix. This only runs once a write has already failed, so the happy path doesn't need to look up
+    the client, company or email first.
+    """
+    if student_data.client_id is not None and not session.get(Client, student_data.client_id):
+        raise HTTPException(status_code=404, detail='Client not found')
+    if student_data.company_id and not session.get(Company, student_data.company_id):
+        raise HTTPException(status_code=404, detail='Company not found')
+    if student_data.email is not None:
+        email_query = select(Student.id).where(Student.email == student_data.email, Student.id != student_id)
+        if session.exec(email_query).first():
+            raise HTTPException(status_code=400, detail='Email already registered')
+    raise exc
 
 
 @router.get('/', response_model=List[StudentRead], name='get_students')
 def get_students(
+    request: Request,
+    response: Response,
     client_id: Optional[int] = None,
+    tag: Optional[List[str]] = Query(None, description='Only students with all of these strengths or weaknesses'),
+    tag_kind: Optional[TagKind] = Query(None, description='Only match tags in strengths or weaknesses'),
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_active_user),
 ):
-    """Get all students"""
-    students = _get_students_for_user(session, current_user)
+    """
+    Get all students, optionally filtered by client and tags. Responds with 304 Not Modified when If-None-Match
+    matches the current ETag.
+    """
+    base_query = select(Student)
     if client_id is not None:
-        students = [student for student in students if student.client_id == client_id]
-    return [build_student_read(student) for student in students]
+        base_query = base_query.where(Student.client_id == client_id)
+    for name in tag or []:
+        base_query = base_query.where(Student.id.in_(student_ids_with_tag(name, tag_kind)))
+
+    version = _students_version(session, _filter_students_for_user(current_user, base_query))
+    if not_modified := etag_not_modified(request, response, _students_etag(request, current_user, version)):
+        return not_modified
+
+    students = _get_students_for_user(
+        session, current_user, base_query.options(selectinload(Student.lesson_students), selectinload(Student.company))
+    )
+    return direct_response([build_student_read(student) for student in students], response)
+
+
+@router.get('/changes', response_model=StudentChanges, name='get_student_changes')
+def get_student_changes(
+    since: Optional[datetime] = Query(None, description='Cursor from a previous response, omit for a full sync'),
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Get the students created, updated or deleted since a cursor. Pass the returned cursor as since on the next call,
+    so polling clients only download what changed. Changes just before the cursor are sent again, so clients should
+    upsert students and apply deletions by id.
+    """
+    base_query = select(Student).options(selectinload(Student.lesson_students), selectinload(Student.company))
+    tombstones = []
+    change_times = []
+    if since:
+        since = as_naive_utc(since)
+        change_times.append(since)
+        # Changes just behind the cursor are sent again, see settings.change_feed_overlap_seconds
+        window_start = since - timedelta(seconds=settings.change_feed_overlap_seconds)
+        base_query = base_query.where(or_(Student.created_at >= window_start, Student.updated_at >= window_start))
+        tombstone_query = select(Tombstone.object_id, Tombstone.deleted_at).where(Tombstone.deleted_at >= window_start)
+        tombstones = session.exec(_get_student_tombstones_for_user(current_user, tombstone_query)).all()
+
+    students = _get_students_for_user(session, current_user, base_query)
+
+    change_times += [student.updated_at or student.created_at for student in students]
+    change_times += [deleted_at for _, deleted_at in tombstones]
+    return direct_response(
+        {
+            'cursor': max(change_times, default=None),
+            'students': [build_student_read(student) for student in students],
+            'deleted_ids': sorted({student_id for student_id, _ in tombstones}),
+        }
+    )
 
 
 @router.get('/{student_id}', response_model=StudentRead, name='get_student')
 def get_student(
-    student_id: int, session: Session = Depends(get_session), current_user: User = Depends(get_current_active_user)
+    student_id: int,
+    request: Request,
+    response: Response,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_active_user),
 ):
-    """Get a specific student by ID"""
-    students = _get_students_for_user(session, current_user)
-    student = next((student for student in students if student.id == student_id), None)
-    if not student:
+    """Get a specific student by ID. Responds with 304 Not Modified when If-None-Match matches the current ETag."""
+    query = _filter_students_for_user(current_user, select(Student).where(Student.id == student_id))
+
+    version = _students_version(session, query)
+    if not version[0]:
         raise HTTPException(status_code=404, detail='Student not found')
+    if not_modified := etag_not_modified(request, response, _students_etag(request, current_user, version)):
+        return not_modified
 
-    return build_student_read(student)
+    student = session.exec(query).first()
+
+    return direct_response(build_student_read(student), response)
+
+
+@router.get('/{student_id}/analytics', response_model=StudentAnalytics, name='get_student_analytics')
+def get_student_analytics(
+    student_id: int,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_active_user),
+):
+    """Get the duration percentiles, weekly cadence and skills most often practiced together of a student's lessons"""
+    query = _filter_students_for_user(current_user, select(Student.id).where(Student.id == student_id))
+    if session.exec(query).first() is None:
+        raise HTTPException(status_code=404, detail='Student not found')
+    return direct_response(student_analytics(session, [student_id])[student_id])
 
 
 @router.post('/', response_model=StudentRead, name='create_student')
@@ -92,32 +291,19 @@ def create_student(
     current_user: User = Depends(get_current_active_user),
 ):
     """Create a new student"""
-    # Check if client exists
-    client = session.get(Client, student_data.client_id)
-    if not client:
-        raise HTTPException(status_code=404, detail='Client not found')
-
-    # Check if company exists if company_id is provided
-    if student_data.company_id:
-        company = session.get(Company, student_data.company_id)
-        if not company:
-            raise HTTPException(status_code=404, detail='Company not found')
-
-    # Check if email already exists
-    existing_student = session.exec(select(Student).where(Student.email == student_data.email)).first()
-    if existing_student:
-        raise HTTPException(status_code=400, detail='Email already registered')
-
-    student = Student(**student_data.model_dump())
+    # Client, company and email are checked by the database constraints rather than with a query each up front.
+    # A new student has no lessons, so lesson_students is set to avoid loading it for lessons_completed.
+    student = Student(**student_data.model_dump(), lesson_students=[])
     session.add(student)
     try:
+        session.flush()
+        set_student_tags(session, {student.id: student})
         session.commit()
-        session.refresh(student)
-    except IntegrityError:
+    except IntegrityError as exc:
         session.rollback()
-        raise HTTPException(status_code=400, detail='Email already registered')
+        _raise_for_integrity_error(session, exc, student_data)
 
-    return build_student_read(student)
+    return direct_response(build_student_read(student))
 
 
 @router.put('/{student_id}', response_model=StudentRead, name='update_student')
@@ -145,28 +331,26 @@ def update_student(
         if not company:
             raise HTTPException(status_code=404, detail='Company not found')
 
-    # Check if email is being updated and if it already exists
-    if student_data.email and student_data.email != student.email:
-        existing_student = session.exec(select(Student).where(Student.email == student_data.email)).first()
-        if existing_student:
-            raise HTTPException(status_code=400, detail='Email already registered')
+    # The lessons that embed the student change too. This runs before the student is modified so it doesn't flush
+    # the student's changes outside the IntegrityError handling below.
+    _touch_student_lessons(session, student_id)
 
     student_data_dict = student_data.model_dump(exclude_unset=True)
     for key, value in student_data_dict.items():
         setattr(student, key, value)
 
     # Update the updated_at timestamp
-    student.updated_at = datetime.now(UTC)
+    student.updated_at = utc_now()
 
+    # Email uniqueness is checked by the database constraint rather than with a query up front
     session.add(student)
     try:
         session.commit()
-        session.refresh(student)
-    except IntegrityError:
+    except IntegrityError as exc:
         session.rollback()
-        raise HTTPException(status_code=400, detail='Email already registered')
+        _raise_for_integrity_error(session, exc, student_data, student_id)
 
-    return build_student_read(student)
+    return direct_response(build_student_read(student))
 
 
 @router.delete('/{student_id}', name='delete_student')
@@ -185,7 +369,27 @@ def delete_student(
             detail='Cannot delete student that is linked to a company. Students linked to companies are read-only.',
         )
 
-    session.delete(student)
+    now = utc_now()
+    # The student's lessons lose it from their roster
+    _touch_student_lessons(session, student_id)
+    tombstone_query = (
+        select(
+            literal(TombstoneType.STUDENT, Tombstone.__table__.c.object_type.type),
+            Student.id,
+            Student.company_id,
+            TutorStudent.tutor_id,
+            literal(now, Tombstone.__table__.c.deleted_at.type),
+        )
+        .outerjoin(TutorStudent, TutorStudent.student_id == Student.id)
+        .where(Student.id == student_id)
+    )
+    session.execute(
+        insert(Tombstone).from_select(
+            ['object_type', 'object_id', 'company_id', 'tutor_id', 'deleted_at'], tombstone_query
+        )
+    )
+    # LessonStudent and TutorStudent rows are removed by ON DELETE CASCADE
+    session.execute(delete(Student).where(Student.id == student_id))
     session.commit()
 
     return {'message': 'Student deleted successfully'}
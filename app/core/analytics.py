@@ -0,0 +1,163 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable
+
+import numpy as np
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from ..models import Lesson, LessonStudent, LessonTag, Tag, TagKind
+
+WEEK = 7 * 24 * 60 * 60
+# 1970-01-01 was a Thursday, weeks are counted from the Monday after it
+_FIRST_MONDAY = 4 * 24 * 60 * 60
+DURATION_PERCENTILES = (25, 50, 75, 90)
+
+
+def lesson_duration_seconds(session: Session):
+    """A SQL expression for the length of a lesson in seconds"""
+    if session.get_bind().dialect.name == 'postgresql':
+        return func.extract('epoch', Lesson.end_dt - Lesson.start_dt)
+    return (func.julianday(Lesson.end_dt) - func.julianday(Lesson.start_dt)) * 86400
+
+
+def lesson_start_epoch(session: Session):
+    """A SQL expression for the start of a lesson in seconds since the Unix epoch (start_dt is naive UTC)"""
+    if session.get_bind().dialect.name == 'postgresql':
+        return func.extract('epoch', Lesson.start_dt)
+    return (func.julianday(Lesson.start_dt) - 2440587.5) * 86400
+
+
+@dataclass
+class LessonData:
+    """
+    The columns analytics need for some students' lessons, as arrays with a row per lesson and student, ordered by
+    student then start. The skills practiced in those lessons are a second set of arrays, ordered by student.
+    """
+
+    student_ids: np.ndarray
+    starts: np.ndarray  # seconds since the epoch
+    durations: np.ndarray  # minutes
+    tag_student_ids: np.ndarray
+    tag_lesson_ids: np.ndarray
+    tag_ids: np.ndarray
+    tag_names: dict[int, str]
+
+
+def load_lesson_data(session: Session, student_ids: Iterable[int]) -> LessonData:
+    """
+    Load the lesson columns analytics use for the students with two projection queries, the times computed by the
+    database so no Lesson objects or datetimes are built.
+    """
+    student_ids = list(student_ids)
+    lesson_rows = session.execute(
+        select(LessonStudent.student_id, lesson_start_epoch(session), lesson_duration_seconds(session) / 60)
+        .join(Lesson, Lesson.id == LessonStudent.lesson_id)
+        .where(LessonStudent.student_id.in_(student_ids))
+        .order_by(LessonStudent.student_id, Lesson.start_dt)
+    ).all()
+    lessons = np.array(lesson_rows, dtype=np.float64).reshape(-1, 3)
+
+    tag_rows = session.execute(
+        select(LessonStudent.student_id, LessonTag.lesson_id, Tag.id, Tag.name)
+        .join(LessonTag, LessonTag.lesson_id == LessonStudent.lesson_id)
+        .join(Tag, Tag.id == LessonTag.tag_id)
+        .where(LessonStudent.student_id.in_(student_ids), LessonTag.kind == TagKind.SKILLS_PRACTICED)
+        .order_by(LessonStudent.student_id)
+    ).all()
+    tags = np.array([row[:3] for row in tag_rows], dtype=np.int64).reshape(-1, 3)
+    return LessonData(
+        student_ids=lessons[:, 0].astype(np.int64),
+        starts=lessons[:, 1],
+        durations=lessons[:, 2],
+        tag_student_ids=tags[:, 0],
+        tag_lesson_ids=tags[:, 1],
+        tag_ids=tags[:, 2],
+        tag_names={tag_id: name for _, _, tag_id, name in tag_rows},
+    )
+
+
+def _group_slices(keys: np.ndarray) -> dict[int, slice]:
+    """The slice of each key's rows in an array sorted by key"""
+    unique, first = np.unique(keys, return_index=True)
+    ends = np.append(first[1:], len(keys))
+    return {int(key): slice(int(start), int(end)) for key, start, end in zip(unique, first, ends)}
+
+
+def _duration_stats(durations: np.ndarray) -> Dict[str, Any]:
+    percentiles = np.percentile(durations, DURATION_PERCENTILES)
+    return {
+        'mean': round(float(durations.mean()), 1),
+        'min': round(float(durations.min()), 1),
+        'max': round(float(durations.max()), 1),
+        **{f'p{p}': round(float(value), 1) for p, value in zip(DURATION_PERCENTILES, percentiles)},
+    }
+
+
+def _cadence_stats(starts: np.ndarray) -> Dict[str, Any]:
+    weeks = np.unique(np.floor_divide(starts - _FIRST_MONDAY, WEEK))
+    gaps = np.diff(weeks)
+    # Days since the epoch, shifted so Monday is 0
+    weekdays = np.bincount((np.floor_divide(starts, 86400).astype(np.int64) + 3) % 7, minlength=7)
+    return {
+        'active_weeks': int(len(weeks)),
+        'lessons_per_active_week': round(len(starts) / len(weeks), 2),
+        'longest_gap_weeks': int(gaps.max() - 1) if len(gaps) else 0,
+        'weekday_counts': weekdays.tolist(),
+    }
+
+
+def _tag_pairs(lesson_ids: np.ndarray, tag_ids: np.ndarray, tag_names: dict[int, str], top: int) -> list[dict]:
+    """The pairs of skills most often practiced in the same lesson, from a lesson by tag incidence matrix"""
+    lessons, lesson_index = np.unique(lesson_ids, return_inverse=True)
+    tags, tag_index = np.unique(tag_ids, return_inverse=True)
+    if len(tags) < 2:
+        return []
+    # Number the tags in name order, so each pair is in name order too
+    names = np.array([tag_names[int(tag_id)] for tag_id in tags])
+    by_name = np.argsort(names)
+    rank = np.empty_like(by_name)
+    rank[by_name] = np.arange(len(tags))
+    tag_index, names = rank[tag_index], names[by_name]
+
+    # Floats so the product runs through BLAS, integer matrix products don't, and counts are exact well past any
+    # student's number of lessons
+    incidence = np.zeros((len(lessons), len(tags)), dtype=np.float32)
+    incidence[lesson_index, tag_index] = 1
+    co_occurrence = (incidence.T @ incidence).astype(np.int64)
+    first, second = np.triu_indices(len(tags), 1)
+    counts = co_occurrence[first, second]
+    # Most frequent first, ties in name order
+    order = np.lexsort((second, first, -counts))
+    order = order[counts[order] > 0][:top]
+    return [{'tags': [str(names[first[i]]), str(names[second[i]])], 'count': int(counts[i])} for i in order]
+
+
+def empty_analytics(student_id: int) -> Dict[str, Any]:
+    return {'student_id': student_id, 'lessons': 0, 'duration': None, 'cadence': None, 'skill_pairs': []}
+
+
+def compute_analytics(data: LessonData, top_pairs: int = 10) -> Dict[int, Dict[str, Any]]:
+    """
+    Duration percentiles, weekly cadence and the skills most often practiced together for each student in data.
+    Each student's rows are a slice of the arrays, so every statistic is computed with array operations rather than
+    by looping over lessons.
+    """
+    tag_slices = _group_slices(data.tag_student_ids)
+    results = {}
+    for student_id, rows in _group_slices(data.student_ids).items():
+        tag_rows = tag_slices.get(student_id, slice(0, 0))
+        results[student_id] = {
+            'student_id': student_id,
+            'lessons': rows.stop - rows.start,
+            'duration': _duration_stats(data.durations[rows]),
+            'cadence': _cadence_stats(data.starts[rows]),
+            'skill_pairs': _tag_pairs(data.tag_lesson_ids[tag_rows], data.tag_ids[tag_rows], data.tag_names, top_pairs),
+        }
+    return results
+
+
+def student_analytics(session: Session, student_ids: Iterable[int], top_pairs: int = 10) -> Dict[int, Dict[str, Any]]:
+    """Load and compute the analytics for students, including those without any lessons"""
+    student_ids = list(student_ids)
+    results = compute_analytics(load_lesson_data(session, student_ids), top_pairs=top_pairs)
+    return {student_id: results.get(student_id) or empty_analytics(student_id) for student_id in student_ids}
@@ -0,0 +1,124 @@
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Optional
+
+import redis
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Cache(ABC):
+    """A key value cache for results that are expensive to compute, values are JSON"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """The value stored under key, None if there isn't one or it has expired"""
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        """Store value under key for ttl seconds"""
+
+    @abstractmethod
+    def incr(self, key: str, ttl: int) -> int:
+        """Atomically add one to the counter under key, which expires after ttl seconds, returning its new value"""
+
+    @abstractmethod
+    def add(self, key: str, value: Any, ttl: int) -> bool:
+        """Store value under key for ttl seconds unless the key already has a value, returning whether it was stored"""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove the value under key"""
+
+
+class RedisCache(Cache):
+    def __init__(self, url: str, prefix: str = 'cache:'):
+        self.prefix = prefix
+        self.redis = redis.Redis.from_url(url)
+
+    # The cache is best effort, if Redis is unavailable values are computed rather than failing
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            value = self.redis.get(self.prefix + key)
+        except redis.RedisError:
+            logger.exception('Failed to read %s from the cache', key)
+            return None
+        return None if value is None else json.loads(value)
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        try:
+            self.redis.set(self.prefix + key, json.dumps(value), ex=ttl)
+        except redis.RedisError:
+            logger.exception('Failed to write %s to the cache', key)
+
+    def incr(self, key: str, ttl: int) -> int:
+        # The counter is stored as a plain integer, which is also valid JSON for get
+        with self.redis.pipeline() as pipe:
+            pipe.incr(self.prefix + key)
+            pipe.expire(self.prefix + key, ttl)
+            value, _ = pipe.execute()
+        return value
+
+    def add(self, key: str, value: Any, ttl: int) -> bool:
+        return bool(self.redis.set(self.prefix + key, json.dumps(value), ex=ttl, nx=True))
+
+    def delete(self, key: str) -> None:
+        try:
+            self.redis.delete(self.prefix + key)
+        except redis.RedisError:
+            logger.exception('Failed to delete %s from the cache', key)
+
+
+class InMemoryCache(Cache):
+    """An in-process cache used in tests and local development"""
+
+    def __init__(self):
+        self.values: dict[str, tuple[float, str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            expires, value = self.values.get(key, (0, None))
+            if value is None or expires < time.monotonic():
+                self.values.pop(key, None)
+                return None
+        return json.loads(value)
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        with self._lock:
+            self.values[key] = time.monotonic() + ttl, json.dumps(value)
+
+    def incr(self, key: str, ttl: int) -> int:
+        with self._lock:
+            expires, value = self.values.get(key, (0, None))
+            count = json.loads(value) + 1 if value is not None and expires >= time.monotonic() else 1
+            self.values[key] = time.monotonic() + ttl, json.dumps(count)
+        return count
+
+    def add(self, key: str, value: Any, ttl: int) -> bool:
+        with self._lock:
+            expires, _ = self.values.get(key, (0, None))
+            if expires >= time.monotonic():
+                return False
+            self.values[key] = time.monotonic() + ttl, json.dumps(value)
+        return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self.values.pop(key, None)
+
+
+_cache: Optional[Cache] = None
+
+
+def get_cache() -> Cache:
+    """Get the cache for this worker, a memory:// redis_url uses the in-process cache"""
+    global _cache
+    if _cache is None:
+        _cache = InMemoryCache() if settings.redis_url.startswith('memory://') else RedisCache(settings.redis_url)
+    return _cache
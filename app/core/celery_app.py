@@ -1,13 +1,110 @@
-from celery import Celery
+import json
+from typing import Any, Optional
 
+from celery import Celery, Task, states
+from celery.result import AsyncResult
+from celery.utils import uuid
+from kombu import Queue
+
+from . import task_metrics  # noqa: F401, connects the task metrics to Celery's signals
+from .cache import get_cache
 from .config import settings
 
-celery_app = Celery('tutorcruncher', broker=settings.redis_url, backend=settings.redis_url, include=['app.tasks'])
+
+def broker_config(redis_url: str) -> dict[str, Any]:
+    """
+    The broker and result backend for a redis_url. memory:// uses Kombu's in-memory transport and result backend, and
+    runs tasks eagerly in the calling process, so tasks (and the queries they run) work in tests, benchmarks and local
+    development without Redis or a worker.
+    """
+    if redis_url.startswith('memory://'):
+        return {
+            'broker_url': 'memory://',
+            'result_backend': 'cache+memory://',
+            'task_always_eager': True,
+            'task_eager_propagates': True,
+            # So a coalesced task's AsyncResult can be read like a worker's
+            'task_store_eager_result': True,
+        }
+    return {'broker_url': redis_url, 'result_backend': redis_url}
+
+
+celery_app = Celery('tutorcruncher', include=['app.tasks'])
 
 celery_app.conf.update(
+    **broker_config(settings.redis_url),
     task_serializer='json',
-    accept_content=['json'],
-    result_serializer='json',
+    result_serializer=settings.celery_result_serializer,
+    # Messages and results in either format can be read, so the serializers can be changed while tasks are queued
+    accept_content=['json', 'msgpack'],
+    result_accept_content=['json', 'msgpack'],
     timezone='UTC',
     enable_utc=True,
+    task_queues=[
+        Queue(settings.celery_default_queue),
+        Queue(settings.celery_email_queue),
+        Queue(settings.celery_reports_queue),
+    ],
+    task_default_queue=settings.celery_default_queue,
+    task_routes={
+        'app.tasks.email_tasks.*': {'queue': settings.celery_email_queue},
+        'app.tasks.analytics_tasks.*': {'queue': settings.celery_reports_queue},
+    },
+    worker_prefetch_multiplier=settings.celery_prefetch_multiplier,
+    task_acks_late=settings.celery_acks_late,
+    task_reject_on_worker_lost=settings.celery_reject_on_worker_lost,
+    task_soft_time_limit=settings.celery_task_soft_time_limit,
+    task_time_limit=settings.celery_task_time_limit,
+    result_expires=settings.celery_result_expires,
+    broker_transport_options={'visibility_timeout': settings.celery_visibility_timeout},
+    beat_schedule={
+        'dispatch-lesson-reminders': {
+            'task': 'app.tasks.email_tasks.dispatch_lesson_reminders',
+            'schedule': settings.reminder_interval_seconds,
+        },
+        'sample-queue-depths': {
+            'task': 'app.tasks.monitoring_tasks.sample_queue_depths',
+            'schedule': settings.celery_queue_depth_interval_seconds,
+        },
+    },
 )
+
+
+class CoalescedTask(Task):
+    """
+    A task that is only queued or run once at a time for the same arguments. While a run is queued or running, sending
+    the task again returns that run's AsyncResult rather than queueing another, so e.g. repeated clicks on "generate
+    report" or overlapping beat schedules start a single run. The run is recorded under a key for the task and its
+    arguments, which is removed once it finishes, or expires after task_coalesce_ttl_seconds if its worker dies.
+    """
+
+    coalesce_ttl = settings.task_coalesce_ttl_seconds
+
+    def coalesce_key(self, args: Optional[tuple], kwargs: Optional[dict]) -> str:
+        return f'task-run:{self.name}:{json.dumps([list(args or ()), kwargs or {}], sort_keys=True, default=str)}'
+
+    def apply_async(self, args=None, kwargs=None, task_id=None, **options) -> AsyncResult:
+        key = self.coalesce_key(args, kwargs)
+        task_id = task_id or uuid()
+        cache = get_cache()
+        while not cache.add(key, task_id, ttl=self.coalesce_ttl):
+            running_id = cache.get(key)
+            if running_id == task_id:
+                # The run is being retried
+                break
+            # The run holding the key may finish between the two calls, in which case try to take it again
+            if running_id is not None:
+                return self.AsyncResult(running_id)
+        try:
+            return super().apply_async(args, kwargs, task_id=task_id, **options)
+        except Exception:
+            cache.delete(key)
+            raise
+
+    def after_return(self, status: str, retval: Any, task_id: str, args: tuple, kwargs: dict, einfo):
+        if status == states.RETRY:
+            return
+        key = self.coalesce_key(args, kwargs)
+        cache = get_cache()
+        if cache.get(key) == task_id:
+            cache.delete(key)
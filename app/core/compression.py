@@ -0,0 +1,123 @@
+import gzip
+from collections import OrderedDict
+from typing import Optional
+
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .responses import accept_qualities
+
+# Preferred first when the client gives encodings the same quality
+ENCODINGS = ('br', 'gzip')
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """The encoding to use for a response given the request's Accept-Encoding header, None to send it as is"""
+    qualities = accept_qualities(accept_encoding)
+    wildcard_q = qualities.get('*', 0.0)
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        q = qualities.get(encoding, wildcard_q)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Compress response bodies with brotli or gzip, whichever the client prefers. Bodies smaller than minimum_size
+    aren't worth the CPU and are sent as is, as are bodies that don't get any smaller.
+
+    Responses with an ETag identify their content, so the result of compressing them is kept in a small LRU cache
+    keyed by the ETag and encoding: repeat requests for a large, unchanged lesson list are served from the cache
+    rather than compressed again. Streamed responses (the lesson event stream) are passed through untouched.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1000,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        cache_size: int = 256,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache_size = cache_size
+        # (etag, encoding) -> compressed body, or None when compressing didn't make it smaller
+        self.cache: OrderedDict[tuple[str, str], Optional[bytes]] = OrderedDict()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        encoding = choose_encoding(Headers(scope=scope).get('accept-encoding', ''))
+        if not encoding:
+            return await self.app(scope, receive, send)
+
+        start_message: Optional[Message] = None
+        passthrough = False
+
+        async def send_compressed(message: Message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+            elif message['type'] == 'http.response.start':
+                start_message = message
+            elif message['type'] == 'http.response.body':
+                if message.get('more_body', False):
+                    # A streamed response, compressing it would mean buffering the stream
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                else:
+                    await self._send_body(start_message, message, encoding, send)
+            else:
+                await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+    async def _send_body(self, start_message: Message, message: Message, encoding: str, send: Send):
+        headers = MutableHeaders(scope=start_message)
+        body = message.get('body', b'')
+        if 'content-encoding' in headers or len(body) < self.minimum_size:
+            await send(start_message)
+            await send(message)
+            return
+
+        headers.add_vary_header('Accept-Encoding')
+        compressed = self._compress(body, encoding, headers.get('etag'))
+        if compressed is None:
+            await send(start_message)
+            await send(message)
+            return
+
+        headers['Content-Encoding'] = encoding
+        headers['Content-Length'] = str(len(compressed))
+        if (etag := headers.get('etag')) and not etag.startswith('W/'):
+            # The compressed body isn't byte for byte the entity the strong ETag describes
+            headers['ETag'] = f'W/{etag}'
+        await send(start_message)
+        await send({'type': 'http.response.body', 'body': compressed})
+
+    def _compress(self, body: bytes, encoding: str, etag: Optional[str]) -> Optional[bytes]:
+        """Compress body, returning None if that doesn't make it any smaller"""
+        key = (etag, encoding)
+        if etag and key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        if encoding == 'br':
+            compressed = brotli.compress(body, quality=self.brotli_quality)
+        else:
+            compressed = gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+        if len(compressed) >= len(body):
+            compressed = None
+
+        if etag:
+            self.cache[key] = compressed
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return compressed
@@ -21,6 +21,71 @@ class Settings(BaseSettings):
     # CORS
     allowed_origins: str = 'http://localhost:3000,http://localhost:5173'
 
+    # Compression
+    compression_minimum_size: int = 1000  # bytes
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+    compression_cache_size: int = 256  # compressed bodies kept, by ETag
+
+    # Lessons
+    lesson_bulk_max_size: int = 500
+    lesson_stream_max_connections: int = 500  # per worker
+    lesson_stream_heartbeat_seconds: float = 15
+    lesson_stream_maxlen: int = 10_000
+    lesson_export_batch_size: int = 500
+
+    # Change feeds
+    # Writes are timestamped before they commit, so a change committed late can be stamped before a cursor that has
+    # already been handed out. Feeds re-send changes this far behind the cursor, and clients de-duplicate by id.
+    change_feed_overlap_seconds: int = 30
+
+    # Celery
+    # Tasks are routed by family to their own queue, each with its own workers, so a burst of reports can't hold up
+    # reminder emails
+    celery_default_queue: str = 'default'
+    celery_email_queue: str = 'email'
+    celery_reports_queue: str = 'reports'
+    # Workers reserve one task per process at a time, so long tasks aren't stuck behind each other on one process
+    celery_prefetch_multiplier: int = 1
+    # Tasks are acknowledged once they finish rather than when they start, so a task running when a worker crashes or
+    # is killed is redelivered instead of lost. Tasks must therefore be safe to run twice.
+    celery_acks_late: bool = True
+    celery_reject_on_worker_lost: bool = True
+    celery_task_soft_time_limit: int = 60 * 4  # seconds
+    celery_task_time_limit: int = 60 * 5
+    celery_report_soft_time_limit: int = 60 * 25
+    celery_report_time_limit: int = 60 * 30
+    celery_result_expires: int = 60 * 60 * 24
+    # json, or msgpack for smaller results in Redis. Report tasks' messages, which carry whole reports to the company
+    # report's callback, use celery_report_serializer.
+    celery_result_serializer: str = 'json'
+    celery_report_serializer: str = 'json'
+    # How long Redis waits for an unacknowledged task before redelivering it, longer than any task can run
+    celery_visibility_timeout: int = 60 * 60
+    # How long a coalesced task stops the same task being sent again, if it isn't removed when the task finishes
+    task_coalesce_ttl_seconds: int = 60 * 60
+    celery_queue_depth_interval_seconds: int = 30
+
+    # Reports
+    report_cache_ttl_seconds: int = 60 * 60 * 24 * 7
+    report_top_tags: int = 10  # per list, e.g. the most practiced skills
+    report_chunk_size: int = 200  # students per task in a company report
+    report_artifact_dir: str = 'reports'
+
+    # Email
+    smtp_host: str = 'localhost'
+    smtp_port: int = 25
+    smtp_username: Optional[str] = None
+    smtp_password: Optional[str] = None
+    smtp_starttls: bool = False
+    smtp_timeout: float = 30
+    email_from: str = 'TutorCruncher <no-reply@tutorcruncher.com>'
+
+    # Lesson reminders
+    reminder_lead_hours: int = 24  # students are reminded of lessons starting within this long
+    reminder_interval_seconds: int = 60 * 15  # how often the dispatcher runs
+    reminder_batch_size: int = 100  # recipients sent to over each SMTP connection
+
     # JWT Authentication
     secret_key: str = 'secret'
     algorithm: str = 'HS256'
@@ -1,5 +1,7 @@
+import sqlite3
 from typing import Generator
 
+from sqlalchemy import Engine, event
 from sqlmodel import Session, SQLModel, create_engine
 
 from .config import settings
@@ -9,10 +11,20 @@ settings.database_url = settings.database_url.replace('postgres://', 'postgresql
 engine = create_engine(settings.database_url, echo=settings.debug)
 
 
+@event.listens_for(Engine, 'connect')
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    """SQLite ignores foreign keys, and so ON DELETE CASCADE, unless they are enabled on each connection"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
 
 
 def get_session() -> Generator[Session, None, None]:
-    with Session(engine) as session:
+    # Objects stay loaded after commit, so write endpoints can build their response without reloading each row
+    with Session(engine, expire_on_commit=False) as session:
         yield session
@@ -0,0 +1,19 @@
+import smtplib
+from contextlib import contextmanager
+from typing import Iterator
+
+from .config import settings
+
+
+@contextmanager
+def smtp_connection() -> Iterator[smtplib.SMTP]:
+    """
+    Open a connection to the SMTP server in settings, logged in if there are credentials. Send every message of a
+    batch over the one connection rather than connecting for each.
+    """
+    with smtplib.SMTP(settings.smtp_host, settings.smtp_port, timeout=settings.smtp_timeout) as smtp:
+        if settings.smtp_starttls:
+            smtp.starttls()
+        if settings.smtp_username:
+            smtp.login(settings.smtp_username, settings.smtp_password or '')
+        yield smtp
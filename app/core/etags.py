@@ -0,0 +1,27 @@
+import hashlib
+from typing import Any, Optional
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts: Any) -> str:
+    """Build a strong ETag from the values that identify the content of a response"""
+    digest = hashlib.sha256('|'.join(str(part) for part in parts).encode()).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def etag_not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """
+    Set the ETag header on the response. If the request's If-None-Match header already matches it, return a 304
+    response for the endpoint to return instead of building the body.
+    """
+    response.headers['ETag'] = etag
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return None
+
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    client_etags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    if '*' in client_etags or etag in client_etags:
+        return Response(status_code=304, headers={'ETag': etag})
+    return None
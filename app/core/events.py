@@ -0,0 +1,126 @@
+import asyncio
+import itertools
+import json
+import logging
+import re
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Optional
+
+import redis
+import redis.asyncio
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+LESSON_EVENTS_STREAM = 'lesson-events'
+
+
+class EventBroker(ABC):
+    """
+    Fans events raised by the write endpoints out to every open stream. Each event is given an ID so a client that
+    reconnects can resume from the last event it saw.
+    """
+
+    @abstractmethod
+    def publish(self, events: list[dict]) -> None:
+        """Publish events, in order"""
+
+    @abstractmethod
+    def is_valid_id(self, event_id: str) -> bool:
+        """Whether an ID sent back by a client (Last-Event-ID) is one this broker could have issued"""
+
+    @abstractmethod
+    async def latest_id(self) -> str:
+        """The ID of the most recent event, used as the starting point for a new stream"""
+
+    @abstractmethod
+    async def read(self, last_id: str, timeout: float) -> list[tuple[str, dict]]:
+        """Wait up to timeout seconds for events published after last_id"""
+
+
+class RedisEventBroker(EventBroker):
+    """
+    Events are appended to a capped Redis stream rather than sent with pub/sub, so that a client reconnecting with
+    Last-Event-ID can be sent the events it missed while it was disconnected.
+    """
+
+    def __init__(self, url: str, stream: str = LESSON_EVENTS_STREAM, maxlen: int = 10_000):
+        self.stream = stream
+        self.maxlen = maxlen
+        self.redis = redis.Redis.from_url(url)
+        self.async_redis = redis.asyncio.Redis.from_url(url)
+
+    def publish(self, events: list[dict]) -> None:
+        # Events are best effort, a write that has been committed shouldn't fail because Redis is unavailable
+        try:
+            with self.redis.pipeline(transaction=False) as pipe:
+                for event in events:
+                    pipe.xadd(self.stream, {'data': json.dumps(event)}, maxlen=self.maxlen, approximate=True)
+                pipe.execute()
+        except redis.RedisError:
+            logger.exception('Failed to publish %d events to %s', len(events), self.stream)
+
+    def is_valid_id(self, event_id: str) -> bool:
+        return bool(re.fullmatch(r'\d+(-\d+)?', event_id))
+
+    async def latest_id(self) -> str:
+        entries = await self.async_redis.xrevrange(self.stream, count=1)
+        return entries[0][0].decode() if entries else '0-0'
+
+    async def read(self, last_id: str, timeout: float) -> list[tuple[str, dict]]:
+        response = await self.async_redis.xread({self.stream: last_id}, count=100, block=int(timeout * 1000))
+        if not response:
+            return []
+        _, entries = response[0]
+        return [(event_id.decode(), json.loads(fields[b'data'])) for event_id, fields in entries]
+
+
+class InMemoryEventBroker(EventBroker):
+    """An in-process broker used in tests and local development, events are only seen by the current worker"""
+
+    poll_interval = 0.05
+
+    def __init__(self, maxlen: int = 10_000):
+        self.events = deque(maxlen=maxlen)
+        self._ids = itertools.count(1)
+        # Writes are published from the threadpool while streams read on the event loop
+        self._lock = threading.Lock()
+
+    def publish(self, events: list[dict]) -> None:
+        with self._lock:
+            self.events.extend((next(self._ids), event) for event in events)
+
+    def is_valid_id(self, event_id: str) -> bool:
+        return event_id.isdigit()
+
+    async def latest_id(self) -> str:
+        with self._lock:
+            return str(self.events[-1][0]) if self.events else '0'
+
+    async def read(self, last_id: str, timeout: float) -> list[tuple[str, dict]]:
+        after = int(last_id)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            with self._lock:
+                events = [(str(event_id), event) for event_id, event in self.events if event_id > after]
+            if events or loop.time() >= deadline:
+                return events
+            await asyncio.sleep(self.poll_interval)
+
+
+_event_broker: Optional[EventBroker] = None
+
+
+def get_event_broker() -> EventBroker:
+    """Get the event broker for this worker, a memory:// redis_url uses the in-process broker"""
+    global _event_broker
+    if _event_broker is None:
+        if settings.redis_url.startswith('memory://'):
+            _event_broker = InMemoryEventBroker(maxlen=settings.lesson_stream_maxlen)
+        else:
+            _event_broker = RedisEventBroker(settings.redis_url, maxlen=settings.lesson_stream_maxlen)
+    return _event_broker
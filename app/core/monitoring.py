@@ -0,0 +1,55 @@
+import logging
+from functools import cache
+from typing import Any, Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def configure_monitoring():
+    """Initialise Sentry and Logfire, if they're configured, in the API or a Celery worker process"""
+    if settings.sentry_dsn:
+        import sentry_sdk
+
+        sentry_sdk.init(dsn=settings.sentry_dsn, traces_sample_rate=1.0)
+        logger.info('Sentry initialized')
+
+    if settings.logfire_token:
+        try:
+            import logfire
+
+            logfire.configure(token=settings.logfire_token)
+            logger.info('Logfire initialized')
+        except ImportError:
+            logger.warning('Logfire token provided but logfire not properly configured')
+
+
+@cache
+def _instrument(kind: str, name: str, unit: str) -> Optional[Any]:
+    """
+    The Logfire metric instrument of a kind (histogram, counter or gauge) by name, created once. Until Logfire is
+    configured the instruments record nothing, and without Logfire installed there are none.
+    """
+    try:
+        import logfire
+    except ImportError:
+        return None
+    return getattr(logfire, f'metric_{kind}')(name, unit=unit)
+
+
+def record_histogram(name: str, value: float, unit: str = 's', **attributes):
+    """Record a value, e.g. a duration, in a distribution"""
+    if instrument := _instrument('histogram', name, unit):
+        instrument.record(value, attributes)
+
+
+def increment_counter(name: str, value: int = 1, unit: str = '1', **attributes):
+    if instrument := _instrument('counter', name, unit):
+        instrument.add(value, attributes)
+
+
+def set_gauge(name: str, value: float, unit: str = '1', **attributes):
+    """Record the current value of something, e.g. a queue's length"""
+    if instrument := _instrument('gauge', name, unit):
+        instrument.set(value, attributes)
@@ -0,0 +1,112 @@
+from contextvars import ContextVar
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Optional
+
+import msgpack
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+MSGPACK_MEDIA_TYPES = ('application/msgpack', 'application/x-msgpack')
+
+# Set per request by ContentNegotiationMiddleware
+_use_msgpack: ContextVar[bool] = ContextVar('use_msgpack', default=False)
+
+
+def _msgpack_default(obj: Any) -> Any:
+    """Encode the types orjson handles natively in the same way, so both formats carry the same values"""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode='json')
+    raise TypeError(f'Object of type {type(obj).__name__} is not msgpack serializable')
+
+
+class APIResponse(ORJSONResponse):
+    """
+    The default response class. Content is encoded with orjson, or as MessagePack when the client asked for it with
+    Accept: application/msgpack.
+    """
+
+    def __init__(self, content: Any = None, *args, **kwargs):
+        self.use_msgpack = _use_msgpack.get()
+        if self.use_msgpack:
+            self.media_type = MSGPACK_MEDIA_TYPES[0]
+        super().__init__(content, *args, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        if self.use_msgpack:
+            return msgpack.packb(content, default=_msgpack_default)
+        return super().render(content)
+
+
+def accept_qualities(header: str) -> dict[str, float]:
+    """Parse an Accept style header (Accept, Accept-Encoding) into the quality given to each value"""
+    qualities = {}
+    for item in header.split(','):
+        value, *params = (part.strip() for part in item.split(';'))
+        if not value:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, param_value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    q = float(param_value)
+                except ValueError:
+                    q = 0.0
+        qualities[value.lower()] = max(q, qualities.get(value.lower(), 0.0))
+    return qualities
+
+
+def _prefers_msgpack(accept: str) -> bool:
+    """Whether an Accept header ranks MessagePack at least as high as JSON"""
+    qualities = accept_qualities(accept)
+    msgpack_q = max((qualities.get(media_type, 0.0) for media_type in MSGPACK_MEDIA_TYPES))
+    json_q = max((qualities.get(media_type, 0.0) for media_type in ('application/json', 'application/*', '*/*')))
+    return msgpack_q > 0 and msgpack_q >= json_q
+
+
+def negotiated_media_type() -> str:
+    """The media type APIResponse will use for the current request, e.g. to keep ETags distinct per format"""
+    return MSGPACK_MEDIA_TYPES[0] if _use_msgpack.get() else ORJSONResponse.media_type
+
+
+class ContentNegotiationMiddleware:
+    """
+    Choose between JSON and MessagePack from the request's Accept header. This is a pure ASGI middleware so the
+    choice is visible to the endpoint, and Vary: Accept is added so caches keep the formats apart.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        token = _use_msgpack.set(_prefers_msgpack(Headers(scope=scope).get('accept', '')))
+
+        async def send_with_vary(message: Message):
+            if message['type'] == 'http.response.start':
+                MutableHeaders(scope=message).add_vary_header('Accept')
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_vary)
+        finally:
+            _use_msgpack.reset(token)
+
+
+def direct_response(content: Any, response: Optional[Response] = None, status_code: int = 200) -> APIResponse:
+    """
+    Return content that has already been built as plain data (dicts, lists, datetimes, enums), serialized once
+    rather than validated against the response_model and encoded again. Headers set on the endpoint's injected
+    response, e.g. the ETag, are carried over since FastAPI only applies them to values it serializes itself.
+    """
+    return APIResponse(content, status_code=status_code, headers=response.headers if response else None)
@@ -0,0 +1,91 @@
+from typing import Iterable, Mapping, Optional
+
+from sqlalchemy import delete, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, SQLModel, select
+
+from ..models import Lesson, Student
+from ..models.tag import LESSON_TAG_KINDS, STUDENT_TAG_KINDS, LessonTag, StudentTag, Tag, TagKind
+
+
+def intern_tags(session: Session, names: Iterable[str]) -> dict[str, int]:
+    """Get the IDs of tags by name, creating the tags that don't exist yet"""
+    names = set(names)
+    if not names:
+        return {}
+    dialect_insert = postgresql.insert if session.get_bind().dialect.name == 'postgresql' else sqlite.insert
+    # Another request may create the same tag at the same time, in which case its row is used
+    session.execute(dialect_insert(Tag).on_conflict_do_nothing(index_elements=['name']), [{'name': n} for n in names])
+    return dict(session.execute(select(Tag.name, Tag.id).where(Tag.name.in_(names))).all())
+
+
+def _set_tags(
+    session: Session,
+    junction: type[SQLModel],
+    id_field: str,
+    objects: Mapping[int, SQLModel],
+    kinds: tuple[TagKind, ...],
+    replace: bool,
+):
+    id_column = getattr(junction, id_field)
+    if replace:
+        session.execute(delete(junction).where(id_column.in_(list(objects))))
+    rows = [
+        (object_id, kind, name)
+        for object_id, obj in objects.items()
+        for kind in kinds
+        for name in dict.fromkeys(getattr(obj, kind.value) or [])
+    ]
+    if not rows:
+        return
+    tag_ids = intern_tags(session, (name for _, _, name in rows))
+    session.execute(
+        insert(junction),
+        [{id_field: object_id, 'tag_id': tag_ids[name], 'kind': kind} for object_id, kind, name in rows],
+    )
+
+
+def set_lesson_tags(session: Session, lessons: Mapping[int, SQLModel], replace: bool = False):
+    """
+    Index the tag lists of lessons, given by lesson ID, in LessonTag. Lessons being created have no tags to replace,
+    so nothing is run for those without any tags.
+    """
+    _set_tags(session, LessonTag, 'lesson_id', lessons, LESSON_TAG_KINDS, replace)
+
+
+def set_student_tags(session: Session, students: Mapping[int, SQLModel], replace: bool = False):
+    """Index the strengths and weaknesses of students, given by student ID, in StudentTag"""
+    _set_tags(session, StudentTag, 'student_id', students, STUDENT_TAG_KINDS, replace)
+
+
+def lesson_ids_with_tag(name: str, kind: Optional[TagKind] = None):
+    """A subquery of the IDs of lessons with a tag, in any of their tag lists unless kind is given"""
+    query = select(LessonTag.lesson_id).join(Tag, Tag.id == LessonTag.tag_id).where(Tag.name == name)
+    if kind:
+        query = query.where(LessonTag.kind == kind)
+    return query
+
+
+def student_ids_with_tag(name: str, kind: Optional[TagKind] = None):
+    """A subquery of the IDs of students with a tag, in their strengths or weaknesses unless kind is given"""
+    query = select(StudentTag.student_id).join(Tag, Tag.id == StudentTag.tag_id).where(Tag.name == name)
+    if kind:
+        query = query.where(StudentTag.kind == kind)
+    return query
+
+
+def backfill_tags(session: Session, batch_size: int = 1000) -> tuple[int, int]:
+    """
+    (Re)build LessonTag and StudentTag from the JSON lists of every lesson and student, a batch at a time. Returns the
+    number of lessons and students indexed.
+    """
+    counts = []
+    for model, set_tags in ((Lesson, set_lesson_tags), (Student, set_student_tags)):
+        count = 0
+        results = session.exec(select(model).order_by(model.id).execution_options(yield_per=batch_size))
+        for objects in results.partitions():
+            set_tags(session, {obj.id: obj for obj in objects}, replace=True)
+            count += len(objects)
+        session.commit()
+        counts.append(count)
+    return counts[0], counts[1]
@@ -0,0 +1,67 @@
+import time
+
+from celery.signals import (
+    before_task_publish,
+    task_failure,
+    task_postrun,
+    task_prerun,
+    task_retry,
+    worker_process_init,
+)
+
+from .monitoring import configure_monitoring, increment_counter, record_histogram
+
+# Metrics for Celery tasks, recorded from Celery's signals to the same Logfire metrics as the API:
+# - celery.task.queue_wait: seconds from a task being sent to a worker starting it, by task and queue
+# - celery.task.runtime: seconds a task ran for, by task and final state
+# - celery.task.retries and celery.task.failures, by task
+# - celery.queue.depth: tasks waiting in each queue, sampled by the sample_queue_depths task
+
+# The header a task's send time is added to, so the worker can tell how long it waited
+PUBLISHED_AT_HEADER = 'published_at'
+
+# When each task running in this process started, by task ID
+_started: dict[str, float] = {}
+
+
+@worker_process_init.connect
+def _configure_worker_monitoring(**kwargs):
+    configure_monitoring()
+
+
+@before_task_publish.connect
+def _record_published(headers: dict = None, **kwargs):
+    if headers is not None:
+        headers[PUBLISHED_AT_HEADER] = time.time()
+
+
+def _queue(task) -> str:
+    return (task.request.delivery_info or {}).get('routing_key') or 'eager'
+
+
+@task_prerun.connect
+def _record_started(task_id: str = None, task=None, **kwargs):
+    now = time.time()
+    _started[task_id] = now
+    # Workers set a message's headers as attributes of the request, tasks applied locally keep them in headers. Tasks
+    # run eagerly, rather than sent to a worker, don't wait in a queue so have neither.
+    request = task.request
+    published_at = getattr(request, PUBLISHED_AT_HEADER, None) or (request.headers or {}).get(PUBLISHED_AT_HEADER)
+    if published_at:
+        record_histogram('celery.task.queue_wait', max(now - published_at, 0), task=task.name, queue=_queue(task))
+
+
+@task_postrun.connect
+def _record_finished(task_id: str = None, task=None, state: str = None, **kwargs):
+    if (started := _started.pop(task_id, None)) is not None:
+        record_histogram('celery.task.runtime', time.time() - started, task=task.name, state=state or 'UNKNOWN')
+
+
+@task_retry.connect
+def _record_retry(sender=None, reason=None, **kwargs):
+    increment_counter('celery.task.retries', task=sender.name)
+
+
+@task_failure.connect
+def _record_failure(sender=None, exception: BaseException = None, **kwargs):
+    increment_counter('celery.task.failures', task=sender.name, exception=type(exception).__name__)
@@ -2,13 +2,16 @@ import logging
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
 
 from .api import auth, lessons, students
+from .core.compression import CompressionMiddleware
 from .core.config import settings
 from .core.database import create_db_and_tables
+from .core.monitoring import configure_monitoring
+from .core.responses import APIResponse, ContentNegotiationMiddleware
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -23,20 +26,7 @@ async def lifespan(app: FastAPI):
     logger.info('Database tables created')
 
     # Initialize monitoring
-    if settings.sentry_dsn:
-        import sentry_sdk
-
-        sentry_sdk.init(dsn=settings.sentry_dsn, traces_sample_rate=1.0)
-        logger.info('Sentry initialized')
-
-    if settings.logfire_token:
-        try:
-            import logfire
-
-            logfire.configure(token=settings.logfire_token)
-            logger.info('Logfire initialized')
-        except ImportError:
-            logger.warning('Logfire token provided but logfire not properly configured')
+    configure_monitoring()
 
     yield
 
@@ -49,6 +39,7 @@ app = FastAPI(
     description='Backend API for TutorCruncher AI tutoring management system',
     version='0.1.0',
     lifespan=lifespan,
+    default_response_class=APIResponse,
 )
 
 # Configure CORS
@@ -60,12 +51,21 @@ app.add_middleware(
     allow_methods=['*'],
     allow_headers=['*'],
 )
+# Clients sending Accept: application/msgpack get MessagePack from APIResponse
+app.add_middleware(ContentNegotiationMiddleware)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_minimum_size,
+    gzip_level=settings.compression_gzip_level,
+    brotli_quality=settings.compression_brotli_quality,
+    cache_size=settings.compression_cache_size,
+)
 
 
 # Custom exception handlers
 @app.exception_handler(HTTPException)
 async def custom_http_exception_handler(request, exc):
-    return JSONResponse(
+    return APIResponse(
         status_code=exc.status_code,
         content={'detail': exc.detail},
     )
@@ -73,7 +73,7 @@ async def custom_http_exception_handler(request, exc):
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
-    return JSONResponse(status_code=422, content={'detail': exc.errors()})
+    return APIResponse(status_code=422, content={'detail': jsonable_encoder(exc.errors())})
 
 
 # Include routers
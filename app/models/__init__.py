@@ -1,15 +1,32 @@
 from .client import Client, ClientCreate, ClientRead, ClientUpdate
 from .company import Company, CompanyCreate, CompanyRead, CompanyUpdate
-from .lesson import Lesson, LessonCreate, LessonRead, LessonStatus, LessonUpdate
+from .lesson import (
+    Lesson,
+    LessonBulkCreateResult,
+    LessonBulkError,
+    LessonChanges,
+    LessonCreate,
+    LessonRead,
+    LessonSearchResults,
+    LessonStatus,
+    LessonUpdate,
+)
+from .lesson_reminder import LessonReminder
 from .lesson_student import LessonStudent
 from .lesson_tutor import LessonTutor, LessonTutorCreate, LessonTutorRead
-from .student import Student, StudentCreate, StudentRead, StudentUpdate
+from .student import Student, StudentAnalytics, StudentChanges, StudentCreate, StudentRead, StudentUpdate
+from .tag import LessonTag, StudentTag, Tag, TagCount, TagKind
+from .tombstone import Tombstone, TombstoneType
 from .tutor_student import TutorStudent, TutorStudentCreate, TutorStudentRead
 from .user import Token, TokenData, User, UserLogin, UserRead, UserType, UserUpdate
 
 # Rebuild models to resolve forward references
 LessonRead.model_rebuild()
 StudentRead.model_rebuild()
+LessonBulkCreateResult.model_rebuild()
+LessonChanges.model_rebuild()
+LessonSearchResults.model_rebuild()
+StudentChanges.model_rebuild()
 
 __all__ = [
     'Client',
@@ -24,12 +41,19 @@ __all__ = [
     'StudentCreate',
     'StudentUpdate',
     'StudentRead',
+    'StudentChanges',
+    'StudentAnalytics',
     'Lesson',
     'LessonCreate',
     'LessonUpdate',
     'LessonRead',
+    'LessonBulkCreateResult',
+    'LessonBulkError',
+    'LessonChanges',
+    'LessonSearchResults',
     'LessonStatus',
     'LessonStudent',
+    'LessonReminder',
     'User',
     'UserUpdate',
     'UserRead',
@@ -43,4 +67,11 @@ __all__ = [
     'LessonTutor',
     'LessonTutorCreate',
     'LessonTutorRead',
+    'Tag',
+    'TagCount',
+    'TagKind',
+    'LessonTag',
+    'StudentTag',
+    'Tombstone',
+    'TombstoneType',
 ]
@@ -1,9 +1,11 @@
-from datetime import datetime, timezone
+from datetime import datetime
 from typing import TYPE_CHECKING, List, Optional
 
 from pydantic import BaseModel, EmailStr
 from sqlmodel import Field, Relationship, SQLModel
 
+from .utils import utc_now
+
 if TYPE_CHECKING:
     from backend.app.models.student import Student
 
@@ -22,7 +24,7 @@ class ClientBase(SQLModel):
 
 class Client(ClientBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=utc_now)
     updated_at: Optional[datetime] = None
     email: EmailStr = Field(unique=True)
 
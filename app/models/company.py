@@ -1,9 +1,11 @@
-from datetime import UTC, datetime
+from datetime import datetime
 from typing import TYPE_CHECKING, List, Optional
 
 from pydantic import BaseModel
 from sqlmodel import Field, Relationship, SQLModel
 
+from .utils import utc_now
+
 if TYPE_CHECKING:
     from backend.app.models.lesson import Lesson
     from backend.app.models.student import Student
@@ -17,7 +19,7 @@ class CompanyBase(SQLModel):
 
 class Company(CompanyBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+    created_at: datetime = Field(default_factory=utc_now)
     updated_at: Optional[datetime] = None
 
     # Relationships
@@ -1,11 +1,13 @@
-from datetime import datetime, timezone
+from datetime import datetime
 from enum import Enum
 from typing import TYPE_CHECKING, List, Optional
 
-from pydantic import BaseModel
-from sqlalchemy import JSON, Column
+from pydantic import BaseModel, field_validator
+from sqlalchemy import DDL, JSON, Column, Index, event
 from sqlmodel import Field, Relationship, SQLModel
 
+from .utils import as_naive_utc, utc_now
+
 if TYPE_CHECKING:
     from backend.app.models.company import Company
     from backend.app.models.lesson_student import LessonStudent
@@ -38,15 +40,32 @@ class LessonBase(SQLModel):
     student_weaknesses_observed: List[str] = Field(default_factory=list, sa_column=Column(JSON))
     tutor_tips: List[str] = Field(default_factory=list, sa_column=Column(JSON))
 
+    @field_validator('start_dt', 'end_dt')
+    @classmethod
+    def _start_and_end_as_naive_utc(cls, value: datetime) -> datetime:
+        # The columns don't store a timezone, so times with an offset are converted rather than kept as wall time
+        return as_naive_utc(value)
+
 
 class Lesson(LessonBase, table=True):
+    # Calendar views filter on start_dt within a company, or on status (e.g. upcoming planned lessons)
+    __table_args__ = (
+        Index('ix_lesson_company_id_start_dt', 'company_id', 'start_dt'),
+        Index('ix_lesson_status_start_dt', 'status', 'start_dt'),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-    updated_at: Optional[datetime] = None
+    created_at: datetime = Field(default_factory=utc_now, index=True)
+    updated_at: Optional[datetime] = Field(default=None, index=True)
 
     # Relationships
-    lesson_students: List['LessonStudent'] = Relationship(back_populates='lesson')
-    lesson_tutors: List['LessonTutor'] = Relationship(back_populates='lesson')
+    # Junction rows are removed by the database (ON DELETE CASCADE) rather than loaded and deleted one by one
+    lesson_students: List['LessonStudent'] = Relationship(
+        back_populates='lesson', cascade_delete=True, passive_deletes=True
+    )
+    lesson_tutors: List['LessonTutor'] = Relationship(
+        back_populates='lesson', cascade_delete=True, passive_deletes=True
+    )
     company: Optional['Company'] = Relationship(back_populates='lessons')
 
     @property
@@ -55,6 +74,48 @@ class Lesson(LessonBase, table=True):
         return [ls.student for ls in self.lesson_students if ls.student]
 
 
+# Full text search over the lesson's text. Postgres keeps a generated tsvector column, weighted so matches in the topic
+# and subject rank above tutor tips and skills, then notes, with a GIN index. SQLite, used in tests and locally, keeps
+# an FTS5 index of the same columns up to date with triggers. Neither is mapped on the model, only searches use them.
+LESSON_SEARCH_COLUMNS = ('topic', 'subject', 'tutor_tips', 'skills_practiced', 'notes')
+
+_lesson_search_ddl = [
+    DDL(
+        """
+        ALTER TABLE lesson ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(topic, '') || ' ' || coalesce(subject, '')), 'A') ||
+            setweight(
+                to_tsvector('english', coalesce(tutor_tips::text, '') || ' ' || coalesce(skills_practiced::text, '')),
+                'B'
+            ) ||
+            setweight(to_tsvector('english', coalesce(notes, '')), 'C')
+        ) STORED
+        """
+    ).execute_if(dialect='postgresql'),
+    DDL('CREATE INDEX IF NOT EXISTS ix_lesson_search_vector ON lesson USING gin (search_vector)').execute_if(
+        dialect='postgresql'
+    ),
+]
+_fts_columns = ', '.join(LESSON_SEARCH_COLUMNS)
+_fts_new = ', '.join(f'new.{column}' for column in LESSON_SEARCH_COLUMNS)
+_fts_old = ', '.join(f'old.{column}' for column in LESSON_SEARCH_COLUMNS)
+_fts_delete = f"INSERT INTO lesson_search(lesson_search, rowid, {_fts_columns}) VALUES ('delete', old.id, {_fts_old});"
+_fts_insert = f'INSERT INTO lesson_search(rowid, {_fts_columns}) VALUES (new.id, {_fts_new});'
+_lesson_search_ddl += [
+    DDL(statement).execute_if(dialect='sqlite')
+    for statement in (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS lesson_search USING fts5({_fts_columns}, content='lesson', "
+        f"content_rowid='id', tokenize='porter unicode61')",
+        f'CREATE TRIGGER IF NOT EXISTS lesson_search_insert AFTER INSERT ON lesson BEGIN {_fts_insert} END',
+        f'CREATE TRIGGER IF NOT EXISTS lesson_search_delete AFTER DELETE ON lesson BEGIN {_fts_delete} END',
+        f'CREATE TRIGGER IF NOT EXISTS lesson_search_update AFTER UPDATE ON lesson BEGIN {_fts_delete} {_fts_insert} END',
+    )
+]
+for _ddl in _lesson_search_ddl:
+    event.listen(Lesson.__table__, 'after_create', _ddl)
+event.listen(Lesson.__table__, 'before_drop', DDL('DROP TABLE IF EXISTS lesson_search').execute_if(dialect='sqlite'))
+
+
 class LessonCreate(LessonBase):
     student_ids: List[int] = Field(default_factory=list)  # List of student IDs to associate with the lesson
 
@@ -72,9 +133,41 @@ class LessonUpdate(BaseModel):
     # Note: skills_practiced, main_subjects_covered, student_strengths_observed,
     # student_weaknesses_observed, and tutor_tips are intentionally excluded from updates
 
+    @field_validator('start_dt', 'end_dt')
+    @classmethod
+    def _start_and_end_as_naive_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        return as_naive_utc(value) if value else value
+
 
 class LessonRead(LessonBase):
     id: int
     created_at: datetime
     updated_at: Optional[datetime] = None
     students: List['Student'] = Field(default_factory=list)  # Include students in read response
+
+
+class LessonSearchResults(BaseModel):
+    """A page of lessons matching a search, best match first"""
+
+    total: int
+    lessons: List[LessonRead] = Field(default_factory=list)
+
+
+class LessonChanges(BaseModel):
+    """Lessons created, updated or deleted since a cursor"""
+
+    cursor: Optional[datetime] = None
+    lessons: List[LessonRead] = Field(default_factory=list)
+    deleted_ids: List[int] = Field(default_factory=list)
+
+
+class LessonBulkError(BaseModel):
+    """A lesson from a bulk create request that could not be created"""
+
+    index: int
+    detail: str
+
+
+class LessonBulkCreateResult(BaseModel):
+    created: List[LessonRead] = Field(default_factory=list)
+    errors: List[LessonBulkError] = Field(default_factory=list)
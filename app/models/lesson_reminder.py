@@ -0,0 +1,13 @@
+from datetime import datetime
+
+from sqlmodel import Field, SQLModel
+
+from .utils import utc_now
+
+
+class LessonReminder(SQLModel, table=True):
+    """A reminder sent to a student about a lesson, recorded so each is only ever sent once"""
+
+    lesson_id: int = Field(foreign_key='lesson.id', primary_key=True, ondelete='CASCADE')
+    student_id: int = Field(foreign_key='student.id', primary_key=True, ondelete='CASCADE')
+    sent_at: datetime = Field(default_factory=utc_now)
@@ -10,8 +10,8 @@ if TYPE_CHECKING:
 class LessonStudent(SQLModel, table=True):
     """Junction table for many-to-many relationship between lessons and students"""
 
-    lesson_id: Optional[int] = Field(default=None, foreign_key='lesson.id', primary_key=True)
-    student_id: Optional[int] = Field(default=None, foreign_key='student.id', primary_key=True)
+    lesson_id: Optional[int] = Field(default=None, foreign_key='lesson.id', primary_key=True, ondelete='CASCADE')
+    student_id: Optional[int] = Field(default=None, foreign_key='student.id', primary_key=True, ondelete='CASCADE')
 
     # Relationships
     lesson: Optional['Lesson'] = Relationship(back_populates='lesson_students')
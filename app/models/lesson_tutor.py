@@ -1,21 +1,23 @@
-from datetime import datetime, timezone
+from datetime import datetime
 from typing import TYPE_CHECKING, Optional
 
 from sqlmodel import Field, Relationship, SQLModel
 
+from .utils import utc_now
+
 if TYPE_CHECKING:
     from backend.app.models.lesson import Lesson
     from backend.app.models.user import User
 
 
 class LessonTutorBase(SQLModel):
-    lesson_id: int = Field(foreign_key='lesson.id')
-    tutor_id: int = Field(foreign_key='user.id')
+    lesson_id: int = Field(foreign_key='lesson.id', ondelete='CASCADE')
+    tutor_id: int = Field(foreign_key='user.id', index=True)
 
 
 class LessonTutor(LessonTutorBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=utc_now)
 
     lesson: Optional['Lesson'] = Relationship(back_populates='lesson_tutors')
     tutor: Optional['User'] = Relationship(back_populates='lesson_tutors')
@@ -1,10 +1,12 @@
-from datetime import UTC, datetime
+from datetime import datetime
 from typing import TYPE_CHECKING, List, Optional
 
 from pydantic import BaseModel, EmailStr
 from sqlalchemy import JSON, Column
 from sqlmodel import Field, Relationship, SQLModel
 
+from .utils import utc_now
+
 if TYPE_CHECKING:
     from backend.app.models.client import Client
     from backend.app.models.company import Company
@@ -28,13 +30,18 @@ class StudentBase(SQLModel):
 
 class Student(StudentBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
-    updated_at: Optional[datetime] = None
+    created_at: datetime = Field(default_factory=utc_now, index=True)
+    updated_at: Optional[datetime] = Field(default=None, index=True)
 
     # Relationships
-    lesson_students: List['LessonStudent'] = Relationship(back_populates='student')
+    # Junction rows are removed by the database (ON DELETE CASCADE) rather than loaded and deleted one by one
+    lesson_students: List['LessonStudent'] = Relationship(
+        back_populates='student', cascade_delete=True, passive_deletes=True
+    )
     client: Optional['Client'] = Relationship(back_populates='students')
-    student_tutors: List['TutorStudent'] = Relationship(back_populates='student')
+    student_tutors: List['TutorStudent'] = Relationship(
+        back_populates='student', cascade_delete=True, passive_deletes=True
+    )
     company: Optional['Company'] = Relationship(back_populates='students')
 
     @property
@@ -44,7 +51,7 @@ class Student(StudentBase, table=True):
 
     @property
     def lessons_completed(self) -> int:
-        return len(self.lessons)
+        return len(self.lesson_students)
 
 
 class StudentCreate(StudentBase):
@@ -69,3 +76,46 @@ class StudentRead(StudentBase):
     lessons_completed: int = 0
     company_name: Optional[str] = None
     tutorcruncher_url: Optional[str] = None
+
+
+class StudentChanges(BaseModel):
+    """Students created, updated or deleted since a cursor"""
+
+    cursor: Optional[datetime] = None
+    students: List[StudentRead] = Field(default_factory=list)
+    deleted_ids: List[int] = Field(default_factory=list)
+
+
+class LessonDurationStats(BaseModel):
+    """Lesson lengths in minutes"""
+
+    mean: float
+    min: float
+    max: float
+    p25: float
+    p50: float
+    p75: float
+    p90: float
+
+
+class LessonCadence(BaseModel):
+    active_weeks: int
+    lessons_per_active_week: float
+    longest_gap_weeks: int
+    # Lessons on each day of the week, from Monday
+    weekday_counts: List[int]
+
+
+class SkillPair(BaseModel):
+    tags: List[str]
+    count: int
+
+
+class StudentAnalytics(BaseModel):
+    """Statistics over a student's lessons, None when they have none"""
+
+    student_id: int
+    lessons: int
+    duration: Optional[LessonDurationStats] = None
+    cadence: Optional[LessonCadence] = None
+    skill_pairs: List[SkillPair] = Field(default_factory=list)
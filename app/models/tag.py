@@ -0,0 +1,67 @@
+from enum import Enum
+from typing import Optional
+
+from pydantic import BaseModel
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel
+
+
+class TagKind(str, Enum):
+    """The list a tag came from, named after the lesson or student field"""
+
+    SKILLS_PRACTICED = 'skills_practiced'
+    MAIN_SUBJECTS_COVERED = 'main_subjects_covered'
+    STUDENT_STRENGTHS_OBSERVED = 'student_strengths_observed'
+    STUDENT_WEAKNESSES_OBSERVED = 'student_weaknesses_observed'
+    TUTOR_TIPS = 'tutor_tips'
+    STRENGTHS = 'strengths'
+    WEAKNESSES = 'weaknesses'
+
+
+LESSON_TAG_KINDS = (
+    TagKind.SKILLS_PRACTICED,
+    TagKind.MAIN_SUBJECTS_COVERED,
+    TagKind.STUDENT_STRENGTHS_OBSERVED,
+    TagKind.STUDENT_WEAKNESSES_OBSERVED,
+    TagKind.TUTOR_TIPS,
+)
+STUDENT_TAG_KINDS = (TagKind.STRENGTHS, TagKind.WEAKNESSES)
+
+
+class Tag(SQLModel, table=True):
+    """
+    An interned tag name. The JSON lists on lessons and students stay the source of their API shapes, and are
+    indexed through LessonTag and StudentTag so tags can be filtered on and counted without parsing every row.
+    """
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str = Field(unique=True)
+
+
+class LessonTag(SQLModel, table=True):
+    """Junction table between lessons and the tags in each of their tag lists"""
+
+    # Filters look lessons up by tag, the primary key covers lookups by lesson
+    __table_args__ = (Index('ix_lessontag_tag_id_kind', 'tag_id', 'kind'),)
+
+    lesson_id: int = Field(foreign_key='lesson.id', primary_key=True, ondelete='CASCADE')
+    tag_id: int = Field(foreign_key='tag.id', primary_key=True)
+    kind: TagKind = Field(primary_key=True)
+
+
+class StudentTag(SQLModel, table=True):
+    """Junction table between students and the tags in their strengths and weaknesses"""
+
+    __table_args__ = (Index('ix_studenttag_tag_id_kind', 'tag_id', 'kind'),)
+
+    student_id: int = Field(foreign_key='student.id', primary_key=True, ondelete='CASCADE')
+    tag_id: int = Field(foreign_key='tag.id', primary_key=True)
+    kind: TagKind = Field(primary_key=True)
+
+
+class TagCount(BaseModel):
+    """How many lessons or students have a tag"""
+
+    name: str
+    kind: TagKind
+    count: int
@@ -0,0 +1,32 @@
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel
+
+from .utils import utc_now
+
+
+class TombstoneType(str, Enum):
+    """Type of object a tombstone records the deletion of"""
+
+    LESSON = 'lesson'
+    STUDENT = 'student'
+
+
+class Tombstone(SQLModel, table=True):
+    """
+    Record of a deleted lesson or student, so clients syncing changes since a cursor can remove it too. There is one
+    row per tutor the object was linked to (or a single row with no tutor), and company_id is kept so the tombstones
+    can be scoped the same way as the objects were.
+    """
+
+    __table_args__ = (Index('ix_tombstone_object_type_deleted_at', 'object_type', 'deleted_at'),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    object_type: TombstoneType
+    object_id: int
+    company_id: Optional[int] = None
+    tutor_id: Optional[int] = None
+    deleted_at: datetime = Field(default_factory=utc_now)
@@ -1,8 +1,10 @@
-from datetime import datetime, timezone
+from datetime import datetime
 from typing import TYPE_CHECKING, Optional
 
 from sqlmodel import Field, Relationship, SQLModel
 
+from .utils import utc_now
+
 if TYPE_CHECKING:
     from backend.app.models.student import Student
     from backend.app.models.user import User
@@ -10,12 +12,12 @@ if TYPE_CHECKING:
 
 class TutorStudentBase(SQLModel):
     tutor_id: int = Field(foreign_key='user.id')
-    student_id: int = Field(foreign_key='student.id')
+    student_id: int = Field(foreign_key='student.id', ondelete='CASCADE')
 
 
 class TutorStudent(TutorStudentBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=utc_now)
 
     tutor: Optional['User'] = Relationship(back_populates='tutor_students')
     student: Optional['Student'] = Relationship(back_populates='student_tutors')
@@ -0,0 +1,16 @@
+from datetime import UTC, datetime
+
+
+def utc_now() -> datetime:
+    """
+    The current UTC time without tzinfo. The timestamp columns don't store a timezone, so this matches the value
+    read back from the database and objects that aren't refreshed after a write serialize the same way.
+    """
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+def as_naive_utc(value: datetime) -> datetime:
+    """Convert a datetime from a request to naive UTC so it compares correctly with the stored timestamps"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(UTC).replace(tzinfo=None)
@@ -1,4 +1,11 @@
-from .analytics_tasks import generate_student_report
-from .email_tasks import send_lesson_reminder
+from .analytics_tasks import generate_company_report, generate_student_report
+from .email_tasks import dispatch_lesson_reminders, send_lesson_reminder
+from .monitoring_tasks import sample_queue_depths
 
-__all__ = ['send_lesson_reminder', 'generate_student_report']
+__all__ = [
+    'send_lesson_reminder',
+    'dispatch_lesson_reminders',
+    'generate_student_report',
+    'generate_company_report',
+    'sample_queue_depths',
+]
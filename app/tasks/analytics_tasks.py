@@ -1,32 +1,219 @@
+import json
 import logging
-from typing import Any, Dict
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
 
-from ..core.celery_app import celery_app
+from celery import chord
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from ..core.analytics import lesson_duration_seconds, student_analytics
+from ..core.cache import Cache, get_cache
+from ..core.celery_app import CoalescedTask, celery_app
+from ..core.config import settings
+from ..core.database import engine
+from ..models import Lesson, LessonStudent, LessonTag, Student, Tag, TagKind
 
 logger = logging.getLogger(__name__)
 
+# Reports can take longer than the default time limits allow, and their messages can use a more compact serializer
+REPORT_TASK_OPTIONS = {
+    'soft_time_limit': settings.celery_report_soft_time_limit,
+    'time_limit': settings.celery_report_time_limit,
+    'serializer': settings.celery_report_serializer,
+}
 
-@celery_app.task
-def generate_student_report(student_id: int) -> Dict[str, Any]:
-    """Generate a comprehensive report for a student"""
-    logger.info(f'Generating report for student {student_id}')
+# The lesson tag lists a report summarises, and the key each is reported under
+REPORT_TAG_KINDS = {
+    TagKind.SKILLS_PRACTICED: 'most_practiced_skills',
+    TagKind.STUDENT_STRENGTHS_OBSERVED: 'strengths_observed',
+    TagKind.STUDENT_WEAKNESSES_OBSERVED: 'weaknesses_observed',
+}
+
+
+def _isoformat(dt) -> Optional[str]:
+    # SQLite returns min() and max() of datetimes as strings
+    return dt if dt is None or isinstance(dt, str) else dt.isoformat()
+
+
+def build_student_reports(session: Session, student_ids: list[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    Summarise the lessons of each of the students: how many there are, their average length, a breakdown by status,
+    the skills practiced most and the strengths and weaknesses observed, with when each was first and last seen, and
+    the analytics from student_analytics. However many students there are, the summary and the tag counts are each a
+    single query grouped by student, the tags read through the LessonTag index, and the analytics two more.
+    """
+    reports = {
+        student_id: {
+            'student_id': student_id,
+            'total_lessons': 0,
+            'average_duration': 0,
+            'status_breakdown': {},
+            **{key: [] for key in REPORT_TAG_KINDS.values()},
+        }
+        for student_id in student_ids
+    }
+    student_lessons = LessonStudent.student_id.in_(student_ids)
+
+    total_seconds = dict.fromkeys(student_ids, 0)
+    status_rows = session.exec(
+        select(
+            LessonStudent.student_id, Lesson.status, func.count(Lesson.id), func.sum(lesson_duration_seconds(session))
+        )
+        .join(Lesson, Lesson.id == LessonStudent.lesson_id)
+        .where(student_lessons)
+        .group_by(LessonStudent.student_id, Lesson.status)
+    )
+    for student_id, status, count, seconds in status_rows:
+        report = reports[student_id]
+        report['total_lessons'] += count
+        report['status_breakdown'][status.value] = count
+        total_seconds[student_id] += seconds or 0
+    for student_id, report in reports.items():
+        if report['total_lessons']:
+            # In minutes
+            report['average_duration'] = round(total_seconds[student_id] / report['total_lessons'] / 60, 1)
+
+    tag_rows = session.exec(
+        select(
+            LessonStudent.student_id,
+            LessonTag.kind,
+            Tag.name,
+            func.count(LessonTag.lesson_id),
+            func.min(Lesson.start_dt),
+            func.max(Lesson.start_dt),
+        )
+        .join(LessonTag, LessonTag.lesson_id == LessonStudent.lesson_id)
+        .join(Tag, Tag.id == LessonTag.tag_id)
+        .join(Lesson, Lesson.id == LessonStudent.lesson_id)
+        .where(student_lessons, LessonTag.kind.in_(list(REPORT_TAG_KINDS)))
+        .group_by(LessonStudent.student_id, LessonTag.kind, Tag.name)
+        .order_by(func.count(LessonTag.lesson_id).desc(), Tag.name)
+    )
+    for student_id, kind, name, count, first_seen, last_seen in tag_rows:
+        entries = reports[student_id][REPORT_TAG_KINDS[kind]]
+        if len(entries) < settings.report_top_tags:
+            entries.append(
+                {'name': name, 'count': count, 'first_seen': _isoformat(first_seen), 'last_seen': _isoformat(last_seen)}
+            )
+
+    for student_id, analytics in student_analytics(session, student_ids).items():
+        reports[student_id]['analytics'] = {key: value for key, value in analytics.items() if key != 'student_id'}
+    return reports
 
-    # This is a placeholder task for generating student analytics
-    # In a real implementation, you would query the database and generate insights
 
-    # Simulate report generation
-    import time
+def build_student_report(session: Session, student_id: int, cache: Optional[Cache] = None) -> Dict[str, Any]:
+    """
+    Build the report described in build_student_reports for a single student.
 
-    time.sleep(5)  # Simulate processing time
+    A report only changes when one of the student's lessons does, so with a cache it's stored under the student's
+    latest lesson change and lesson count (which catches a lesson being removed), and served from there until
+    either moves.
+    """
+    student_lessons = select(LessonStudent.lesson_id).where(LessonStudent.student_id == student_id)
+    last_updated, lesson_count = session.exec(
+        select(func.max(func.coalesce(Lesson.updated_at, Lesson.created_at)), func.count(Lesson.id)).where(
+            Lesson.id.in_(student_lessons)
+        )
+    ).one()
+    cache_key = f'student-report:{student_id}:{_isoformat(last_updated)}:{lesson_count}'
+    if cache and (report := cache.get(cache_key)):
+        return report
 
     report = {
-        'student_id': student_id,
-        'total_lessons': 0,  # Would be calculated from database
-        'average_duration': 0,  # Would be calculated from database
-        'most_practiced_skills': [],  # Would be analyzed from lessons
-        'progress_summary': 'Report generated successfully',
+        **build_student_reports(session, [student_id])[student_id],
+        'last_updated': _isoformat(last_updated),
         'generated_at': time.time(),
     }
+    if cache:
+        cache.set(cache_key, report, ttl=settings.report_cache_ttl_seconds)
+    return report
+
 
+@celery_app.task(base=CoalescedTask, **REPORT_TASK_OPTIONS)
+def generate_student_report(student_id: int) -> Dict[str, Any]:
+    """Generate a comprehensive report for a student"""
+    logger.info(f'Generating report for student {student_id}')
+    with Session(engine) as session:
+        report = build_student_report(session, student_id, cache=get_cache())
     logger.info(f'Report generated successfully for student {student_id}')
     return report
+
+
+def _company_report_key(job_id: str) -> str:
+    return f'company-report:{job_id}'
+
+
+def get_company_report_progress(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    The progress of a company report started by generate_company_report, with the fraction of its chunks that are
+    done, or None for an unknown (or long finished) job. Once complete it includes the artifact and the runtime.
+    """
+    cache = get_cache()
+    if not (job := cache.get(_company_report_key(job_id))):
+        return None
+    chunks_done = cache.get(f'{_company_report_key(job_id)}:done') or 0
+    progress = chunks_done / job['chunks'] if job['chunks'] else 1
+    return {**job, 'chunks_done': chunks_done, 'progress': round(progress, 3)}
+
+
+@celery_app.task(bind=True, base=CoalescedTask, **REPORT_TASK_OPTIONS)
+def generate_company_report(self, company_id: int) -> Dict[str, Any]:
+    """
+    Generate the report for every student in a company. Rather than a task per student, the students are split into
+    chunks of report_chunk_size which run in parallel on the workers as a chord, each building its reports with
+    build_student_reports. The chord's callback writes them all to a single JSON artifact.
+
+    Returns the job, which get_company_report_progress reports on using this task's id.
+    """
+    job_id = self.request.id
+    with Session(engine) as session:
+        student_ids = session.exec(
+            select(Student.id).where(Student.company_id == company_id).order_by(Student.id)
+        ).all()
+    size = settings.report_chunk_size
+    chunks = [student_ids[i : i + size] for i in range(0, len(student_ids), size)]
+
+    job = {'job_id': job_id, 'company_id': company_id, 'students': len(student_ids), 'chunks': len(chunks)}
+    get_cache().set(_company_report_key(job_id), {**job, 'status': 'running'}, ttl=settings.report_cache_ttl_seconds)
+    logger.info(f'Generating report for company {company_id}: {len(student_ids)} students in {len(chunks)} chunks')
+
+    callback = write_company_report.s(job_id, company_id, time.time())
+    if chunks:
+        chord(generate_report_chunk.s(job_id, chunk) for chunk in chunks)(callback)
+    else:
+        callback.delay([])
+    return job
+
+
+@celery_app.task(**REPORT_TASK_OPTIONS)
+def generate_report_chunk(job_id: str, student_ids: list[int]) -> list[Dict[str, Any]]:
+    """Build the reports for one chunk of a company report's students"""
+    with Session(engine) as session:
+        reports = build_student_reports(session, student_ids)
+    get_cache().incr(f'{_company_report_key(job_id)}:done', ttl=settings.report_cache_ttl_seconds)
+    return list(reports.values())
+
+
+@celery_app.task(**REPORT_TASK_OPTIONS)
+def write_company_report(chunk_reports: list[list[Dict[str, Any]]], job_id: str, company_id: int, started: float):
+    """Write the reports from every chunk to the company report's artifact, and record the job as complete"""
+    reports = sorted((report for chunk in chunk_reports for report in chunk), key=lambda report: report['student_id'])
+    runtime = round(time.time() - started, 3)
+    artifact = Path(settings.report_artifact_dir) / f'company-{company_id}-{job_id}.json'
+    artifact.parent.mkdir(parents=True, exist_ok=True)
+    # Written to a temporary file and moved into place, so the artifact is never seen half written
+    tmp_artifact = artifact.with_suffix('.tmp')
+    tmp_artifact.write_text(
+        json.dumps({'company_id': company_id, 'generated_at': time.time(), 'runtime': runtime, 'reports': reports})
+    )
+    tmp_artifact.replace(artifact)
+
+    cache = get_cache()
+    key = _company_report_key(job_id)
+    job = cache.get(key) or {'job_id': job_id, 'company_id': company_id, 'chunks': len(chunk_reports)}
+    job.update(status='complete', students=len(reports), artifact=str(artifact), runtime=runtime)
+    cache.set(key, job, ttl=settings.report_cache_ttl_seconds)
+    logger.info(f'Report for company {company_id} written to {artifact} in {runtime}s')
+    return job
@@ -1,21 +1,144 @@
 import logging
+import smtplib
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from itertools import groupby
+from typing import Any, Dict
 
-from ..core.celery_app import celery_app
+from sqlalchemy import and_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+
+from ..core.celery_app import CoalescedTask, celery_app
+from ..core.config import settings
+from ..core.database import engine
+from ..core.email import smtp_connection
+from ..models import Lesson, LessonReminder, LessonStatus, LessonStudent, Student
+from ..models.utils import utc_now
 
 logger = logging.getLogger(__name__)
 
 
-@celery_app.task
-def send_lesson_reminder(student_id: int, lesson_id: int, email: str):
-    """Send a lesson reminder email to a student"""
-    # This is a placeholder task for sending email reminders
-    # In a real implementation, you would integrate with an email service
-    logger.info(f'Sending lesson reminder to student {student_id} for lesson {lesson_id} at {email}')
+@dataclass
+class ReminderEmail:
+    """A reminder to one student of all their upcoming lessons, as (lesson ID, start, subject, topic) rows"""
+
+    student_id: int
+    email: str
+    first_name: str
+    lessons: list[tuple[int, datetime, str, str]] = field(default_factory=list)
+
+    def message(self) -> EmailMessage:
+        message = EmailMessage()
+        message['From'] = settings.email_from
+        message['To'] = self.email
+        if len(self.lessons) == 1:
+            message['Subject'] = f'Reminder: {self.lessons[0][2]} lesson on {self.lessons[0][1]:%A %d %B}'
+        else:
+            message['Subject'] = f'Reminder: {len(self.lessons)} upcoming lessons'
+        lines = [f'- {start:%A %d %B at %H:%M} UTC: {subject}, {topic}' for _, start, subject, topic in self.lessons]
+        message.set_content(f'Hi {self.first_name},\n\nYour upcoming lessons:\n\n' + '\n'.join(lines) + '\n')
+        return message
+
+
+def _reminder_query():
+    """Lessons joined to their students, without those the student has already been reminded of"""
+    return (
+        select(Student.id, Student.email, Student.first_name, Lesson.id, Lesson.start_dt, Lesson.subject, Lesson.topic)
+        .join(LessonStudent, LessonStudent.lesson_id == Lesson.id)
+        .join(Student, Student.id == LessonStudent.student_id)
+        .outerjoin(LessonReminder, and_(LessonReminder.lesson_id == Lesson.id, LessonReminder.student_id == Student.id))
+        .where(LessonReminder.lesson_id.is_(None))
+    )
+
+
+def _group_reminders(rows) -> list[ReminderEmail]:
+    """Group reminder rows, ordered by student, into one email per student"""
+    reminders = []
+    for (student_id, email, first_name), student_rows in groupby(rows, key=lambda row: row[:3]):
+        reminders.append(ReminderEmail(student_id, email, first_name, [tuple(row[3:]) for row in student_rows]))
+    return reminders
 
-    # Simulate email sending
-    import time
 
-    time.sleep(2)  # Simulate processing time
+def due_reminders(session: Session, start: datetime, end: datetime) -> list[ReminderEmail]:
+    """
+    The reminders to send for planned lessons starting from start until end, which haven't been sent yet. The lessons
+    are found with a range scan of the status and start_dt index, and grouped so each student gets a single email.
+    """
+    rows = session.execute(
+        _reminder_query()
+        .where(Lesson.status == LessonStatus.PLANNED, Lesson.start_dt >= start, Lesson.start_dt < end)
+        .order_by(Student.id, Lesson.start_dt)
+    ).all()
+    return _group_reminders(rows)
 
-    logger.info(f'Lesson reminder sent successfully to {email}')
-    return {'status': 'sent', 'student_id': student_id, 'lesson_id': lesson_id}
+
+def _record_sent(session: Session, reminders: list[ReminderEmail]):
+    dialect_insert = postgresql.insert if session.get_bind().dialect.name == 'postgresql' else sqlite.insert
+    sent_at = utc_now()
+    # Another dispatcher may have sent the same reminder, in which case its row is kept
+    session.execute(
+        dialect_insert(LessonReminder).on_conflict_do_nothing(),
+        [
+            {'lesson_id': lesson[0], 'student_id': reminder.student_id, 'sent_at': sent_at}
+            for reminder in reminders
+            for lesson in reminder.lessons
+        ],
+    )
+    session.commit()
+
+
+def send_reminders(session: Session, reminders: list[ReminderEmail]) -> int:
+    """
+    Send reminders in batches of reminder_batch_size, each over a single SMTP connection, and record them as sent
+    once a batch is done (or fails part way through) so they're never sent again. A recipient the server refuses is
+    logged and left to be retried next time. Returns the number of emails sent.
+    """
+    sent_count = 0
+    for i in range(0, len(reminders), settings.reminder_batch_size):
+        sent = []
+        try:
+            with smtp_connection() as smtp:
+                for reminder in reminders[i : i + settings.reminder_batch_size]:
+                    try:
+                        smtp.send_message(reminder.message())
+                    except smtplib.SMTPRecipientsRefused:
+                        logger.warning('Lesson reminder to student %s refused', reminder.student_id)
+                        continue
+                    sent.append(reminder)
+        finally:
+            if sent:
+                _record_sent(session, sent)
+                sent_count += len(sent)
+    return sent_count
+
+
+# Nothing waits on reminder tasks, so their results aren't written to the result backend
+@celery_app.task(base=CoalescedTask, ignore_result=True)
+def dispatch_lesson_reminders() -> Dict[str, Any]:
+    """
+    Send students a reminder of their planned lessons starting within the next reminder_lead_hours, run by celery beat
+    every reminder_interval_seconds. Reminders already sent are skipped, so runs can overlap or be repeated.
+    """
+    now = utc_now()
+    with Session(engine) as session:
+        reminders = due_reminders(session, now, now + timedelta(hours=settings.reminder_lead_hours))
+        sent = send_reminders(session, reminders)
+    logger.info(f'Sent {sent} of {len(reminders)} lesson reminders')
+    return {'reminders': len(reminders), 'sent': sent}
+
+
+@celery_app.task(ignore_result=True)
+def send_lesson_reminder(student_id: int, lesson_id: int, email: str):
+    """Send a lesson reminder email to a student, unless they've already been reminded of the lesson"""
+    logger.info(f'Sending lesson reminder to student {student_id} for lesson {lesson_id} at {email}')
+    with Session(engine) as session:
+        rows = session.execute(_reminder_query().where(Lesson.id == lesson_id, Student.id == student_id)).all()
+        reminders = _group_reminders(rows)
+        for reminder in reminders:
+            reminder.email = email
+        sent = send_reminders(session, reminders)
+    status = 'sent' if sent else 'skipped'
+    logger.info(f'Lesson reminder to {email} {status}')
+    return {'status': status, 'student_id': student_id, 'lesson_id': lesson_id}
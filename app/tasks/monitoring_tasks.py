@@ -0,0 +1,20 @@
+from kombu.exceptions import ChannelError
+
+from ..core.celery_app import celery_app
+from ..core.monitoring import set_gauge
+
+
+@celery_app.task(ignore_result=True)
+def sample_queue_depths() -> dict[str, int]:
+    """Record how many tasks are waiting in each queue, run by celery beat every celery_queue_depth_interval_seconds"""
+    depths = {}
+    with celery_app.connection_for_read() as connection:
+        channel = connection.default_channel
+        for queue in celery_app.conf.task_queues:
+            try:
+                _, depths[queue.name], _ = channel.queue_declare(queue=queue.name, passive=True)
+            except ChannelError:
+                # The queue hasn't been created yet, no task has been sent to it
+                depths[queue.name] = 0
+            set_gauge('celery.queue.depth', depths[queue.name], queue=queue.name)
+    return depths
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Build the Tag, LessonTag and StudentTag index from the JSON tag lists of the existing lessons and students. Safe to
+run again, each lesson's and student's tags are replaced.
+
+    uv run python -m scripts.backfill_tags
+"""
+
+import argparse
+
+from sqlmodel import Session
+
+from app.core.database import create_db_and_tables, engine
+from app.core.tags import backfill_tags
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=1000, help='lessons or students indexed per batch')
+    args = parser.parse_args()
+
+    # Creates the tag tables if they don't exist yet
+    create_db_and_tables()
+    with Session(engine) as session:
+        lessons, students = backfill_tags(session, batch_size=args.batch_size)
+    print(f'Indexed the tags of {lessons} lessons and {students} students')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Compare computing student analytics (duration percentiles, weekly cadence and skill pairs) a lesson at a time in
+Python with compute_analytics over arrays. The lessons are generated in memory with the shape load_lesson_data
+returns, so only the computation is timed.
+
+    uv run python -m scripts.benchmark_analytics --lessons 1000000
+"""
+
+import argparse
+import statistics
+import time
+from collections import Counter, defaultdict
+from itertools import combinations
+
+import numpy as np
+
+from app.core.analytics import _FIRST_MONDAY, WEEK, LessonData, compute_analytics
+
+SKILLS = [f'skill {i}' for i in range(50)]
+
+
+def _generate(lesson_count: int, student_count: int, seed: int) -> LessonData:
+    rng = np.random.default_rng(seed)
+    student_ids = np.sort(rng.integers(1, student_count + 1, lesson_count))
+    # Within each student the lessons are in start order, as load_lesson_data returns them
+    starts = 1704067200 + rng.integers(0, 365 * 86400, lesson_count).astype(np.float64)
+    starts = starts[np.lexsort((starts, student_ids))]
+    durations = rng.choice([30.0, 45.0, 60.0, 90.0], lesson_count)
+    # Three skills per lesson
+    tag_lesson_ids = np.repeat(np.arange(lesson_count), 3)
+    return LessonData(
+        student_ids=student_ids,
+        starts=starts,
+        durations=durations,
+        tag_student_ids=np.repeat(student_ids, 3),
+        tag_lesson_ids=tag_lesson_ids,
+        tag_ids=rng.integers(0, len(SKILLS), len(tag_lesson_ids)),
+        tag_names=dict(enumerate(SKILLS)),
+    )
+
+
+def _python_analytics(data: LessonData) -> dict:
+    """The same statistics built by looping over the lessons as Python objects"""
+    lessons = defaultdict(list)
+    for student_id, start, duration in zip(data.student_ids.tolist(), data.starts.tolist(), data.durations.tolist()):
+        lessons[student_id].append((start, duration))
+    lesson_tags = defaultdict(lambda: defaultdict(set))
+    for student_id, lesson_id, tag_id in zip(
+        data.tag_student_ids.tolist(), data.tag_lesson_ids.tolist(), data.tag_ids.tolist()
+    ):
+        lesson_tags[student_id][lesson_id].add(data.tag_names[tag_id])
+
+    results = {}
+    for student_id, rows in lessons.items():
+        durations = sorted(duration for _, duration in rows)
+        weeks = sorted({int((start - _FIRST_MONDAY) // WEEK) for start, _ in rows})
+        pairs = Counter(pair for tags in lesson_tags[student_id].values() for pair in combinations(sorted(tags), 2))
+        results[student_id] = {
+            'mean': statistics.fmean(durations),
+            'percentiles': statistics.quantiles(durations, n=4, method='inclusive') if len(durations) > 1 else None,
+            'active_weeks': len(weeks),
+            'longest_gap_weeks': max((b - a - 1 for a, b in zip(weeks, weeks[1:])), default=0),
+            'skill_pairs': pairs.most_common(10),
+        }
+    return results
+
+
+def _time(label: str, func, repeat: int) -> float:
+    best = min(_run(func) for _ in range(repeat))
+    print(f'{label:<40} {best * 1000:8.1f} ms')
+    return best
+
+
+def _run(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lessons', type=int, default=1_000_000, help='number of lessons')
+    parser.add_argument('--students', type=int, default=2000, help='number of students the lessons are spread over')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per approach, the best is reported')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for the generated lessons')
+    args = parser.parse_args()
+
+    data = _generate(args.lessons, args.students, args.seed)
+    print(f'{args.lessons} lessons over {args.students} students, best of {args.repeat}')
+    old = _time('python loops', lambda: _python_analytics(data), args.repeat)
+    new = _time('compute_analytics', lambda: compute_analytics(data), args.repeat)
+    print(f'{old / new:.1f}x faster')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Compare building lesson list responses the old way (model_dump, then LessonRead(...), then FastAPI validating against
+the response_model and encoding with json) with build_lesson_read and a single orjson pass.
+
+    uv run python -m scripts.benchmark_serialization --lessons 5000
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+import orjson
+from pydantic import TypeAdapter
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.pool import StaticPool
+
+from app.api.lessons import _lesson_read_options, build_lesson_read
+from app.models import Client, Lesson, LessonRead, LessonStudent, Student
+
+
+def _old_build_lesson_read(lesson: Lesson) -> LessonRead:
+    lesson_data = lesson.model_dump(exclude={'company'})
+    lesson_data['students'] = lesson.students
+    return LessonRead(**lesson_data)
+
+
+def _seed(session: Session, lesson_count: int):
+    client = Client(first_name='Bench', last_name='Client', email='bench@example.com', phone='+1')
+    session.add(client)
+    session.commit()
+    students = [
+        Student(
+            client_id=client.id,
+            first_name=f'Student{i}',
+            last_name='Bench',
+            email=f'student{i}@example.com',
+            phone='+1',
+            grade='10th Grade',
+            strengths=['Algebra', 'Reading'],
+            weaknesses=['Geometry'],
+        )
+        for i in range(20)
+    ]
+    session.add_all(students)
+    session.commit()
+
+    start = datetime(2024, 1, 1, 9)
+    lessons = [
+        Lesson(
+            start_dt=start + timedelta(hours=i),
+            end_dt=start + timedelta(hours=i, minutes=45),
+            subject='Mathematics',
+            topic=f'Topic {i}',
+            notes='Worked through practice questions and reviewed homework. ' * 4,
+            skills_practiced=['fractions', 'decimals', 'word problems'],
+            main_subjects_covered=['arithmetic'],
+            student_strengths_observed=['persistence'],
+            student_weaknesses_observed=['checking work'],
+            tutor_tips=['Use diagrams', 'Set a timer for each question'],
+        )
+        for i in range(lesson_count)
+    ]
+    session.add_all(lessons)
+    session.commit()
+    session.add_all(
+        LessonStudent(lesson_id=lesson.id, student_id=students[i % len(students)].id)
+        for i, lesson in enumerate(lessons)
+    )
+    session.commit()
+
+
+def _time(label: str, func, repeat: int) -> float:
+    best = min(_run(func) for _ in range(repeat))
+    print(f'{label:<40} {best * 1000:8.1f} ms')
+    return best
+
+
+def _run(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lessons', type=int, default=5000, help='number of lessons in the list response')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per approach, the best is reported')
+    args = parser.parse_args()
+
+    engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        _seed(session, args.lessons)
+        lessons = session.exec(select(Lesson).options(*_lesson_read_options)).all()
+        response_adapter = TypeAdapter(List[LessonRead])
+
+        def old_path():
+            # What FastAPI does with the LessonRead list: validate against the response_model, dump and json encode
+            content = response_adapter.validate_python([_old_build_lesson_read(lesson) for lesson in lessons])
+            json.dumps(response_adapter.dump_python(content, mode='json'), ensure_ascii=False, separators=(',', ':'))
+
+        def new_path():
+            orjson.dumps([build_lesson_read(lesson) for lesson in lessons])
+
+        print(f'{len(lessons)} lessons, best of {args.repeat}')
+        old = _time('model_dump + LessonRead + response_model', old_path, args.repeat)
+        new = _time('build_lesson_read + orjson', new_path, args.repeat)
+        print(f'{old / new:.1f}x faster')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Compare what task results cost in the Redis result backend: a reminder task's status dict and a company report
+chunk's reports, stored as JSON or msgpack, against not storing the reminder's result at all (ignore_result).
+
+The encoded sizes are always reported. With a Redis server at --redis-url the results are also stored, and the memory
+they use and the commands sent to Redis per task are measured from Redis itself.
+
+    uv run python -m scripts.benchmark_task_results --tasks 1000 --redis-url redis://localhost:6379/15
+"""
+
+import argparse
+import uuid
+
+import redis
+from celery import Celery
+
+from app.core.config import settings
+
+SERIALIZERS = ('json', 'msgpack')
+
+
+def _reminder_result(i: int) -> dict:
+    return {'status': 'sent', 'student_id': i, 'lesson_id': i * 3}
+
+
+def _report(student_id: int) -> dict:
+    """A report shaped like build_student_reports', with analytics and ten entries per tag list"""
+    tags = [
+        {'name': f'skill {i}', 'count': 20 - i, 'first_seen': '2024-01-01T14:00:00', 'last_seen': '2024-06-01T14:00:00'}
+        for i in range(10)
+    ]
+    return {
+        'student_id': student_id,
+        'total_lessons': 48,
+        'average_duration': 52.5,
+        'status_breakdown': {'complete': 40, 'planned': 6, 'cancelled': 2},
+        'most_practiced_skills': tags,
+        'strengths_observed': tags,
+        'weaknesses_observed': tags,
+        'analytics': {
+            'lessons': 48,
+            'duration': {'mean': 52.5, 'min': 30.0, 'max': 90.0, 'p25': 45.0, 'p50': 60.0, 'p75': 60.0, 'p90': 90.0},
+            'cadence': {
+                'active_weeks': 30,
+                'lessons_per_active_week': 1.6,
+                'longest_gap_weeks': 3,
+                'weekday_counts': [10, 8, 9, 7, 6, 5, 3],
+            },
+            'skill_pairs': [{'tags': [f'skill {i}', f'skill {i + 1}'], 'count': 10 - i} for i in range(10)],
+        },
+    }
+
+
+def _backend(serializer: str, redis_url: str):
+    app = Celery('benchmark', backend=redis_url)
+    app.conf.update(result_serializer=serializer, result_accept_content=list(SERIALIZERS))
+    return app.backend
+
+
+def _encoded_size(backend, result) -> int:
+    meta = backend._get_result_meta(result=result, state='SUCCESS', traceback=None, request=None)
+    return len(backend.encode(meta))
+
+
+def _measure_redis(backend, client: redis.Redis, results: list) -> tuple[int, float]:
+    """Store results, returning the bytes of Redis memory they use and the commands sent per task"""
+    commands_before = client.info('stats')['total_commands_processed']
+    task_ids = []
+    for result in results:
+        task_id = str(uuid.uuid4())
+        backend.store_result(task_id, result, 'SUCCESS')
+        task_ids.append(task_id)
+    # Less one for the INFO command itself
+    commands = client.info('stats')['total_commands_processed'] - commands_before - 1
+    memory = sum(client.memory_usage(backend.get_key_for_task(task_id)) or 0 for task_id in task_ids)
+    client.delete(*(backend.get_key_for_task(task_id) for task_id in task_ids))
+    return memory, commands / len(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=1000, help='number of task results to store')
+    parser.add_argument('--chunk-size', type=int, default=settings.report_chunk_size, help='reports per chunk result')
+    parser.add_argument('--redis-url', default=None, help='a Redis database to store results in, which is cleaned up')
+    args = parser.parse_args()
+
+    payloads = {
+        'reminder': [_reminder_result(i) for i in range(args.tasks)],
+        'report chunk': [[_report(i * args.chunk_size + j) for j in range(args.chunk_size)] for i in range(10)],
+    }
+    client = redis.Redis.from_url(args.redis_url) if args.redis_url else None
+
+    print(f'{"task":<14} {"serializer":<12} {"bytes/result":>14} {"redis bytes/result":>20} {"commands/task":>15}')
+    print(f'{"reminder":<14} {"ignore_result":<12} {0:>14} {0:>20} {0:>15}')
+    for name, results in payloads.items():
+        for serializer in SERIALIZERS:
+            backend = _backend(serializer, args.redis_url or 'redis://localhost')
+            size = sum(_encoded_size(backend, result) for result in results) / len(results)
+            memory, commands = '-', '-'
+            if client:
+                total_memory, commands_per_task = _measure_redis(backend, client, results)
+                memory, commands = f'{total_memory / len(results):.0f}', f'{commands_per_task:.1f}'
+            print(f'{name:<14} {serializer:<12} {size:>14.0f} {memory:>20} {commands:>15}')
+
+
+if __name__ == '__main__':
+    main()
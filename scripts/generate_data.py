@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Generate a large dataset for load testing and benchmarks: companies, each with an admin and tutors, students for each
+tutor (with a client each) and lessons for each student, along with the tag index. The same arguments and seed always
+generate the same rows, which are added after any existing data.
+
+Rows are written a batch at a time with executemany, or COPY on Postgres, rather than through the ORM. For example,
+1M lessons:
+
+    uv run python -m scripts.generate_data --companies 10 --tutors 20 --students-per-tutor 25 --lessons-per-student 200
+"""
+
+import argparse
+import csv
+import io
+import json
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Any
+
+from sqlalchemy import Connection, Engine, Table, func, insert, select, text
+from sqlmodel import Session, SQLModel
+
+from app.core.auth import get_password_hash
+from app.core.database import create_db_and_tables, engine
+from app.core.tags import intern_tags
+from app.models import (
+    Client,
+    Company,
+    Lesson,
+    LessonStatus,
+    LessonStudent,
+    LessonTag,
+    LessonTutor,
+    Student,
+    StudentTag,
+    TutorStudent,
+    User,
+    UserType,
+)
+from app.models.tag import LESSON_TAG_KINDS, STUDENT_TAG_KINDS
+
+FIRST_NAMES = ['Emma', 'Marcus', 'Sofia', 'Liam', 'Aisha', 'Noah', 'Mei', 'Oliver', 'Priya', 'Lucas', 'Zara', 'Ethan']
+LAST_NAMES = ['Johnson', 'Chen', 'Rodriguez', 'Smith', 'Okafor', 'Patel', 'Kim', 'Brown', 'Garcia', 'Novak']
+GRADES = [f'{grade}th Grade' for grade in range(6, 13)]
+SUBJECTS = {
+    'Mathematics': {
+        'topics': ['Fractions', 'Linear Equations', 'Quadratics', 'Geometry Proofs', 'Probability', 'Derivatives'],
+        'skills': ['Fractions', 'Algebra', 'Graphing', 'Mental math', 'Word problems', 'Factoring', 'Proofs'],
+    },
+    'Physics': {
+        'topics': ['Forces', 'Energy', 'Waves', 'Electric Circuits', 'Momentum', 'Kinematics'],
+        'skills': ['Free body diagrams', 'Unit conversion', 'Vectors', 'Graph reading', 'Experimental design'],
+    },
+    'English': {
+        'topics': ['Essay Structure', 'Poetry Analysis', 'Persuasive Writing', 'Shakespeare', 'Grammar Review'],
+        'skills': ['Thesis statements', 'Close reading', 'Vocabulary', 'Paragraphing', 'Citing evidence'],
+    },
+    'Chemistry': {
+        'topics': ['Stoichiometry', 'Periodic Table', 'Bonding', 'Acids and Bases', 'Reaction Rates'],
+        'skills': ['Balancing equations', 'Mole calculations', 'Lab safety', 'Unit conversion', 'Graph reading'],
+    },
+}
+STRENGTHS = ['Persistence', 'Quick learner', 'Asks good questions', 'Careful working', 'Creative thinking']
+WEAKNESSES = ['Rushes through problems', 'Checking work', 'Showing working', 'Confidence', 'Time management']
+TIPS = ['Use diagrams', 'Set a timer for each question', 'Start with an example', 'Recap the last lesson']
+DURATIONS = [30, 45, 60, 90]
+# The share of each student's lessons, the most recent, that are still planned
+PLANNED_FRACTION = 0.1
+
+
+class _BatchWriter:
+    """
+    Collects generated rows by table and writes each table's rows in one statement per batch, in the order the tables
+    were first added to so rows are written after those they reference.
+    """
+
+    def __init__(self, connection: Connection):
+        self.connection = connection
+        self.rows: dict[Table, list[dict[str, Any]]] = {}
+        self.counts = Counter()
+
+    def add(self, model: type[SQLModel], row: dict[str, Any]):
+        self.rows.setdefault(model.__table__, []).append(row)
+
+    def flush(self):
+        for table, rows in self.rows.items():
+            if not rows:
+                continue
+            if self.connection.dialect.name == 'postgresql':
+                self._copy(table, rows)
+            else:
+                self.connection.execute(insert(table), rows)
+            self.counts[table.name] += len(rows)
+            rows.clear()
+        self.connection.commit()
+
+    def _copy(self, table: Table, rows: list[dict[str, Any]]):
+        columns = list(rows[0])
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerows([_copy_value(row[column]) for column in columns] for row in rows)
+        buffer.seek(0)
+        preparer = self.connection.dialect.identifier_preparer
+        column_list = ', '.join(preparer.quote(column) for column in columns)
+        cursor = self.connection.connection.cursor()
+        cursor.copy_expert(
+            f"COPY {preparer.format_table(table)} ({column_list}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer
+        )
+
+
+def _copy_value(value: Any) -> Any:
+    """A value as COPY reads it from CSV"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, Enum):
+        # Enum columns store the member's name
+        return value.name
+    if isinstance(value, list):
+        return json.dumps(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _next_ids(connection: Connection, models: list[type[SQLModel]]) -> dict[type[SQLModel], int]:
+    """The first ID to use for each model, after any existing rows"""
+    return {model: connection.execute(select(func.coalesce(func.max(model.id), 0))).scalar() + 1 for model in models}
+
+
+def _reset_sequences(connection: Connection, models: list[type[SQLModel]]):
+    """On Postgres, move the ID sequences past the IDs that were set explicitly"""
+    if connection.dialect.name != 'postgresql':
+        return
+    preparer = connection.dialect.identifier_preparer
+    for model in models:
+        table = preparer.format_table(model.__table__)
+        connection.execute(
+            text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))")
+        )
+    connection.commit()
+
+
+def generate_data(
+    engine: Engine,
+    companies: int,
+    tutors_per_company: int,
+    students_per_tutor: int,
+    lessons_per_student: int,
+    seed: int = 0,
+    batch_size: int = 10_000,
+    start: datetime = datetime(2024, 1, 1),
+    password: str = 'password',
+) -> Counter:
+    """
+    Generate the dataset described above, writing a batch every batch_size lessons. Each student has a lesson a week
+    from start. Returns the number of rows written to each table.
+    """
+    rng = random.Random(seed)
+    # Hashing is slow, so every user has the same password
+    hashed_password = get_password_hash(password)
+    id_models = [Company, User, Client, Student, TutorStudent, Lesson, LessonTutor]
+
+    with engine.connect() as connection:
+        ids = _next_ids(connection, id_models)
+        vocabulary = {*STRENGTHS, *WEAKNESSES, *TIPS, *SUBJECTS}
+        for subject in SUBJECTS.values():
+            vocabulary.update(subject['skills'])
+        with Session(bind=connection) as session:
+            tag_ids = intern_tags(session, sorted(vocabulary))
+        connection.commit()
+
+        def next_id(model: type[SQLModel]) -> int:
+            ids[model] += 1
+            return ids[model] - 1
+
+        writer = _BatchWriter(connection)
+        pending_lessons = 0
+        for _ in range(companies):
+            company_id = next_id(Company)
+            writer.add(Company, {'id': company_id, 'name': f'Company {company_id}', 'created_at': start})
+            for user_type in [UserType.ADMIN] + [UserType.TUTOR] * tutors_per_company:
+                user_id = next_id(User)
+                writer.add(
+                    User,
+                    {
+                        'id': user_id,
+                        'first_name': rng.choice(FIRST_NAMES),
+                        'last_name': rng.choice(LAST_NAMES),
+                        'email': f'{user_type.value}{user_id}@example.com',
+                        'user_type': user_type,
+                        'company_ids': [company_id],
+                        'hashed_password': hashed_password,
+                        'is_active': True,
+                        'created_at': start,
+                    },
+                )
+                if user_type == UserType.ADMIN:
+                    continue
+                for _ in range(students_per_tutor):
+                    _add_student(writer, rng, next_id, tag_ids, company_id, user_id, lessons_per_student, start)
+                    pending_lessons += lessons_per_student
+                    if pending_lessons >= batch_size:
+                        writer.flush()
+                        pending_lessons = 0
+        writer.flush()
+        _reset_sequences(connection, id_models)
+    return writer.counts
+
+
+def _tag_rows(key: str, object_id: int, row: dict[str, Any], kinds, tag_ids: dict[str, int]) -> list[dict[str, Any]]:
+    return [
+        {key: object_id, 'tag_id': tag_ids[name], 'kind': kind}
+        for kind in kinds
+        for name in dict.fromkeys(row[kind.value])
+    ]
+
+
+def _add_student(
+    writer: _BatchWriter,
+    rng: random.Random,
+    next_id,
+    tag_ids: dict[str, int],
+    company_id: int,
+    tutor_id: int,
+    lesson_count: int,
+    start: datetime,
+):
+    client_id = next_id(Client)
+    last_name = rng.choice(LAST_NAMES)
+    writer.add(
+        Client,
+        {
+            'id': client_id,
+            'first_name': rng.choice(FIRST_NAMES),
+            'last_name': last_name,
+            'email': f'client{client_id}@example.com',
+            'phone': f'+1-555-{client_id:07d}',
+            'company_id': company_id,
+            'created_at': start,
+        },
+    )
+    student_id = next_id(Student)
+    student = {
+        'id': student_id,
+        'client_id': client_id,
+        'company_id': company_id,
+        'first_name': rng.choice(FIRST_NAMES),
+        'last_name': last_name,
+        'email': f'student{student_id}@example.com',
+        'phone': f'+1-555-{client_id:07d}',
+        'grade': rng.choice(GRADES),
+        'strengths': rng.sample(STRENGTHS, 2),
+        'weaknesses': rng.sample(WEAKNESSES, 1),
+        'created_at': start,
+    }
+    writer.add(Student, student)
+    writer.add(
+        TutorStudent, {'id': next_id(TutorStudent), 'tutor_id': tutor_id, 'student_id': student_id, 'created_at': start}
+    )
+    for tag_row in _tag_rows('student_id', student_id, student, STUDENT_TAG_KINDS, tag_ids):
+        writer.add(StudentTag, tag_row)
+
+    subject = rng.choice(list(SUBJECTS))
+    topics, skills = SUBJECTS[subject]['topics'], SUBJECTS[subject]['skills']
+    planned_from = lesson_count - int(lesson_count * PLANNED_FRACTION)
+    for i in range(lesson_count):
+        lesson_id = next_id(Lesson)
+        start_dt = start + timedelta(weeks=i, days=rng.randrange(5), hours=rng.randrange(9, 19))
+        if i >= planned_from:
+            status = LessonStatus.PLANNED
+        else:
+            status = rng.choices(
+                [LessonStatus.COMPLETE, LessonStatus.CANCELLED, LessonStatus.CANCELLED_BUT_CHARGEABLE], [90, 7, 3]
+            )[0]
+        lesson = {
+            'id': lesson_id,
+            'company_id': company_id,
+            'start_dt': start_dt,
+            'end_dt': start_dt + timedelta(minutes=rng.choice(DURATIONS)),
+            'subject': subject,
+            'topic': rng.choice(topics),
+            'notes': f'{subject} lesson with {student["first_name"]}, worked through practice questions.',
+            'status': status,
+            'skills_practiced': rng.sample(skills, rng.randint(1, 3)),
+            'main_subjects_covered': [subject],
+            'student_strengths_observed': rng.sample(STRENGTHS, rng.randint(0, 1)),
+            'student_weaknesses_observed': rng.sample(WEAKNESSES, rng.randint(0, 1)),
+            'tutor_tips': rng.sample(TIPS, rng.randint(1, 2)),
+            'created_at': start_dt - timedelta(days=7),
+        }
+        writer.add(Lesson, lesson)
+        writer.add(LessonStudent, {'lesson_id': lesson_id, 'student_id': student_id})
+        writer.add(
+            LessonTutor, {'id': next_id(LessonTutor), 'lesson_id': lesson_id, 'tutor_id': tutor_id, 'created_at': start}
+        )
+        for tag_row in _tag_rows('lesson_id', lesson_id, lesson, LESSON_TAG_KINDS, tag_ids):
+            writer.add(LessonTag, tag_row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--companies', type=int, default=1)
+    parser.add_argument('--tutors', type=int, default=5, help='tutors per company')
+    parser.add_argument('--students-per-tutor', type=int, default=10)
+    parser.add_argument('--lessons-per-student', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0, help='random seed, the same seed generates the same data')
+    parser.add_argument('--batch-size', type=int, default=10_000, help='lessons written per batch')
+    parser.add_argument(
+        '--start', type=datetime.fromisoformat, default=datetime(2024, 1, 1), help='date of the first lessons'
+    )
+    parser.add_argument('--password', default='password', help='password of every generated user')
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    started = time.perf_counter()
+    counts = generate_data(
+        engine,
+        companies=args.companies,
+        tutors_per_company=args.tutors,
+        students_per_tutor=args.students_per_tutor,
+        lessons_per_student=args.lessons_per_student,
+        seed=args.seed,
+        batch_size=args.batch_size,
+        start=args.start,
+        password=args.password,
+    )
+    for table, count in counts.items():
+        print(f'{table:<16} {count:>10}')
+    print(f'Generated in {time.perf_counter() - started:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,7 @@ from sqlmodel import Session, select
 
 from app.core.auth import get_password_hash
 from app.core.database import create_db_and_tables, engine
+from app.core.tags import backfill_tags
 from app.models import Client, Company, Lesson, LessonStudent, LessonTutor, Student, TutorStudent, User, UserType
 
 # Sample clients data
@@ -467,6 +468,9 @@ def seed_database():
 
         session.commit()
 
+        print('Indexing tags...')
+        backfill_tags(session)
+
         print('Database seeded successfully!')
         print(f'Created {len(clients_data)} clients, {len(students_data)} students and {len(all_lessons)} lessons')
         print(f'Created test tutor user: {test_tutor.email}')
@@ -1 +1,6 @@
 # Tests Package
+import os
+
+# Tasks run eagerly in process, and the cache and lesson events are kept in memory, rather than using Redis. This is
+# set before the app is imported, since the Celery app is configured on import.
+os.environ['REDIS_URL'] = 'memory://'
@@ -1,17 +1,26 @@
+import socket
 from datetime import UTC, datetime, timedelta
 from typing import Generator
 
 import pytest
+from aiosmtpd.controller import Controller
+from celery import Celery
 from fastapi.testclient import TestClient
 from jose import jwt
+from sqlalchemy import event
 from sqlmodel import Session, SQLModel, create_engine
 from sqlmodel.pool import StaticPool
 
+from app.core import cache as cache_module
 from app.core.auth import get_password_hash
+from app.core.cache import InMemoryCache
+from app.core.celery_app import celery_app
 from app.core.config import settings
 from app.core.database import get_session
+from app.core.events import InMemoryEventBroker, get_event_broker
 from app.main import app
 from app.models import User, UserType
+from app.tasks import analytics_tasks, email_tasks
 
 
 class AuthenticatedTestClient(TestClient):
@@ -45,12 +54,90 @@ def session_fixture() -> Generator[Session, None, None]:
     """Create a new database session for a test."""
     engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
     SQLModel.metadata.create_all(engine)
-    with Session(engine) as session:
+    with Session(engine, expire_on_commit=False) as session:
         yield session
 
 
+@pytest.fixture(name='statements')
+def statements_fixture(session: Session) -> Generator[list[str], None, None]:
+    """Record the SQL statements executed against the test database while the fixture is active."""
+    statements = []
+
+    def _record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = session.get_bind()
+    event.listen(engine, 'before_cursor_execute', _record_statement)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', _record_statement)
+
+
+class SMTPRecorder:
+    """An aiosmtpd handler that keeps the messages it receives, and refuses mail to addresses in refuse."""
+
+    def __init__(self):
+        self.messages = []
+        self.peers = []
+        self.refuse = set()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.refuse:
+            return '550 Mailbox unavailable'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        # The client's address, which is the same for every message sent over a connection
+        self.peers.append(session.peer)
+        return '250 Message accepted'
+
+
+@pytest.fixture(name='smtp_server')
+def smtp_server_fixture(monkeypatch) -> Generator[SMTPRecorder, None, None]:
+    """A local SMTP server that emails are sent to instead of settings.smtp_host."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    recorder = SMTPRecorder()
+    controller = Controller(recorder, hostname='127.0.0.1', port=port)
+    controller.start()
+    monkeypatch.setattr(settings, 'smtp_host', '127.0.0.1')
+    monkeypatch.setattr(settings, 'smtp_port', port)
+    monkeypatch.setattr(settings, 'smtp_username', None)
+    monkeypatch.setattr(settings, 'smtp_starttls', False)
+    yield recorder
+    controller.stop()
+
+
+@pytest.fixture(name='cache')
+def cache_fixture(monkeypatch) -> InMemoryCache:
+    """An in-process cache returned by get_cache, so cached values and task coalescing work without Redis."""
+    cache = InMemoryCache()
+    monkeypatch.setattr(cache_module, '_cache', cache)
+    return cache
+
+
+@pytest.fixture(name='celery_tasks')
+def celery_tasks_fixture(session: Session, cache: InMemoryCache, monkeypatch) -> Celery:
+    """
+    The Celery app, with tasks using the test database. Tests run with a memory:// redis_url, so tasks sent with
+    delay() or apply_async() run eagerly, with results in memory, and errors are raised in the test.
+    """
+    assert celery_app.conf.task_always_eager
+    for module in (analytics_tasks, email_tasks):
+        monkeypatch.setattr(module, 'engine', session.get_bind())
+    return celery_app
+
+
+@pytest.fixture(name='event_broker')
+def event_broker_fixture() -> InMemoryEventBroker:
+    """An in-process event broker, so lesson events can be inspected without Redis."""
+    return InMemoryEventBroker()
+
+
 @pytest.fixture(name='client')
-def client_fixture(session: Session) -> Generator[TestClient, None, None]:
+def client_fixture(session: Session, event_broker: InMemoryEventBroker) -> Generator[TestClient, None, None]:
     """Create a new FastAPI TestClient that uses the `session` fixture to override
     the `get_session` dependency that is injected into routes.
     """
@@ -59,6 +146,7 @@ def client_fixture(session: Session) -> Generator[TestClient, None, None]:
         return session
 
     app.dependency_overrides[get_session] = _get_session_override
+    app.dependency_overrides[get_event_broker] = lambda: event_broker
     client = TestClient(app)
     yield client
     app.dependency_overrides.clear()
@@ -0,0 +1,100 @@
+import gzip
+from datetime import datetime, timedelta
+
+from sqlmodel import Session
+
+from app.core.compression import choose_encoding
+from app.models import Lesson, LessonTutor, User
+from tests.conftest import AuthenticatedTestClient
+
+
+def _create_lessons(session: Session, tutor: User, count: int = 20):
+    lessons = [
+        Lesson(
+            start_dt=datetime(2024, 1, 1, 14) + timedelta(days=day),
+            end_dt=datetime(2024, 1, 1, 15) + timedelta(days=day),
+            subject='Mathematics',
+            topic='Algebra',
+            notes='Worked through practice questions and reviewed homework. ' * 4,
+            tutor_tips=['Use diagrams', 'Set a timer for each question'],
+        )
+        for day in range(count)
+    ]
+    session.add_all(lessons)
+    session.commit()
+    session.add_all(LessonTutor(lesson_id=lesson.id, tutor_id=tutor.id) for lesson in lessons)
+    session.commit()
+
+
+def test_choose_encoding():
+    assert choose_encoding('') is None
+    assert choose_encoding('identity') is None
+    assert choose_encoding('gzip, deflate') == 'gzip'
+    assert choose_encoding('gzip, deflate, br') == 'br'
+    assert choose_encoding('br;q=0.5, gzip') == 'gzip'
+    assert choose_encoding('br;q=0, *') == 'gzip'
+    assert choose_encoding('*;q=0') is None
+
+
+def test_compress_lessons(auth_client: AuthenticatedTestClient, session: Session):
+    """Test large responses are compressed with the client's preferred encoding"""
+    _create_lessons(session, auth_client.user)
+    url = auth_client.app.url_path_for('get_lessons')
+
+    r = auth_client.get(url, headers={'Accept-Encoding': 'identity'})
+    assert r.status_code == 200, r.json()
+    assert 'content-encoding' not in r.headers
+    body = r.content
+    etag = r.headers['etag']
+
+    r = auth_client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert r.headers['content-encoding'] == 'gzip'
+    assert 'Accept-Encoding' in r.headers['vary']
+    assert r.headers['etag'] == f'W/{etag}'
+    assert r.content == body
+    assert int(r.headers['content-length']) < len(body) / 4
+
+    r = auth_client.get(url, headers={'Accept-Encoding': 'gzip, br'})
+    assert r.headers['content-encoding'] == 'br'
+    assert r.content == body
+
+    # The weak ETag of the compressed response still gets a 304
+    r = auth_client.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': f'W/{etag}'})
+    assert r.status_code == 304
+
+
+def test_compress_small_response(auth_client: AuthenticatedTestClient):
+    """Test small responses aren't compressed"""
+    r = auth_client.get(auth_client.app.url_path_for('health_check'), headers={'Accept-Encoding': 'gzip, br'})
+    assert r.status_code == 200
+    assert 'content-encoding' not in r.headers
+    assert r.json() == {'status': 'healthy'}
+
+
+def test_compress_cached_by_etag(auth_client: AuthenticatedTestClient, session: Session, monkeypatch):
+    """Test an unchanged response is compressed once, then served from the cache until it changes"""
+    calls = []
+    gzip_compress = gzip.compress
+
+    def counting_compress(data, **kwargs):
+        calls.append(len(data))
+        return gzip_compress(data, **kwargs)
+
+    monkeypatch.setattr(gzip, 'compress', counting_compress)
+    _create_lessons(session, auth_client.user)
+    url = auth_client.app.url_path_for('get_lessons')
+
+    first = auth_client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert first.headers['content-encoding'] == 'gzip'
+    second = auth_client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert second.headers['content-encoding'] == 'gzip'
+    assert second.content == first.content
+    assert len(calls) == 1
+
+    lesson = session.get(Lesson, 1)
+    r = auth_client.put(auth_client.app.url_path_for('update_lesson', lesson_id=lesson.id), json={'topic': 'Geometry'})
+    assert r.status_code == 200, r.json()
+    r = auth_client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert r.headers['etag'] != first.headers['etag']
+    assert 'Geometry' in r.text
+    assert len(calls) == 2
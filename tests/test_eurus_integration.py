@@ -6,15 +6,20 @@ from httpx import Request, Response
 from sqlmodel import Session
 
 from app.core.config import settings
-from app.models import Lesson, LessonStudent, LessonTutor, Student, User
+from app.models import Client, Lesson, LessonStudent, LessonTutor, Student, User
 
 
 @pytest.fixture
 def test_students(session: Session) -> list[Student]:
     """Create test students for the lesson."""
+    client = Client(first_name='John', last_name='Doe', email='john.doe@example.com', phone='+1234567890')
+    session.add(client)
+    session.commit()
+    session.refresh(client)
+
     students = [
         Student(
-            client_id=1,
+            client_id=client.id,
             first_name=f'Student{i}',
             last_name=f'Test{i}',
             email=f'student{i}@example.com',
@@ -0,0 +1,75 @@
+from sqlalchemy import func
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.pool import StaticPool
+
+from app.core.tags import lesson_ids_with_tag
+from app.models import Company, Lesson, LessonStudent, LessonTag, Student, StudentTag, TutorStudent, User, UserType
+from scripts.generate_data import generate_data
+
+SIZES = {'companies': 2, 'tutors_per_company': 2, 'students_per_tutor': 3, 'lessons_per_student': 5}
+
+
+def _generate(session: Session, seed: int = 1):
+    return generate_data(session.get_bind(), **SIZES, seed=seed, batch_size=7, password='testpass')
+
+
+def _count(session: Session, model) -> int:
+    return session.exec(select(func.count()).select_from(model)).one()
+
+
+def _lessons(session: Session) -> list[tuple]:
+    return session.exec(
+        select(Lesson.id, Lesson.start_dt, Lesson.end_dt, Lesson.topic, Lesson.status, Lesson.skills_practiced)
+    ).all()
+
+
+def test_generate_data(session: Session):
+    counts = _generate(session)
+
+    assert _count(session, Company) == counts['company'] == 2
+    # An admin and two tutors per company
+    assert _count(session, User) == counts['user'] == 6
+    assert _count(session, Student) == _count(session, TutorStudent) == 12
+    assert _count(session, Lesson) == _count(session, LessonStudent) == counts['lesson'] == 60
+    tutors = session.exec(select(User).where(User.user_type == UserType.TUTOR)).all()
+    assert {len(session.exec(select(TutorStudent).where(TutorStudent.tutor_id == t.id)).all()) for t in tutors} == {3}
+
+    # The tag index matches the lessons' and students' tag lists
+    lessons = session.exec(select(Lesson)).all()
+    assert (
+        counts['lessontag']
+        == _count(session, LessonTag)
+        == sum(
+            len(set(lesson.skills_practiced))
+            + len(set(lesson.main_subjects_covered))
+            + len(set(lesson.student_strengths_observed))
+            + len(set(lesson.student_weaknesses_observed))
+            + len(set(lesson.tutor_tips))
+            for lesson in lessons
+        )
+    )
+    assert _count(session, StudentTag) == 12 * 3
+    skill = lessons[0].skills_practiced[0]
+    tagged = set(session.exec(lesson_ids_with_tag(skill)).all())
+    assert {lesson.id for lesson in lessons if skill in lesson.skills_practiced} <= tagged
+
+
+def test_generate_data_is_deterministic(session: Session):
+    _generate(session)
+    other_engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(other_engine)
+    with Session(other_engine) as other_session:
+        _generate(other_session)
+        assert _lessons(other_session) == _lessons(session)
+        _generate(other_session, seed=2)
+        assert _lessons(other_session)[60:] != _lessons(session)
+
+
+def test_generate_data_appends(session: Session):
+    _generate(session)
+    counts = _generate(session)
+
+    assert counts['lesson'] == 60
+    assert _count(session, Lesson) == 120
+    assert _count(session, Student) == 24
+    assert session.exec(select(func.max(Lesson.id))).one() == 120
@@ -1,11 +1,37 @@
-from datetime import datetime, timezone
+import csv
+import io
+import json
+from datetime import datetime, timedelta, timezone
 
+import msgpack
 from dirty_equals import IsDatetime
 from fastapi.testclient import TestClient
 from sqlmodel import Session, select
 
-from app.models import Client, Company, Lesson, LessonStudent, LessonTutor, Student, User, UserType
-from tests.conftest import AuthenticatedTestClient
+from app.api import lessons as lessons_api
+from app.api.lessons import _get_lessons_for_user, _lesson_event_stream, _lesson_export_rows
+from app.core.config import settings
+from app.core.events import InMemoryEventBroker
+from app.core.tags import backfill_tags
+from app.models import (
+    Client,
+    Company,
+    Lesson,
+    LessonRead,
+    LessonStatus,
+    LessonStudent,
+    LessonTag,
+    LessonTutor,
+    Student,
+    StudentTag,
+    Tag,
+    TagKind,
+    Tombstone,
+    TombstoneType,
+    User,
+    UserType,
+)
+from tests.conftest import AuthenticatedTestClient, create_authenticated_client_for_user
 
 
 def test_create_lesson(auth_client: AuthenticatedTestClient, session: Session):
@@ -1116,6 +1142,11 @@ def test_delete_lesson(auth_client: AuthenticatedTestClient, session: Session):
     r = auth_client.get(auth_client.app.url_path_for('get_lesson', lesson_id=lesson.id))
     assert r.status_code == 404, r.json()
 
+    # Verify the junction rows were removed with it
+    assert session.exec(select(LessonStudent).where(LessonStudent.lesson_id == lesson.id)).all() == []
+    assert session.exec(select(LessonTutor).where(LessonTutor.lesson_id == lesson.id)).all() == []
+    assert session.get(Student, student.id) is not None
+
 
 def test_delete_nonexistent_lesson(auth_client: AuthenticatedTestClient):
     """Test deleting a non-existent lesson"""
@@ -1199,3 +1230,1201 @@ def test_get_lessons_tutor_with_no_lessons(auth_client: AuthenticatedTestClient,
     assert r.status_code == 200
     data = r.json()
     assert len(data) == 0
+
+
+def test_create_lessons_bulk(auth_client: AuthenticatedTestClient, session: Session):
+    """Test creating many lessons at once, with invalid lessons reported per item"""
+    client = Client(
+        first_name='John',
+        last_name='Doe',
+        email='john.doe@example.com',
+        phone='+1234567890',
+    )
+    session.add(client)
+    session.commit()
+    session.refresh(client)
+
+    students = [
+        Student(
+            client_id=client.id,
+            first_name='Alice',
+            last_name='Smith',
+            email='alice.smith@example.com',
+            phone='+1111111111',
+            grade='10th Grade',
+        ),
+        Student(
+            client_id=client.id,
+            first_name='Bob',
+            last_name='Jones',
+            email='bob.jones@example.com',
+            phone='+2222222222',
+            grade='10th Grade',
+        ),
+    ]
+    session.add_all(students)
+    session.commit()
+    for student in students:
+        session.refresh(student)
+
+    base_data = {
+        'start_dt': '2024-01-15T14:00:00Z',
+        'end_dt': '2024-01-15T15:00:00Z',
+        'subject': 'Mathematics',
+        'topic': 'Algebra',
+        'notes': 'Math lesson',
+    }
+    lessons_data = [
+        {**base_data, 'student_ids': [students[0].id]},
+        {**base_data, 'student_ids': [999]},
+        {**base_data, 'student_ids': [students[0].id, students[1].id], 'topic': 'Geometry'},
+        {**base_data, 'end_dt': '2024-01-15T13:00:00Z'},
+        {**base_data, 'company_id': 999},
+        {**base_data, 'student_ids': [students[1].id, students[1].id], 'topic': 'Fractions'},
+    ]
+    r = auth_client.post(auth_client.app.url_path_for('create_lessons_bulk'), json=lessons_data)
+    assert r.status_code == 200, r.json()
+    data = r.json()
+    assert [lesson['topic'] for lesson in data['created']] == ['Algebra', 'Geometry', 'Fractions']
+    assert [len(lesson['students']) for lesson in data['created']] == [1, 2, 1]
+    assert data['errors'] == [
+        {'index': 1, 'detail': 'Student not found'},
+        {'index': 3, 'detail': 'End date must be after start date.'},
+        {'index': 4, 'detail': 'Company not found'},
+    ]
+
+    created_ids = [lesson['id'] for lesson in data['created']]
+    lesson_tutors = session.exec(select(LessonTutor).where(LessonTutor.lesson_id.in_(created_ids))).all()
+    assert {lesson_tutor.lesson_id for lesson_tutor in lesson_tutors} == set(created_ids)
+    assert all(lesson_tutor.tutor_id == auth_client.user.id for lesson_tutor in lesson_tutors)
+
+    r = auth_client.get(auth_client.app.url_path_for('get_lessons'))
+    assert r.status_code == 200, r.json()
+    assert len(r.json()) == 3
+
+
+def test_create_lessons_bulk_all_invalid(auth_client: AuthenticatedTestClient, session: Session):
+    """Test a bulk create where no lesson is valid creates nothing"""
+    lessons_data = [
+        {
+            'start_dt': '2024-01-15T14:00:00Z',
+            'end_dt': '2024-01-15T15:00:00Z',
+            'subject': 'Mathematics',
+            'topic': 'Algebra',
+            'notes': 'Math lesson',
+            'student_ids': [999],
+        }
+    ]
+    r = auth_client.post(auth_client.app.url_path_for('create_lessons_bulk'), json=lessons_data)
+    assert r.status_code == 200, r.json()
+    assert r.json() == {'created': [], 'errors': [{'index': 0, 'detail': 'Student not found'}]}
+    assert session.exec(select(Lesson)).all() == []
+
+
+def test_create_lessons_bulk_too_many(auth_client: AuthenticatedTestClient, monkeypatch):
+    """Test the bulk create size limit"""
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, 'lesson_bulk_max_size', 1)
+    lesson_data = {
+        'start_dt': '2024-01-15T14:00:00Z',
+        'end_dt': '2024-01-15T15:00:00Z',
+        'subject': 'Mathematics',
+        'topic': 'Algebra',
+        'notes': 'Math lesson',
+    }
+    r = auth_client.post(auth_client.app.url_path_for('create_lessons_bulk'), json=[lesson_data, lesson_data])
+    assert r.status_code == 400, r.json()
+    assert r.json()['detail'] == 'Cannot create more than 1 lessons at once.'
+
+
+def test_update_lesson_student_roster_diff(
+    auth_client: AuthenticatedTestClient, session: Session, statements: list[str]
+):
+    """Test that updating a lesson's students only changes the associations that differ"""
+    client = Client(
+        first_name='John',
+        last_name='Doe',
+        email='john.doe@example.com',
+        phone='+1234567890',
+    )
+    session.add(client)
+    session.commit()
+    session.refresh(client)
+
+    students = [
+        Student(
+            client_id=client.id,
+            first_name=name,
+            last_name='Smith',
+            email=f'{name.lower()}.smith@example.com',
+            phone='+1111111111',
+            grade='10th Grade',
+        )
+        for name in ('Alice', 'Bob', 'Carol')
+    ]
+    session.add_all(students)
+    session.commit()
+    for student in students:
+        session.refresh(student)
+
+    lesson = Lesson(
+        start_dt=datetime(2024, 1, 15, 14, 0, tzinfo=timezone.utc),
+        end_dt=datetime(2024, 1, 15, 15, 0, tzinfo=timezone.utc),
+        subject='Mathematics',
+        topic='Algebra',
+        notes='Math lesson',
+    )
+    session.add(lesson)
+    session.commit()
+    session.refresh(lesson)
+    session.add(LessonStudent(lesson_id=lesson.id, student_id=students[0].id))
+    session.add(LessonStudent(lesson_id=lesson.id, student_id=students[1].id))
+    session.add(LessonTutor(lesson_id=lesson.id, tutor_id=auth_client.user.id))
+    session.commit()
+
+    statements.clear()
+
+    # A no-op roster update should not write to the junction table
+    update_data = {'student_ids': [students[1].id, students[0].id]}
+    r = auth_client.put(auth_client.app.url_path_for('update_lesson', lesson_id=lesson.id), json=update_data)
+    assert r.status_code == 200, r.json()
+    assert {s['id'] for s in r.json()['students']} == {students[0].id, students[1].id}
+    assert not [s for s in statements if s.startswith(('DELETE FROM lessonstudent', 'INSERT INTO lessonstudent'))]
+
+    # Swapping one student removes and adds exactly one association
+    statements.clear()
+    update_data = {'student_ids': [students[0].id, students[2].id]}
+    r = auth_client.put(auth_client.app.url_path_for('update_lesson', lesson_id=lesson.id), json=update_data)
+    assert r.status_code == 200, r.json()
+    assert {s['id'] for s in r.json()['students']} == {students[0].id, students[2].id}
+    assert len([s for s in statements if s.startswith('DELETE FROM lessonstudent')]) == 1
+    assert len([s for s in statements if s.startswith('INSERT INTO lessonstudent')]) == 1
+
+    lesson_student_ids = session.exec(select(LessonStudent.student_id).where(LessonStudent.lesson_id == lesson.id))
+    assert set(lesson_student_ids.all()) == {students[0].id, students[2].id}
+
+
+def test_update_lesson_with_invalid_student(auth_client: AuthenticatedTestClient, session: Session):
+    """Test updating a lesson with a student that doesn't exist"""
+    lesson = Lesson(
+        start_dt=datetime(2024, 1, 15, 14, 0, tzinfo=timezone.utc),
+        end_dt=datetime(2024, 1, 15, 15, 0, tzinfo=timezone.utc),
+        subject='Mathematics',
+        topic='Algebra',
+        notes='Math lesson',
+    )
+    session.add(lesson)
+    session.commit()
+    session.refresh(lesson)
+    session.add(LessonTutor(lesson_id=lesson.id, tutor_id=auth_client.user.id))
+    session.commit()
+
+    r = auth_client.put(auth_client.app.url_path_for('update_lesson', lesson_id=lesson.id), json={'student_ids': [999]})
+    assert r.status_code == 404, r.json()
+    assert r.json()['detail'] == 'Student with ID 999 not found'
+
+
+def test_delete_lessons_bulk(auth_client: AuthenticatedTestClient, session: Session):
+    """Test deleting many lessons at once, skipping lessons that can't be deleted"""
+    company = Company(name='Test Company')
+    session.add(company)
+    session.commit()
+    session.refresh(company)
+
+    lessons = [
+        Lesson(
+            start_dt=datetime(2024, 1, 15, 14, 0, tzinfo=timezone.utc),
+            end_dt=datetime(2024, 1, 15, 15, 0, tzinfo=timezone.utc),
+            subject='Mathematics',
+            topic=topic,
+            notes='Math lesson',
+            company_id=company.id if topic == 'Company' else None,
+        )
+        for topic in ('Algebra', 'Geometry', 'Company', 'Other tutor')
+    ]
+    session.add_all(lessons)
+    session.commit()
+    for lesson in lessons:
+        session.refresh(lesson)
+
+    other_tutor = User(
+        email='other@example.com',
+        hashed_password='hashed',
+        user_type=UserType.TUTOR,
+        first_name='Other',
+        last_name='Tutor',
+    )
+    session.add(other_tutor)
+    session.commit()
+    session.refresh(other_tutor)
+
+    for lesson in lessons[:3]:
+        session.add(LessonTutor(lesson_id=lesson.id, tutor_id=auth_client.user.id))
+    session.add(LessonTutor(lesson_id=lessons[3].id, tutor_id=other_tutor.id))
+    session.commit()
+
+    lesson_ids = [lesson.id for lesson in lessons] + [999]
+    r = auth_client.delete(auth_client.app.url_path_for('delete_lessons'), params={'lesson_ids': lesson_ids})
+    assert r.status_code == 200, r.json()
+    assert r.json() == {
+        'message': '2 lessons deleted successfully',
+        'deleted_ids': [lessons[0].id, lessons[1].id],
+        'skipped_ids': [lessons[2].id, lessons[3].id, 999],
+    }
+
+    remaining_ids = session.exec(select(Lesson.id)).all()
+    assert set(remaining_ids) == {lessons[2].id, lessons[3].id}
+    lesson_tutor_ids = session.exec(select(LessonTutor.lesson_id)).all()
+    assert set(lesson_tutor_ids) == {lessons[2].id, lessons[3].id}
+
+
+def test_get_lessons_date_and_status_filters(auth_client: AuthenticatedTestClient, session: Session):
+    """Test filtering lessons by start time range and status, for all lessons and for a student"""
+    client = Client(
+        first_name='John',
+        last_name='Doe',
+        email='john.doe@example.com',
+        phone='+1234567890',
+    )
+    session.add(client)
+    session.commit()
+    student = Student(
+        client_id=client.id,
+        first_name='Alice',
+        last_name='Smith',
+        email='alice.smith@example.com',
+        phone='+1111111111',
+        grade='10th Grade',
+    )
+    session.add(student)
+    session.commit()
+
+    lessons = [
+        Lesson(
+            start_dt=datetime(2024, 1, day, 14, 0, tzinfo=timezone.utc),
+            end_dt=datetime(2024, 1, day, 15, 0, tzinfo=timezone.utc),
+            subject='Mathematics',
+            topic=f'Lesson {day}',
+            notes='Math lesson',
+            status=status,
+        )
+        for day, status in [
+            (22, LessonStatus.PLANNED),
+            (8, LessonStatus.COMPLETE),
+            (15, LessonStatus.PLANNED),
+            (16, LessonStatus.CANCELLED),
+        ]
+    ]
+    session.add_all(lessons)
+    session.commit()
+    for lesson in lessons:
+        session.add(LessonTutor(lesson_id=lesson.id, tutor_id=auth_client.user.id))
+        session.add(LessonStudent(lesson_id=lesson.id, student_id=student.id))
+    session.commit()
+
+    # Results come back in start order
+    r = auth_client.get(auth_client.app.url_path_for('get_lessons'))
+    assert r.status_code == 200, r.json()
+    assert [lesson['topic'] for lesson in r.json()] == ['Lesson 8', 'Lesson 15', 'Lesson 16', 'Lesson 22']
+
+    # The week of the 15th, with start_before exclusive
+    params = {'start_after': '2024-01-15T00:00:00Z', 'start_before': '2024-01-22T14:00:00Z'}
+    r = auth_client.get(auth_client.app.url_path_for('get_lessons'), params=params)
+    assert r.status_code == 200, r.json()
+    assert [lesson['topic'] for lesson in r.json()] == ['Lesson 15', 'Lesson 16']
+
+    # Timezone-aware bounds are compared in UTC
+    params = {'start_after': '2024-01-15T15:00:00+01:00'}
+    r = auth_client.get(auth_client.app.url_path_for('get_lessons'), params=params)
+    assert [lesson['topic'] for lesson in r.json()] == ['Lesson 15', 'Lesson 16', 'Lesson 22']
+
+    # Upcoming planned lessons
+    params = {'start_after': '2024-01-10T00:00:00Z', 'status': 'planned'}
+    r = auth_client.get(auth_client.app.url_path_for('get_lessons'), params=params)
+    assert r.status_code == 200, r.json()
+    assert [lesson['topic'] for lesson in r.json()] == ['Lesson 15', 'Lesson 22']
+
+    r = auth_client.get(
+        auth_client.app.url_path_for('get_lessons_for_student', student_id=student.id),
+        params={'start_before': '2024-01-16T00:00:00Z', 'status': 'planned'},
+    )
+    assert r.status_code == 200, r.json()
+    assert [lesson['topic'] for lesson in r.json()] == ['Lesson 15']
+
+    r = auth_client.get(auth_client.app.url_path_for('get_lessons'), params={'status': 'unknown'})
+    assert r.status_code == 422, r.json()
+
+
+def test_get_lessons_filter_lesson_created_with_utc_offset(auth_client: AuthenticatedTestClient):
+    """Test a lesson created with a UTC offset is matched by its UTC start time"""
+    lesson_data = {
+        'start_dt': '2024-01-15T14:00:00+02:00',
+        'end_dt': '2024-01-15T15:00:00+02:00',
+        'subject': 'Mathematics',
+        'topic': 'Algebra',
+        'notes': 'Math lesson',
+    }
+    r = auth_client.post(auth_client.app.url_path_for('create_lesson'), json=lesson_data)
+    assert r.status_code == 200, r.json()
+
+    params = {'start_after': '2024-01-15T12:00:00Z', 'start_before': '2024-01-15T12:30:00Z'}
+    r = auth_client.get(auth_client.app.url_path_for('get_lessons'), params=params)
+    assert r.status_code == 200, r.json()
+    assert [lesson['topic'] for lesson in r.json()] == ['Algebra']
+
+    params = {'start_after': '2024-01-15T14:00:00Z'}
+    r = auth_client.get(auth_client.app.url_path_for('get_lessons'), params=params)
+    assert r.json() == []
+
+
+def test_get_lesson_changes(client: TestClient, auth_client: AuthenticatedTestClient, session: Session, monkeypatch):
+    """Test syncing lesson changes since a cursor, including deletions"""
+    # Without an overlap only changes at or after the cursor are sent
+    monkeypatch.setattr(settings, 'change_feed_overlap_seconds', 0)
+    lesson_data = {
+        'start_dt': '2024-01-15T14:00:00Z',
+        'end_dt': '2024-01-15T15:00:00Z',
+        'subject': 'Mathematics',
+        'notes': 'Math lesson',
+    }
+    lesson_ids = []
+    for topic in ('Algebra', 'Geometry', 'Fractions'):
+        r = auth_client.post(auth_client.app.url_path_for('create_lesson'), json={**lesson_data, 'topic': topic})
+        assert r.status_code == 200, r.json()
+        lesson_ids.append(r.json()['id'])
+
+    # Another tutor's lesson will be deleted, which shouldn't show up in this tutor's changes
+    other_tutor = User(
+        email='other@example.com',
+        hashed_password='hashed',
+        user_type=UserType.TUTOR,
+        first_name='Other',
+        last_name='Tutor',
+    )
+    other_lesson = Lesson(
+        start_dt=datetime(2024, 1, 15, 14, 0, tzinfo=timezone.utc),
+        end_dt=datetime(2024, 1, 15, 15, 0, tzinfo=timezone.utc),
+        subject='Mathematics',
+        topic='Other',
+        notes='Math lesson',
+    )
+    session.add_all([other_tutor, other_lesson])
+    session.commit()
+    session.add(LessonTutor(lesson_id=other_lesson.id, tutor_id=other_tutor.id))
+    session.commit()
+
+    # A full sync returns everything and a cursor
+    r = auth_client.get(auth_client.app.url_path_for('get_lesson_changes'))
+    assert r.status_code == 200, r.json()
+    data = r.json()
+    assert [lesson['id'] for lesson in data['lessons']] == lesson_ids
+    assert data['deleted_ids'] == []
+    cursor = data['cursor']
+    assert cursor is not None
+
+    # Nothing has changed yet, only the lesson stamped at the cursor is sent again
+    r = auth_client.get(auth_client.app.url_path_for('get_lesson_changes'), params={'since': cursor})
+    assert r.status_code == 200, r.json()
+    assert r.json()['cursor'] == cursor
+    assert [lesson['id'] for lesson in r.json()['lessons']] == [lesson_ids[2]]
+    assert r.json()['deleted_ids'] == []
+
+    r = auth_client.put(
+        auth_client.app.url_path_for('update_lesson', lesson_id=lesson_ids[0]), json={'topic': 'Linear algebra'}
+    )
+    assert r.status_code == 200, r.json()
+    r = auth_client.delete(auth_client.app.url_path_for('delete_lesson', lesson_id=lesson_ids[1]))
+    assert r.status_code == 200, r.json()
+    r = auth_client.post(auth_client.app.url_path_for('create_lesson'), json={**lesson_data, 'topic': 'Decimals'})
+    assert r.status_code == 200, r.json()
+    new_lesson_id = r.json()['id']
+    other_client = create_authenticated_client_for_user(client, other_tutor)
+    r = other_client.delete(other_client.app.url_path_for('delete_lesson', lesson_id=other_lesson.id))
+    assert r.status_code == 200, r.json()
+
+    r = auth_client.get(auth_client.app.url_path_for('get_lesson_changes'), params={'since': cursor})
+    assert r.status_code == 200, r.json()
+    data = r.json()
+    assert [(lesson['id'], lesson['topic']) for lesson in data['lessons']] == [
+        (lesson_ids[0], 'Linear algebra'),
+        (lesson_ids[2], 'Fractions'),
+        (new_lesson_id, 'Decimals'),
+    ]
+    assert data['deleted_ids'] == [lesson_ids[1]]
+    assert data['cursor'] > cursor
+
+    # The new cursor picks up from there
+    r = auth_client.get(auth_client.app.url_path_for('get_lesson_changes'), params={'since': data['cursor']})
+    assert [lesson['id'] for lesson in r.json()['lessons']] == [new_lesson_id]
+    assert r.json()['deleted_ids'] == []
+
+    tombstones = session.exec(select(Tombstone).where(Tombstone.object_id == lesson_ids[1])).all()
+    assert [(t.object_type, t.tutor_id) for t in tombstones] == [(TombstoneType.LESSON, auth_client.user.id)]
+    other_tombstones = session.exec(select(Tombstone.tutor_id).where(Tombstone.object_id == other_lesson.id)).all()
+    assert other_tombstones == [other_tutor.id]
+
+
+def test_get_lesson_changes_overlap(auth_client: AuthenticatedTestClient, session: Session):
+    """Test changes stamped just before the cursor, e.g. by a transaction that committed late, are still sent"""
+    lesson_data = {
+        'start_dt': '2024-01-15T14:00:00Z',
+        'end_dt': '2024-01-15T15:00:00Z',
+        'subject': 'Mathematics',
+        'topic': 'Algebra',
+        'notes': 'Math lesson',
+    }
+    r = auth_client.post(auth_client.app.url_path_for('create_lesson'), json=lesson_data)
+    assert r.status_code == 200, r.json()
+    r = auth_client.get(auth_client.app.url_path_for('get_lesson_changes'))
+    cursor = r.json()['cursor']
+
+    # Lessons stamped before the cursor that only become visible after it was handed out
+    stamped_at = datetime.fromisoformat(cursor)
+    late_lesson, old_lesson = (
+        Lesson(
+            start_dt=datetime(2024, 1, 15, 14, 0),
+            end_dt=datetime(2024, 1, 15, 15, 0),
+            subject='Mathematics',
+            topic=topic,
+            notes='Math lesson',
+            created_at=stamped_at - timedelta(seconds=seconds),
+        )
+        for topic, seconds in [('Late', 5), ('Old', settings.change_feed_overlap_seconds + 5)]
+    )
+    session.add_all([late_lesson, old_lesson])
+    session.commit()
+    session.add_all(
+        [
+            LessonTutor(lesson_id=late_lesson.id, tutor_id=auth_client.user.id),
+            LessonTutor(lesson_id=old_lesson.id, tutor_id=auth_client.user.id),
+        ]
+    )
+    session.commit()
+
+    r = auth_client.get(auth_client.app.url_path_for('get_lesson_changes'), params={'since': cursor})
+    assert r.status_code == 200, r.json()
+    assert [lesson['topic'] for lesson in r.json()['lessons']] == ['Algebra', 'Late']
+    # The cursor never moves backwards
+    assert r.json()['cursor'] == cursor
+
+
+def test_get_lesson_changes_student_updated(auth_client: AuthenticatedTestClient, session: Session):
+    """Test a lesson is sent again when a student embedded in it changes"""
+    client = Client(first_name='John', last_name='Doe', email='john.doe@example.com', phone='+1234567890')
+    session.add(client)
+    session.commit()
+    student = Student(
+        client_id=client.id,
+        first_name='Alice',
+        last_name='Smith',
+        email='alice.smith@example.com',
+        phone='+1111111111',
+        grade='10th Grade',
+    )
+    session.add(student)
+    session.commit()
+    lesson = Lesson(
+        start_dt=datetime(2024, 1, 15, 14, 0),
+        end_dt=datetime(2024, 1, 15, 15, 0),
+        subject='Mathematics',
+        topic='Algebra',
+        notes='Math lesson',
+        created_at=datetime(2024, 1, 1),
+    )
+    session.add(lesson)
+    session.commit()
+    session.add_all(
+        [
+            LessonTutor(lesson_id=lesson.id, tutor_id=auth_client.user.id),
+            LessonStudent(lesson_id=lesson.id, student_id=student.id),
+        ]
+    )
+    session.commit()
+
+    r = auth_client.get(auth_client.app.url_path_for('get_lesson_changes'), params={'since': '2024-06-01T00:00:00'})
+    assert r.json()['lessons'] == []
+
+    r = auth_client.put(
+        auth_client.app.url_path_for('update_student', student_id=student.id), json={'first_name': 'Ali'}
+    )
+    assert r.status_code == 200, r.json()
+
+    r = auth_client.get(auth_client.app.url_path_for('get_lesson_changes'), params={'since': '2024-06-01T00:00:00'})
+    assert [lesson['students'][0]['first_name'] for lesson in r.json()['lessons']] == ['Ali']
+
+
+def test_get_lessons_etag(auth_client: AuthenticatedTestClient, session: Session):
+    """Test lesson reads answer 304 Not Modified until the lessons change"""
+    client = Client(
+        first_name='John',
+        last_name='Doe',
+        email='john.doe@example.com',
+        phone='+1234567890',
+    )
+    session.add(client)
+    session.commit()
+    student = Student(
+        client_id=client.id,
+        first_name='Alice',
+        last_name='Smith',
+        email='alice.smith@example.com',
+        phone='+1111111111',
+        grade='10th Grade',
+    )
+    session.add(student)
+    session.commit()
+
+    lesson_data = {
+        'start_dt': '2024-01-15T14:00:00Z',
+        'end_dt': '2024-01-15T15:00:00Z',
+        'subject': 'Mathematics',
+        'topic': 'Algebra',
+        'notes': 'Math lesson',
+        'student_ids': [student.id],
+    }
+    r = auth_client.post(auth_client.app.url_path_for('create_lesson'), json=lesson_data)
+    assert r.status_code == 200, r.json()
+    lesson_id = r.json()['id']
+
+    url = auth_client.app.url_path_for('get_lessons')
+    r = auth_client.get(url)
+    assert r.status_code == 200, r.json()
+    etag = r.headers['etag']
+
+    r = auth_client.get(url, headers={'If-None-Match': etag})
+    assert r.status_code == 304
+    assert r.content == b''
+    assert r.headers['etag'] == etag
+    r = auth_client.get(url, headers={'If-None-Match': f'"other", W/{etag}'})
+    assert r.status_code == 304
+
+    # Different filters are a different resource
+    r = auth_client.get(url, params={'status': 'planned'}, headers={'If-None-Match': etag})
+    assert r.status_code == 200, r.json()
+
+    r = auth_client.get(auth_client.app.url_path_for('get_lesson', lesson_id=lesson_id))
+    assert r.status_code == 200, r.json()
+    lesson_etag = r.headers['etag']
+    r = auth_client.get(
+        auth_client.app.url_path_for('get_lesson', lesson_id=lesson_id), headers={'If-None-Match': lesson_etag}
+    )
+    assert r.status_code == 304
+
+    # Updating a student embedded in the lessons changes the ETag
+    student.first_name = 'Alicia'
+    student.updated_at = datetime(2030, 1, 1)
+    session.add(student)
+    session.commit()
+    r = auth_client.get(url, headers={'If-None-Match': etag})
+    assert r.status_code == 200, r.json()
+    assert r.json()[0]['students'][0]['first_name'] == 'Alicia'
+    etag = r.headers['etag']
+
+    r = auth_client.put(auth_client.app.url_path_for('update_lesson', lesson_id=lesson_id), json={'topic': 'Geometry'})
+    assert r.status_code == 200, r.json()
+    r = auth_client.get(url, headers={'If-None-Match': etag})
+    assert r.status_code == 200, r.json()
+    assert r.json()[0]['topic'] == 'Geometry'
+    r = auth_client.get(
+        auth_client.app.url_path_for('get_lesson', lesson_id=lesson_id), headers={'If-None-Match': lesson_etag}
+    )
+    assert r.status_code == 200, r.json()
+
+    r = auth_client.delete(auth_client.app.url_path_for('delete_lesson', lesson_id=lesson_id))
+    assert r.status_code == 200, r.json()
+    r = auth_client.get(auth_client.app.url_path_for('get_lesson', lesson_id=lesson_id), headers={'If-None-Match': '*'})
+    assert r.status_code == 404, r.json()
+
+
+def test_lesson_write_events(auth_client: AuthenticatedTestClient, event_broker: InMemoryEventBroker):
+    """Test the lesson write endpoints publish events scoped to the lesson's company and tutors"""
+    lesson_data = {
+        'start_dt': '2024-01-15T14:00:00Z',
+        'end_dt': '2024-01-15T15:00:00Z',
+        'subject': 'Mathematics',
+        'topic': 'Algebra',
+        'notes': 'Math lesson',
+    }
+    r = auth_client.post(auth_client.app.url_path_for('create_lesson'), json=lesson_data)
+    assert r.status_code == 200, r.json()
+    lesson_id = r.json()['id']
+    r = auth_client.post(auth_client.app.url_path_for('create_lessons_bulk'), json=[lesson_data, lesson_data])
+    assert r.status_code == 200, r.json()
+    bulk_ids = [lesson['id'] for lesson in r.json()['created']]
+    r = auth_client.put(auth_client.app.url_path_for('update_lesson', lesson_id=lesson_id), json={'topic': 'Geometry'})
+    assert r.status_code == 200, r.json()
+    r = auth_client.delete(auth_client.app.url_path_for('delete_lesson', lesson_id=lesson_id))
+    assert r.status_code == 200, r.json()
+    r = auth_client.delete(auth_client.app.url_path_for('delete_lessons'), params={'lesson_ids': bulk_ids})
+    assert r.status_code == 200, r.json()
+
+    tutor_ids = [auth_client.user.id]
+    assert [event for _, event in event_broker.events] == [
+        {'type': 'lesson.created', 'lesson_id': lesson_id, 'company_id': None, 'tutor_ids': tutor_ids},
+        {'type': 'lesson.created', 'lesson_id': bulk_ids[0], 'company_id': None, 'tutor_ids': tutor_ids},
+        {'type': 'lesson.created', 'lesson_id': bulk_ids[1], 'company_id': None, 'tutor_ids': tutor_ids},
+        {'type': 'lesson.updated', 'lesson_id': lesson_id, 'company_id': None, 'tutor_ids': tutor_ids},
+        {'type': 'lesson.deleted', 'lesson_id': lesson_id, 'company_id': None, 'tutor_ids': tutor_ids},
+        {'type': 'lesson.deleted', 'lesson_id': bulk_ids[0], 'company_id': None, 'tutor_ids': tutor_ids},
+        {'type': 'lesson.deleted', 'lesson_id': bulk_ids[1], 'company_id': None, 'tutor_ids': tutor_ids},
+    ]
+
+
+async def test_lesson_event_stream(monkeypatch):
+    """Test the lesson stream only sends the user's events, resumes from Last-Event-ID and sends heartbeats"""
+    monkeypatch.setattr(settings, 'lesson_stream_heartbeat_seconds', 0.1)
+    monkeypatch.setattr(lessons_api, '_open_lesson_streams', 0)
+    tutor = User(id=1, email='tutor@example.com', user_type=UserType.TUTOR, first_name='Test', last_name='Tutor')
+    admin = User(
+        id=2,
+        email='admin@example.com',
+        user_type=UserType.ADMIN,
+        first_name='Test',
+        last_name='Admin',
+        company_ids=[5],
+    )
+    event_broker = InMemoryEventBroker()
+    event_broker.publish(
+        [
+            {'type': 'lesson.created', 'lesson_id': 1, 'company_id': None, 'tutor_ids': [1]},
+            {'type': 'lesson.created', 'lesson_id': 2, 'company_id': 5, 'tutor_ids': [3]},
+            {'type': 'lesson.updated', 'lesson_id': 1, 'company_id': None, 'tutor_ids': [1]},
+        ]
+    )
+
+    # A new stream starts from the latest event
+    stream = _lesson_event_stream(event_broker, tutor, None)
+    assert await anext(stream) == 'retry: 5000\n\n'
+    event_broker.publish([{'type': 'lesson.deleted', 'lesson_id': 1, 'company_id': None, 'tutor_ids': [1]}])
+    assert await anext(stream) == 'id: 4\nevent: lesson.deleted\ndata: {"lesson_id": 1}\n\n'
+    assert await anext(stream) == ': heartbeat\n\n'
+    await stream.aclose()
+
+    # Resuming skips events the user can't see
+    stream = _lesson_event_stream(event_broker, tutor, '1')
+    assert await anext(stream) == 'retry: 5000\n\n'
+    assert await anext(stream) == 'id: 3\nevent: lesson.updated\ndata: {"lesson_id": 1}\n\n'
+    assert await anext(stream) == 'id: 4\nevent: lesson.deleted\ndata: {"lesson_id": 1}\n\n'
+    await stream.aclose()
+
+    stream = _lesson_event_stream(event_broker, admin, '0')
+    assert await anext(stream) == 'retry: 5000\n\n'
+    assert await anext(stream) == 'id: 2\nevent: lesson.created\ndata: {"lesson_id": 2}\n\n'
+    assert await anext(stream) == ': heartbeat\n\n'
+    await stream.aclose()
+
+    # A malformed Last-Event-ID starts from the latest event instead
+    stream = _lesson_event_stream(event_broker, tutor, 'nonsense')
+    assert await anext(stream) == 'retry: 5000\n\n'
+    assert lessons_api._open_lesson_streams == 1
+    assert await anext(stream) == ': heartbeat\n\n'
+    await stream.aclose()
+    assert lessons_api._open_lesson_streams == 0
+
+
+def test_lesson_stream_connection_cap(auth_client: AuthenticatedTestClient, monkeypatch):
+    """Test the lesson stream refuses connections once the worker's cap is reached"""
+    monkeypatch.setattr(settings, 'lesson_stream_max_connections', 1)
+    monkeypatch.setattr(lessons_api, '_open_lesson_streams', 1)
+    r = auth_client.get(auth_client.app.url_path_for('stream_lesson_events'))
+    assert r.status_code == 503, r.json()
+    assert r.json() == {'detail': 'Too many open lesson streams, try again later.'}
+
+
+def test_create_lesson_with_utc_offset(auth_client: AuthenticatedTestClient):
+    """Test times with a UTC offset are stored and returned as UTC, the same whichever endpoint returns them"""
+    lesson_data = {
+        'start_dt': '2024-01-15T14:00:00+02:00',
+        'end_dt': '2024-01-15T15:00:00+02:00',
+        'subject': 'Mathematics',
+        'topic': 'Algebra',
+        'notes': 'Math lesson',
+    }
+    r = auth_client.post(auth_client.app.url_path_for('create_lesson'), json=lesson_data)
+    assert r.status_code == 200, r.json()
+    lesson_id = r.json()['id']
+    assert (r.json()['start_dt'], r.json()['end_dt']) == ('2024-01-15T12:00:00', '2024-01-15T13:00:00')
+
+    r = auth_client.get(auth_client.app.url_path_for('get_lesson', lesson_id=lesson_id))
+    assert (r.json()['start_dt'], r.json()['end_dt']) == ('2024-01-15T12:00:00', '2024-01-15T13:00:00')
+
+    r = auth_client.post(auth_client.app.url_path_for('create_lessons_bulk'), json=[lesson_data])
+    assert r.status_code == 200, r.json()
+    assert r.json()['created'][0]['start_dt'] == '2024-01-15T12:00:00'
+
+    r = auth_client.put(
+        auth_client.app.url_path_for('update_lesson', lesson_id=lesson_id),
+        json={'start_dt': '2024-01-15T13:30:00+02:00'},
+    )
+    assert r.status_code == 200, r.json()
+    assert r.json()['start_dt'] == '2024-01-15T11:30:00'
+    r = auth_client.get(auth_client.app.url_path_for('get_lesson', lesson_id=lesson_id))
+    assert r.json()['start_dt'] == '2024-01-15T11:30:00'
+
+
+def test_get_lesson_etag_company_changed(auth_client: AuthenticatedTestClient, session: Session):
+    """Test the lesson ETag changes when the company details embedded in the lesson change"""
+    company = Company(name='Test Company', tc_id='123', tutorcruncher_domain='https://test.tutorcruncher.com')
+    session.add(company)
+    session.commit()
+    lesson = Lesson(
+        company_id=company.id,
+        tc_path='/lessons/1',
+        start_dt=datetime(2024, 1, 15, 14, 0),
+        end_dt=datetime(2024, 1, 15, 15, 0),
+        subject='Mathematics',
+        topic='Algebra',
+        notes='Math lesson',
+    )
+    session.add(lesson)
+    session.commit()
+    session.add(LessonTutor(lesson_id=lesson.id, tutor_id=auth_client.user.id))
+    session.commit()
+
+    url = auth_client.app.url_path_for('get_lesson', lesson_id=lesson.id)
+    r = auth_client.get(url)
+    assert r.status_code == 200, r.json()
+    etag = r.headers['etag']
+
+    company.tutorcruncher_domain = 'https://new.tutorcruncher.com'
+    company.updated_at = datetime(2030, 1, 1)
+    session.add(company)
+    session.commit()
+    r = auth_client.get(url, headers={'If-None-Match': etag})
+    assert r.status_code == 200, r.json()
+    assert r.headers['etag'] != etag
+
+
+def test_get_lessons_sparse_fields(auth_client: AuthenticatedTestClient, session: Session, statements: list[str]):
+    """Test fields= only selects and returns the requested columns, and students are only added with include"""
+    client = Client(first_name='John', last_name='Doe', email='john.doe@example.com', phone='+1234567890')
+    session.add(client)
+    session.commit()
+    student = Student(
+        client_id=client.id,
+        first_name='Alice',
+        last_name='Smith',
+        email='alice.smith@example.com',
+        phone='+1111111111',
+        grade='10th Grade',
+    )
+    lesson = Lesson(
+        start_dt=datetime(2024, 1, 15, 14, 0),
+        end_dt=datetime(2024, 1, 15, 15, 0),
+        subject='Mathematics',
+        topic='Algebra',
+        notes='Math lesson',
+        tutor_tips=['Use diagrams'],
+    )
+    session.add_all([student, lesson])
+    session.commit()
+    session.add_all(
+        [
+            LessonTutor(lesson_id=lesson.id, tutor_id=auth_client.user.id),
+            LessonStudent(lesson_id=lesson.id, student_id=student.id),
+        ]
+    )
+    session.commit()
+    session.expunge_all()
+    statements.clear()
+
+    url = auth_client.app.url_path_for('get_lessons')
+    r = auth_client.get(url, params={'fields': 'start_dt,subject,status'})
+    assert r.status_code == 200, r.json()
+    assert r.json() == [
+        {'id': lesson.id, 'start_dt': '2024-01-15T14:00:00', 'subject': 'Mathematics', 'status': 'planned'}
+    ]
+    # The user, the ETag version and the lessons, with no student queries
+    assert len(statements) == 3
+    assert statements[-1].startswith('SELECT lesson.start_dt, lesson.subject, lesson.status, lesson.id \nFROM lesson')
+
+    r = auth_client.get(
+        auth_client.app.url_path_for('get_lessons_for_student', student_id=student.id),
+        params={'fields': 'topic', 'include': 'students'},
+    )
+    assert r.status_code == 200, r.json()
+    data = r.json()
+    assert [(row['id'], row['topic']) for row in data] == [(lesson.id, 'Algebra')]
+    assert set(data[0]) == {'id', 'topic', 'students'}
+    assert [s['first_name'] for s in data[0]['students']] == ['Alice']
+
+    # Without fields the full shape is returned
+    r = auth_client.get(url)
+    assert r.json()[0]['tutor_tips'] == ['Use diagrams']
+    assert len(r.json()[0]['students']) == 1
+
+    r = auth_client.get(url, params={'fields': 'topic,password'})
+    assert r.status_code == 400, r.json()
+    assert r.json() == {'detail': 'Unknown lesson field: password'}
+    r = auth_client.get(url, params={'fields': 'topic', 'include': 'tutors'})
+    assert r.status_code == 400, r.json()
+    assert r.json() == {'detail': 'Unknown include: tutors'}
+
+
+def test_lesson_responses_match_lesson_read(auth_client: AuthenticatedTestClient, session: Session):
+    """Test lessons built without LessonRead still serialize exactly as LessonRead would"""
+    client = Client(first_name='John', last_name='Doe', email='john.doe@example.com', phone='+1234567890')
+    session.add(client)
+    session.commit()
+    student = Student(
+        client_id=client.id,
+        first_name='Alice',
+        last_name='Smith',
+        email='alice.smith@example.com',
+        phone='+1111111111',
+        grade='10th Grade',
+        strengths=['Reading'],
+    )
+    session.add(student)
+    session.commit()
+
+    lesson_data = {
+        'start_dt': '2024-01-15T14:00:00.250000Z',
+        'end_dt': '2024-01-15T15:00:00Z',
+        'subject': 'Mathematics',
+        'topic': 'Algebra',
+        'notes': 'Math lesson',
+        'status': 'complete',
+        'tutor_tips': ['Use diagrams'],
+        'student_ids': [student.id],
+    }
+    r = auth_client.post(auth_client.app.url_path_for('create_lesson'), json=lesson_data)
+    assert r.status_code == 200, r.json()
+    lesson = r.json()
+    # The embedded students are table models, which model_validate doesn't coerce, so they're compared separately
+    lesson_read = LessonRead.model_validate(lesson).model_dump(mode='json', exclude={'students'})
+    assert lesson == {**lesson_read, 'students': lesson['students']}
+    assert list(lesson['students'][0]) == list(Student.model_fields)
+
+    r = auth_client.get(auth_client.app.url_path_for('get_lessons'))
+    assert r.status_code == 200, r.json()
+    assert r.json() == [lesson]
+    assert lesson['start_dt'] == '2024-01-15T14:00:00.250000'
+    assert lesson['students'][0]['strengths'] == ['Reading']
+
+
+def test_get_lessons_msgpack(auth_client: AuthenticatedTestClient, session: Session):
+    """Test clients asking for MessagePack get the same lessons as JSON clients, with their own ETag"""
+    client = Client(first_name='John', last_name='Doe', email='john.doe@example.com', phone='+1234567890')
+    session.add(client)
+    session.commit()
+    student = Student(
+        client_id=client.id,
+        first_name='Alice',
+        last_name='Smith',
+        email='alice.smith@example.com',
+        phone='+1111111111',
+        grade='10th Grade',
+        strengths=['Reading'],
+    )
+    session.add(student)
+    session.commit()
+
+    lesson_data = {
+        'start_dt': '2024-01-15T14:00:00Z',
+        'end_dt': '2024-01-15T15:00:00Z',
+        'subject': 'Mathematics',
+        'topic': 'Algebra',
+        'notes': 'Math lesson',
+        'tutor_tips': ['Use diagrams'],
+        'student_ids': [student.id],
+    }
+    r = auth_client.post(auth_client.app.url_path_for('create_lesson'), json=lesson_data)
+    assert r.status_code == 200, r.json()
+
+    url = auth_client.app.url_path_for('get_lessons')
+    json_r = auth_client.get(url)
+    assert json_r.headers['content-type'] == 'application/json'
+    assert json_r.headers['vary'] == 'Accept'
+
+    r = auth_client.get(url, headers={'Accept': 'application/msgpack'})
+    assert r.status_code == 200
+    assert r.headers['content-type'] == 'application/msgpack'
+    assert r.headers['vary'] == 'Accept'
+    assert msgpack.unpackb(r.content) == json_r.json()
+    assert r.headers['etag'] != json_r.headers['etag']
+    r = auth_client.get(url, headers={'Accept': 'application/msgpack', 'If-None-Match': json_r.headers['etag']})
+    assert r.status_code == 200
+
+    # JSON is kept when the client prefers it
+    r = auth_client.get(url, headers={'Accept': 'application/json, application/msgpack;q=0.5'})
+    assert r.headers['content-type'] == 'application/json'
+    r = auth_client.get(url, headers={'Accept': 'application/msgpack, application/json;q=0.5'})
+    assert r.headers['content-type'] == 'application/msgpack'
+
+    # Errors are encoded the same way
+    r = auth_client.get(
+        auth_client.app.url_path_for('get_lesson', lesson_id=999), headers={'Accept': 'application/msgpack'}
+    )
+    assert r.status_code == 404
+    assert msgpack.unpackb(r.content) == {'detail': 'Lesson not found'}
+    r = auth_client.get(url, params={'status': 'nope'}, headers={'Accept': 'application/msgpack'})
+    assert r.status_code == 422
+    assert msgpack.unpackb(r.content)['detail'][0]['loc'] == ['query', 'status']
+
+
+def test_export_lessons_for_student(auth_client: AuthenticatedTestClient, session: Session, monkeypatch):
+    """Test a student's lessons are streamed as NDJSON or CSV, in batches, scoped as get_lessons_for_student"""
+    monkeypatch.setattr(settings, 'lesson_export_batch_size', 2)
+    client = Client(first_name='John', last_name='Doe', email='john.doe@example.com', phone='+1234567890')
+    session.add(client)
+    session.commit()
+    student = Student(
+        client_id=client.id,
+        first_name='Alice',
+        last_name='Smith',
+        email='alice.smith@example.com',
+        phone='+1111111111',
+        grade='10th Grade',
+    )
+    session.add(student)
+    session.commit()
+
+    other_tutor = User(
+        email='other@example.com',
+        hashed_password='dummy',
+        is_tutor=True,
+        first_name='Other',
+        last_name='Tutor',
+        user_type=UserType.TUTOR,
+    )
+    session.add(other_tutor)
+    session.commit()
+    lessons = [
+        Lesson(
+            start_dt=datetime(2024, 1, 20 - day, 14),
+            end_dt=datetime(2024, 1, 20 - day, 15),
+            subject='Mathematics',
+            topic=f'Topic {day}',
+            notes='Math lesson',
+            tutor_tips=['Use diagrams', 'Check units'],
+        )
+        for day in range(5)
+    ]
+    session.add_all(lessons)
+    session.commit()
+    session.add_all(LessonStudent(lesson_id=lesson.id, student_id=student.id) for lesson in lessons)
+    # The last lesson is another tutor's, so isn't exported
+    session.add_all(LessonTutor(lesson_id=lesson.id, tutor_id=auth_client.user.id) for lesson in lessons[:4])
+    session.add(LessonTutor(lesson_id=lessons[4].id, tutor_id=other_tutor.id))
+    session.commit()
+
+    url = auth_client.app.url_path_for('export_lessons_for_student', student_id=student.id)
+    expected = auth_client.get(auth_client.app.url_path_for('get_lessons_for_student', student_id=student.id)).json()
+    expected.sort(key=lambda lesson: lesson['start_dt'])
+    assert [lesson['topic'] for lesson in expected] == ['Topic 3', 'Topic 2', 'Topic 1', 'Topic 0']
+
+    r = auth_client.get(url)
+    assert r.status_code == 200
+    assert r.headers['content-type'] == 'application/x-ndjson'
+    assert r.headers['content-disposition'] == f'attachment; filename="student-{student.id}-lessons.ndjson"'
+    assert [json.loads(line) for line in r.text.splitlines()] == expected
+
+    # Lessons are read and sent two at a time
+    query = _get_lessons_for_user(session, auth_client.user, select(Lesson)).order_by(Lesson.start_dt)
+    chunks = list(_lesson_export_rows(session.get_bind(), query, 'ndjson'))
+    assert [len(chunk.splitlines()) for chunk in chunks] == [2, 2]
+
+    r = auth_client.get(url, params={'format': 'csv', 'start_after': '2024-01-19T00:00:00'})
+    assert r.status_code == 200
+    assert r.headers['content-type'].startswith('text/csv')
+    rows = list(csv.DictReader(io.StringIO(r.text)))
+    assert [row['topic'] for row in rows] == ['Topic 1', 'Topic 0']
+    assert rows[0]['start_dt'] == '2024-01-19T14:00:00'
+    assert rows[0]['status'] == 'planned'
+    assert rows[0]['tutor_tips'] == 'Use diagrams; Check units'
+    assert rows[0]['students'] == 'Alice Smith'
+
+    r = auth_client.get(url, params={'format': 'xml'})
+    assert r.status_code == 422, r.json()
+    r = auth_client.get(auth_client.app.url_path_for('export_lessons_for_student', student_id=999))
+    assert r.status_code == 404, r.json()
+
+
+def test_search_lessons(auth_client: AuthenticatedTestClient, session: Session):
+    """Test lessons are searched across their text, best match first, only within the lessons the user can see"""
+    other_tutor = User(
+        email='other@example.com',
+        hashed_password='dummy',
+        is_tutor=True,
+        first_name='Other',
+        last_name='Tutor',
+        user_type=UserType.TUTOR,
+    )
+    session.add(other_tutor)
+    session.commit()
+    lesson_data = [
+        ('Mathematics', 'Fractions', 'Adding and simplifying', [], []),
+        ('Mathematics', 'Decimals', 'Converted fractions to decimals', [], []),
+        ('Mathematics', 'Percentages', 'Worked through exam questions', ['Draw a fraction wall'], []),
+        ('Physics', 'Mechanics', 'Forces and motion', [], ['vectors']),
+        ('Mathematics', 'Fractions', 'Another tutor teaching fractions', [], []),
+    ]
+    lessons = [
+        Lesson(
+            start_dt=datetime(2024, 1, 15 + i, 14),
+            end_dt=datetime(2024, 1, 15 + i, 15),
+            subject=subject,
+            topic=topic,
+            notes=notes,
+            tutor_tips=tutor_tips,
+            skills_practiced=skills,
+        )
+        for i, (subject, topic, notes, tutor_tips, skills) in enumerate(lesson_data)
+    ]
+    session.add_all(lessons)
+    session.commit()
+    session.add_all(LessonTutor(lesson_id=lesson.id, tutor_id=auth_client.user.id) for lesson in lessons[:4])
+    session.add(LessonTutor(lesson_id=lessons[4].id, tutor_id=other_tutor.id))
+    session.commit()
+
+    url = auth_client.app.url_path_for('search_lessons')
+    r = auth_client.get(url, params={'q': 'fractions'})
+    assert r.status_code == 200, r.json()
+    data = r.json()
+    # The topic match ranks above the notes, and the other tutor's lesson isn't included. Words are stemmed, so the
+    # tutor tip about a "fraction wall" matches too
+    assert data['total'] == 3
+    assert [lesson['topic'] for lesson in data['lessons']] == ['Fractions', 'Percentages', 'Decimals']
+    assert data['lessons'][0] == LessonRead.model_validate(data['lessons'][0]).model_dump(mode='json')
+
+    r = auth_client.get(url, params={'q': 'fractions', 'limit': 2, 'offset': 2})
+    assert r.json()['total'] == 3
+    assert [lesson['topic'] for lesson in r.json()['lessons']] == ['Decimals']
+
+    r = auth_client.get(url, params={'q': 'vectors'})
+    assert [lesson['topic'] for lesson in r.json()['lessons']] == ['Mechanics']
+
+    # Changes are picked up by the index
+    r = auth_client.put(
+        auth_client.app.url_path_for('update_lesson', lesson_id=lessons[3].id), json={'notes': 'Fractions of a force'}
+    )
+    assert r.status_code == 200, r.json()
+    r = auth_client.get(url, params={'q': 'force fractions'})
+    assert [lesson['topic'] for lesson in r.json()['lessons']] == ['Mechanics']
+    r = auth_client.delete(auth_client.app.url_path_for('delete_lesson', lesson_id=lessons[0].id))
+    assert r.status_code == 200, r.json()
+    r = auth_client.get(url, params={'q': 'fractions'})
+    assert [lesson['topic'] for lesson in r.json()['lessons']] == ['Percentages', 'Decimals', 'Mechanics']
+
+    # Search syntax is treated as plain words
+    r = auth_client.get(url, params={'q': 'topic: NEAR("exam" *'})
+    assert r.status_code == 200, r.json()
+    assert r.json()['total'] == 0
+    r = auth_client.get(url, params={'q': '"exam"'})
+    assert [lesson['topic'] for lesson in r.json()['lessons']] == ['Percentages']
+    r = auth_client.get(url, params={'q': '?!'})
+    assert r.json() == {'total': 0, 'lessons': []}
+    r = auth_client.get(url, params={'q': ''})
+    assert r.status_code == 422, r.json()
+
+
+def test_lesson_tags(auth_client: AuthenticatedTestClient, session: Session):
+    """Test lessons are filtered by tag and tags are counted across the lessons the user can see"""
+    lesson_data = {
+        'start_dt': '2024-01-15T14:00:00Z',
+        'end_dt': '2024-01-15T15:00:00Z',
+        'subject': 'Mathematics',
+        'topic': 'Fractions',
+        'notes': 'Math lesson',
+        'skills_practiced': ['fractions', 'word problems'],
+        'student_strengths_observed': ['fractions'],
+    }
+    r = auth_client.post(auth_client.app.url_path_for('create_lesson'), json=lesson_data)
+    assert r.status_code == 200, r.json()
+    assert r.json()['skills_practiced'] == ['fractions', 'word problems']
+    r = auth_client.post(
+        auth_client.app.url_path_for('create_lessons_bulk'),
+        json=[
+            {**lesson_data, 'topic': 'Decimals', 'skills_practiced': ['decimals', 'word problems'], 'end_dt': 'x'},
+            {**lesson_data, 'topic': 'Decimals', 'skills_practiced': ['decimals', 'word problems']},
+            {**lesson_data, 'topic': 'Revision', 'skills_practiced': [], 'student_strengths_observed': []},
+        ],
+    )
+    assert r.status_code == 422, r.json()
+    r = auth_client.post(
+        auth_client.app.url_path_for('create_lessons_bulk'),
+        json=[
+            {**lesson_data, 'topic': 'Decimals', 'skills_practiced': ['decimals', 'word problems']},
+            {**lesson_data, 'topic': 'Revision', 'skills_practiced': [], 'student_strengths_observed': []},
+        ],
+    )
+    assert r.status_code == 200, r.json()
+
+    # Another tutor's lessons aren't counted
+    other_tutor = User(
+        email='other@example.com',
+        hashed_password='dummy',
+        is_tutor=True,
+        first_name='Other',
+        last_name='Tutor',
+        user_type=UserType.TUTOR,
+    )
+    session.add(other_tutor)
+    session.commit()
+    other_client = create_authenticated_client_for_user(auth_client, other_tutor)
+    r = other_client.post(auth_client.app.url_path_for('create_lesson'), json=lesson_data)
+    assert r.status_code == 200, r.json()
+
+    url = auth_client.app.url_path_for('get_lessons')
+
+    def topics(**params) -> list[str]:
+        r = auth_client.get(url, params=params)
+        assert r.status_code == 200, r.json()
+        return [lesson['topic'] for lesson in r.json()]
+
+    assert topics(tag='word problems') == ['Fractions', 'Decimals']
+    assert topics(tag=['word problems', 'decimals']) == ['Decimals']
+    assert topics(tag='fractions', tag_kind='student_strengths_observed') == ['Fractions', 'Decimals']
+    assert topics(tag='fractions', tag_kind='skills_practiced') == ['Fractions']
+    assert topics(tag='nothing') == []
+
+    r = auth_client.get(auth_client.app.url_path_for('get_lesson_tags'))
+    assert r.status_code == 200, r.json()
+    assert r.json() == [
+        {'name': 'fractions', 'kind': 'student_strengths_observed', 'count': 2},
+        {'name': 'word problems', 'kind': 'skills_practiced', 'count': 2},
+        {'name': 'decimals', 'kind': 'skills_practiced', 'count': 1},
+        {'name': 'fractions', 'kind': 'skills_practiced', 'count': 1},
+    ]
+    r = auth_client.get(auth_client.app.url_path_for('get_lesson_tags'), params={'kind': 'student_strengths_observed'})
+    assert r.json() == [{'name': 'fractions', 'kind': 'student_strengths_observed', 'count': 2}]
+
+    # Tags are interned, each name is stored once
+    assert sorted(session.exec(select(Tag.name)).all()) == ['decimals', 'fractions', 'word problems']
+
+
+def test_backfill_tags(session: Session):
+    """Test the tag index can be rebuilt from the JSON lists of existing lessons and students"""
+    client = Client(first_name='John', last_name='Doe', email='john.doe@example.com', phone='+1234567890')
+    session.add(client)
+    session.commit()
+    student = Student(
+        client_id=client.id,
+        first_name='Alice',
+        last_name='Smith',
+        email='alice.smith@example.com',
+        phone='+1111111111',
+        grade='10th Grade',
+        strengths=['Algebra'],
+    )
+    lesson = Lesson(
+        start_dt=datetime(2024, 1, 15, 14),
+        end_dt=datetime(2024, 1, 15, 15),
+        subject='Mathematics',
+        topic='Algebra',
+        notes='Math lesson',
+        skills_practiced=['Algebra', 'Algebra', 'Graphs'],
+    )
+    session.add_all([student, lesson])
+    session.commit()
+    # Rows written directly, e.g. before the tag tables existed, aren't indexed
+    assert session.exec(select(LessonTag)).all() == []
+
+    assert backfill_tags(session, batch_size=1) == (1, 1)
+    assert backfill_tags(session) == (1, 1)
+    lesson_tags = session.exec(select(Tag.name, LessonTag.kind).join(Tag).order_by(Tag.name)).all()
+    assert lesson_tags == [('Algebra', TagKind.SKILLS_PRACTICED), ('Graphs', TagKind.SKILLS_PRACTICED)]
+    student_tags = session.exec(select(Tag.name, StudentTag.kind).join(Tag)).all()
+    assert student_tags == [('Algebra', TagKind.STRENGTHS)]
@@ -1,7 +1,12 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
 from fastapi.testclient import TestClient
-from sqlmodel import Session
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
 
-from app.models import Client, Company, Student, TutorStudent, User
+from app.core.config import settings
+from app.models import Client, Company, Lesson, LessonStudent, Student, StudentRead, TutorStudent, User
 from tests.conftest import AuthenticatedTestClient
 
 
@@ -55,6 +60,32 @@ def test_create_student_invalid_client_id(auth_client: AuthenticatedTestClient):
     assert 'Client not found' in r.json()['detail']
 
 
+def test_create_student_invalid_company_id(auth_client: AuthenticatedTestClient, session: Session):
+    """Test creating a student with a company that doesn't exist"""
+    client = Client(
+        first_name='John',
+        last_name='Doe',
+        email='john.doe@example.com',
+        phone='+1234567890',
+    )
+    session.add(client)
+    session.commit()
+
+    student_data = {
+        'client_id': client.id,
+        'company_id': 999,
+        'first_name': 'Alice',
+        'last_name': 'Smith',
+        'email': 'alice.smith@example.com',
+        'phone': '+1111111111',
+        'grade': '10th Grade',
+    }
+    r = auth_client.post(auth_client.app.url_path_for('create_student'), json=student_data)
+    assert r.status_code == 404, r.json()
+    assert r.json()['detail'] == 'Company not found'
+    assert session.exec(select(Student)).all() == []
+
+
 def test_create_student_duplicate_email(auth_client: AuthenticatedTestClient, session: Session):
     """Test creating a student with duplicate email"""
     # First create a client
@@ -342,6 +373,28 @@ def test_update_student_duplicate_email(auth_client: AuthenticatedTestClient, se
     assert 'Email already registered' in r.json()['detail']
 
 
+def test_update_student_other_integrity_error(auth_client: AuthenticatedTestClient, session: Session):
+    """Test a constraint failure that isn't about the email isn't reported as a duplicate email"""
+    client = Client(first_name='John', last_name='Doe', email='john.doe@example.com', phone='+1234567890')
+    session.add(client)
+    session.commit()
+    student = Student(
+        client_id=client.id,
+        first_name='Alice',
+        last_name='Smith',
+        email='alice.smith@example.com',
+        phone='+1111111111',
+        grade='10th Grade',
+    )
+    session.add(student)
+    session.commit()
+
+    # first_name is NOT NULL
+    update_data = {'first_name': None, 'email': 'alice.smith@example.com'}
+    with pytest.raises(IntegrityError):
+        auth_client.put(auth_client.app.url_path_for('update_student', student_id=student.id), json=update_data)
+
+
 def test_update_nonexistent_student(auth_client: AuthenticatedTestClient):
     """Test updating a non-existent student"""
     update_data = {
@@ -390,6 +443,49 @@ def test_delete_student(auth_client: AuthenticatedTestClient, session: Session,
     assert r.status_code == 404, r.json()
 
 
+def test_delete_student_removes_associations(auth_client: AuthenticatedTestClient, session: Session):
+    """Test deleting a student also removes its lesson and tutor associations"""
+    client = Client(
+        first_name='John',
+        last_name='Doe',
+        email='john.doe@example.com',
+        phone='+1234567890',
+    )
+    session.add(client)
+    session.commit()
+    session.refresh(client)
+
+    student = Student(
+        client_id=client.id,
+        first_name='Alice',
+        last_name='Smith',
+        email='alice.smith@example.com',
+        phone='+1111111111',
+        grade='10th Grade',
+    )
+    lesson = Lesson(
+        start_dt=datetime(2024, 1, 15, 14, 0, tzinfo=timezone.utc),
+        end_dt=datetime(2024, 1, 15, 15, 0, tzinfo=timezone.utc),
+        subject='Mathematics',
+        topic='Algebra',
+        notes='Math lesson',
+    )
+    session.add_all([student, lesson])
+    session.commit()
+    session.refresh(student)
+    session.refresh(lesson)
+    session.add(LessonStudent(lesson_id=lesson.id, student_id=student.id))
+    session.add(TutorStudent(tutor_id=auth_client.user.id, student_id=student.id))
+    session.commit()
+
+    r = auth_client.delete(auth_client.app.url_path_for('delete_student', student_id=student.id))
+    assert r.status_code == 200, r.json()
+
+    assert session.exec(select(LessonStudent).where(LessonStudent.student_id == student.id)).all() == []
+    assert session.exec(select(TutorStudent).where(TutorStudent.student_id == student.id)).all() == []
+    assert session.get(Lesson, lesson.id) is not None
+
+
 def test_delete_nonexistent_student(auth_client: AuthenticatedTestClient):
     """Test deleting a non-existent student"""
     r = auth_client.delete(auth_client.app.url_path_for('delete_student', student_id=999))
@@ -648,3 +744,306 @@ def test_no_cross_visibility_between_tutors_and_admins(auth_client, client, sess
     assert r.status_code == 200
     data = r.json()
     assert len(data) == 0  # Should see no students
+
+
+def test_get_student_changes(auth_client: AuthenticatedTestClient, session: Session, monkeypatch):
+    """Test syncing student changes since a cursor, including deletions"""
+    # Without an overlap only changes at or after the cursor are sent
+    monkeypatch.setattr(settings, 'change_feed_overlap_seconds', 0)
+    client = Client(
+        first_name='John',
+        last_name='Doe',
+        email='john.doe@example.com',
+        phone='+1234567890',
+    )
+    session.add(client)
+    session.commit()
+
+    students = [
+        Student(
+            client_id=client.id,
+            first_name=name,
+            last_name='Smith',
+            email=f'{name.lower()}.smith@example.com',
+            phone='+1111111111',
+            grade='10th Grade',
+        )
+        for name in ('Alice', 'Bob', 'Carol')
+    ]
+    lesson = Lesson(
+        start_dt=datetime(2024, 1, 15, 14, 0, tzinfo=timezone.utc),
+        end_dt=datetime(2024, 1, 15, 15, 0, tzinfo=timezone.utc),
+        subject='Mathematics',
+        topic='Algebra',
+        notes='Math lesson',
+    )
+    session.add_all([*students, lesson])
+    session.commit()
+    for student in students:
+        session.add(TutorStudent(tutor_id=auth_client.user.id, student_id=student.id))
+    session.add(LessonStudent(lesson_id=lesson.id, student_id=students[1].id))
+    session.commit()
+
+    r = auth_client.get(auth_client.app.url_path_for('get_student_changes'))
+    assert r.status_code == 200, r.json()
+    data = r.json()
+    assert [student['first_name'] for student in data['students']] == ['Alice', 'Bob', 'Carol']
+    cursor = data['cursor']
+
+    r = auth_client.put(
+        auth_client.app.url_path_for('update_student', student_id=students[0].id), json={'first_name': 'Alicia'}
+    )
+    assert r.status_code == 200, r.json()
+    r = auth_client.delete(auth_client.app.url_path_for('delete_student', student_id=students[1].id))
+    assert r.status_code == 200, r.json()
+
+    r = auth_client.get(auth_client.app.url_path_for('get_student_changes'), params={'since': cursor})
+    assert r.status_code == 200, r.json()
+    data = r.json()
+    # Carol was stamped at the cursor, so is sent again
+    assert [student['first_name'] for student in data['students']] == ['Alicia', 'Carol']
+    assert data['deleted_ids'] == [students[1].id]
+    assert data['cursor'] > cursor
+
+    # The lesson the deleted student was in is marked as changed
+    session.expire_all()
+    assert session.get(Lesson, lesson.id).updated_at is not None
+
+    # Joining a lesson changes lessons_completed, so the student is sent again
+    cursor = data['cursor']
+    lesson_data = {
+        'start_dt': '2024-01-16T14:00:00Z',
+        'end_dt': '2024-01-16T15:00:00Z',
+        'subject': 'Mathematics',
+        'topic': 'Geometry',
+        'notes': 'Math lesson',
+        'student_ids': [students[2].id],
+    }
+    r = auth_client.post(auth_client.app.url_path_for('create_lesson'), json=lesson_data)
+    assert r.status_code == 200, r.json()
+    r = auth_client.get(auth_client.app.url_path_for('get_student_changes'), params={'since': cursor})
+    assert [(student['first_name'], student['lessons_completed']) for student in r.json()['students']] == [('Carol', 1)]
+
+
+def test_get_students_etag(auth_client: AuthenticatedTestClient, session: Session):
+    """Test student reads answer 304 Not Modified until the students or their lesson counts change"""
+    client = Client(
+        first_name='John',
+        last_name='Doe',
+        email='john.doe@example.com',
+        phone='+1234567890',
+    )
+    session.add(client)
+    session.commit()
+    student = Student(
+        client_id=client.id,
+        first_name='Alice',
+        last_name='Smith',
+        email='alice.smith@example.com',
+        phone='+1111111111',
+        grade='10th Grade',
+    )
+    session.add(student)
+    session.commit()
+    session.add(TutorStudent(tutor_id=auth_client.user.id, student_id=student.id))
+    session.commit()
+
+    url = auth_client.app.url_path_for('get_students')
+    r = auth_client.get(url)
+    assert r.status_code == 200, r.json()
+    etag = r.headers['etag']
+    r = auth_client.get(url, headers={'If-None-Match': etag})
+    assert r.status_code == 304
+    assert r.content == b''
+
+    student_url = auth_client.app.url_path_for('get_student', student_id=student.id)
+    r = auth_client.get(student_url)
+    assert r.status_code == 200, r.json()
+    student_etag = r.headers['etag']
+    r = auth_client.get(student_url, headers={'If-None-Match': student_etag})
+    assert r.status_code == 304
+
+    # Adding the student to a lesson changes lessons_completed, and so the ETag
+    lesson_data = {
+        'start_dt': '2024-01-15T14:00:00Z',
+        'end_dt': '2024-01-15T15:00:00Z',
+        'subject': 'Mathematics',
+        'topic': 'Algebra',
+        'notes': 'Math lesson',
+        'student_ids': [student.id],
+    }
+    r = auth_client.post(auth_client.app.url_path_for('create_lesson'), json=lesson_data)
+    assert r.status_code == 200, r.json()
+    r = auth_client.get(url, headers={'If-None-Match': etag})
+    assert r.status_code == 200, r.json()
+    assert r.json()[0]['lessons_completed'] == 1
+    etag = r.headers['etag']
+    r = auth_client.get(student_url, headers={'If-None-Match': student_etag})
+    assert r.status_code == 200, r.json()
+
+    r = auth_client.put(
+        auth_client.app.url_path_for('update_student', student_id=student.id), json={'first_name': 'Alicia'}
+    )
+    assert r.status_code == 200, r.json()
+    r = auth_client.get(url, headers={'If-None-Match': etag})
+    assert r.status_code == 200, r.json()
+    assert r.json()[0]['first_name'] == 'Alicia'
+
+
+def test_get_student_etag_company_changed(auth_client: AuthenticatedTestClient, session: Session):
+    """Test the student ETag changes when the company's name changes"""
+    client = Client(first_name='John', last_name='Doe', email='john.doe@example.com', phone='+1234567890')
+    company = Company(name='Test Company', tc_id='123', tutorcruncher_domain='https://test.tutorcruncher.com')
+    session.add_all([client, company])
+    session.commit()
+    student = Student(
+        client_id=client.id,
+        company_id=company.id,
+        first_name='Alice',
+        last_name='Smith',
+        email='alice.smith@example.com',
+        phone='+1111111111',
+        grade='10th Grade',
+    )
+    session.add(student)
+    session.commit()
+    session.add(TutorStudent(tutor_id=auth_client.user.id, student_id=student.id))
+    session.commit()
+
+    url = auth_client.app.url_path_for('get_student', student_id=student.id)
+    r = auth_client.get(url)
+    assert r.status_code == 200, r.json()
+    etag = r.headers['etag']
+
+    company.name = 'Renamed Company'
+    company.updated_at = datetime(2030, 1, 1)
+    session.add(company)
+    session.commit()
+    r = auth_client.get(url, headers={'If-None-Match': etag})
+    assert r.status_code == 200, r.json()
+    assert r.json()['company_name'] == 'Renamed Company'
+
+
+def test_student_responses_match_student_read(auth_client: AuthenticatedTestClient, session: Session):
+    """Test students built without StudentRead still serialize exactly as StudentRead would"""
+    client = Client(first_name='John', last_name='Doe', email='john.doe@example.com', phone='+1234567890')
+    session.add(client)
+    session.commit()
+    student_data = {
+        'client_id': client.id,
+        'first_name': 'Alice',
+        'last_name': 'Smith',
+        'email': 'alice.smith@example.com',
+        'phone': '+1111111111',
+        'grade': '10th Grade',
+        'strengths': ['Reading'],
+    }
+    r = auth_client.post(auth_client.app.url_path_for('create_student'), json=student_data)
+    assert r.status_code == 200, r.json()
+    assert r.json() == StudentRead.model_validate(r.json()).model_dump(mode='json')
+    session.add(TutorStudent(tutor_id=auth_client.user.id, student_id=r.json()['id']))
+    session.commit()
+
+    r = auth_client.get(auth_client.app.url_path_for('get_students'))
+    assert r.status_code == 200, r.json()
+    assert r.json() == [StudentRead.model_validate(student).model_dump(mode='json') for student in r.json()]
+    assert r.json()[0]['lessons_completed'] == 0
+
+
+def test_get_students_by_tag(auth_client: AuthenticatedTestClient, session: Session):
+    """Test students are filtered by their strengths and weaknesses, which stay indexed as they're updated"""
+    client = Client(first_name='John', last_name='Doe', email='john.doe@example.com', phone='+1234567890')
+    session.add(client)
+    session.commit()
+
+    student_ids = []
+    for first_name, strengths, weaknesses in [
+        ('Alice', ['Algebra', 'Reading'], ['Geometry']),
+        ('Bob', ['Geometry'], ['Algebra']),
+        ('Carol', [], []),
+    ]:
+        r = auth_client.post(
+            auth_client.app.url_path_for('create_student'),
+            json={
+                'client_id': client.id,
+                'first_name': first_name,
+                'last_name': 'Smith',
+                'email': f'{first_name.lower()}@example.com',
+                'phone': '+1111111111',
+                'grade': '10th Grade',
+                'strengths': strengths,
+                'weaknesses': weaknesses,
+            },
+        )
+        assert r.status_code == 200, r.json()
+        assert r.json()['strengths'] == strengths
+        student_ids.append(r.json()['id'])
+    session.add_all(TutorStudent(tutor_id=auth_client.user.id, student_id=student_id) for student_id in student_ids)
+    session.commit()
+
+    url = auth_client.app.url_path_for('get_students')
+
+    def first_names(**params) -> list[str]:
+        r = auth_client.get(url, params=params)
+        assert r.status_code == 200, r.json()
+        return [student['first_name'] for student in r.json()]
+
+    assert first_names(tag='Algebra') == ['Alice', 'Bob']
+    assert first_names(tag='Algebra', tag_kind='strengths') == ['Alice']
+    assert first_names(tag=['Algebra', 'Reading']) == ['Alice']
+    assert first_names(tag='Chemistry') == []
+
+    # Strengths and weaknesses can't be updated, so updates leave the tags as they were
+    r = auth_client.put(auth_client.app.url_path_for('update_student', student_id=student_ids[1]), json={'grade': '11'})
+    assert r.status_code == 200, r.json()
+    assert first_names(tag='Geometry') == ['Alice', 'Bob']
+
+
+def test_get_student_analytics(auth_client: AuthenticatedTestClient, session: Session):
+    """Test a student's analytics, which are only available to users who can see the student"""
+    client = Client(first_name='John', last_name='Doe', email='john.doe@example.com', phone='+1234567890')
+    session.add(client)
+    session.commit()
+    student = Student(
+        client_id=client.id,
+        first_name='Alice',
+        last_name='Smith',
+        email='alice@example.com',
+        phone='+1111111111',
+        grade='10th Grade',
+    )
+    session.add(student)
+    session.commit()
+    url = auth_client.app.url_path_for('get_student_analytics', student_id=student.id)
+
+    r = auth_client.get(url)
+    assert r.status_code == 404, r.json()
+    assert r.json() == {'detail': 'Student not found'}
+
+    session.add(TutorStudent(tutor_id=auth_client.user.id, student_id=student.id))
+    session.commit()
+    r = auth_client.get(url)
+    assert r.status_code == 200, r.json()
+    assert r.json() == {'student_id': student.id, 'lessons': 0, 'duration': None, 'cadence': None, 'skill_pairs': []}
+
+    # The 1st and 3rd of January 2024 were a Monday and a Wednesday
+    for day, minutes in [(1, 60), (3, 30)]:
+        lesson = Lesson(
+            start_dt=datetime(2024, 1, day, 14),
+            end_dt=datetime(2024, 1, day, 14) + timedelta(minutes=minutes),
+            subject='Mathematics',
+            topic='Fractions',
+            notes='Math lesson',
+        )
+        session.add(lesson)
+        session.commit()
+        session.add(LessonStudent(lesson_id=lesson.id, student_id=student.id))
+    session.commit()
+
+    r = auth_client.get(url)
+    assert r.status_code == 200, r.json()
+    data = r.json()
+    assert data['lessons'] == 2
+    assert data['duration']['mean'] == 45
+    assert data['cadence']['active_weeks'] == 1
+    assert data['cadence']['weekday_counts'] == [1, 0, 1, 0, 0, 0, 0]
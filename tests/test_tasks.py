@@ -0,0 +1,491 @@
+import json
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pytest
+from celery import Celery
+from sqlmodel import Session, select
+
+from app.core import monitoring
+from app.core.analytics import LessonData, compute_analytics
+from app.core.cache import InMemoryCache
+from app.core.celery_app import broker_config, celery_app
+from app.core.config import settings
+from app.core.tags import backfill_tags
+from app.core.task_metrics import PUBLISHED_AT_HEADER
+from app.models import Client, Company, Lesson, LessonReminder, LessonStatus, LessonStudent, Student
+from app.models.utils import utc_now
+from app.tasks import analytics_tasks
+from app.tasks.analytics_tasks import (
+    build_student_report,
+    build_student_reports,
+    generate_company_report,
+    generate_student_report,
+    get_company_report_progress,
+)
+from app.tasks.email_tasks import dispatch_lesson_reminders, send_lesson_reminder
+from app.tasks.monitoring_tasks import sample_queue_depths
+
+
+def _create_student_lessons(session: Session) -> Student:
+    client = Client(first_name='John', last_name='Doe', email='john.doe@example.com', phone='+1234567890')
+    session.add(client)
+    session.commit()
+    students = [
+        Student(
+            client_id=client.id,
+            first_name=name,
+            last_name='Smith',
+            email=f'{name.lower()}@example.com',
+            phone='+1111111111',
+            grade='10th Grade',
+        )
+        for name in ('Alice', 'Bob')
+    ]
+    session.add_all(students)
+    session.commit()
+
+    start = datetime(2024, 1, 1, 14)
+    lesson_data = [
+        (60, LessonStatus.COMPLETE, ['fractions', 'decimals'], ['persistence'], ['checking work']),
+        (30, LessonStatus.COMPLETE, ['fractions'], ['persistence'], []),
+        (45, LessonStatus.PLANNED, ['graphs', 'fractions'], [], ['checking work']),
+    ]
+    lessons = [
+        Lesson(
+            start_dt=start + timedelta(days=7 * i),
+            end_dt=start + timedelta(days=7 * i, minutes=minutes),
+            subject='Mathematics',
+            topic=f'Topic {i}',
+            notes='Math lesson',
+            status=status,
+            skills_practiced=skills,
+            student_strengths_observed=strengths,
+            student_weaknesses_observed=weaknesses,
+        )
+        for i, (minutes, status, skills, strengths, weaknesses) in enumerate(lesson_data)
+    ]
+    # Bob's lesson isn't part of Alice's report
+    other_lesson = Lesson(
+        start_dt=start,
+        end_dt=start + timedelta(hours=2),
+        subject='Physics',
+        topic='Forces',
+        notes='Physics lesson',
+        skills_practiced=['vectors'],
+    )
+    session.add_all([*lessons, other_lesson])
+    session.commit()
+    session.add_all(LessonStudent(lesson_id=lesson.id, student_id=students[0].id) for lesson in lessons)
+    session.add(LessonStudent(lesson_id=other_lesson.id, student_id=students[1].id))
+    session.commit()
+    backfill_tags(session)
+    return students[0]
+
+
+def test_build_student_report(session: Session, statements: list[str]):
+    """Test a student's report is built from a few aggregate queries"""
+    student = _create_student_lessons(session)
+    statements.clear()
+
+    report = build_student_report(session, student.id)
+    assert len(statements) == 5
+    assert report == {
+        'student_id': student.id,
+        'total_lessons': 3,
+        'average_duration': 45.0,
+        'status_breakdown': {'complete': 2, 'planned': 1},
+        'most_practiced_skills': [
+            {'name': 'fractions', 'count': 3, 'first_seen': '2024-01-01T14:00:00', 'last_seen': '2024-01-15T14:00:00'},
+            {'name': 'decimals', 'count': 1, 'first_seen': '2024-01-01T14:00:00', 'last_seen': '2024-01-01T14:00:00'},
+            {'name': 'graphs', 'count': 1, 'first_seen': '2024-01-15T14:00:00', 'last_seen': '2024-01-15T14:00:00'},
+        ],
+        'strengths_observed': [
+            {'name': 'persistence', 'count': 2, 'first_seen': '2024-01-01T14:00:00', 'last_seen': '2024-01-08T14:00:00'}
+        ],
+        'weaknesses_observed': [
+            {
+                'name': 'checking work',
+                'count': 2,
+                'first_seen': '2024-01-01T14:00:00',
+                'last_seen': '2024-01-15T14:00:00',
+            }
+        ],
+        'analytics': {
+            'lessons': 3,
+            'duration': {'mean': 45.0, 'min': 30.0, 'max': 60.0, 'p25': 37.5, 'p50': 45.0, 'p75': 52.5, 'p90': 57.0},
+            'cadence': {
+                'active_weeks': 3,
+                'lessons_per_active_week': 1.0,
+                'longest_gap_weeks': 0,
+                'weekday_counts': [3, 0, 0, 0, 0, 0, 0],
+            },
+            'skill_pairs': [
+                {'tags': ['decimals', 'fractions'], 'count': 1},
+                {'tags': ['fractions', 'graphs'], 'count': 1},
+            ],
+        },
+        'last_updated': report['last_updated'],
+        'generated_at': report['generated_at'],
+    }
+
+
+def test_build_student_report_no_lessons(session: Session):
+    client = Client(first_name='John', last_name='Doe', email='john.doe@example.com', phone='+1234567890')
+    session.add(client)
+    session.commit()
+    student = Student(
+        client_id=client.id,
+        first_name='Alice',
+        last_name='Smith',
+        email='alice@example.com',
+        phone='+1111111111',
+        grade='10th Grade',
+    )
+    session.add(student)
+    session.commit()
+
+    report = build_student_report(session, student.id)
+    assert report['total_lessons'] == 0
+    assert report['average_duration'] == 0
+    assert report['status_breakdown'] == {}
+    assert report['most_practiced_skills'] == []
+    assert report['last_updated'] is None
+
+
+def test_build_student_report_cached(session: Session, statements: list[str]):
+    """Test a report is served from the cache until one of the student's lessons changes"""
+    student = _create_student_lessons(session)
+    cache = InMemoryCache()
+    report = build_student_report(session, student.id, cache=cache)
+
+    statements.clear()
+    assert build_student_report(session, student.id, cache=cache) == report
+    # Only the query for the latest change is run
+    assert len(statements) == 1
+
+    lesson = session.get(Lesson, 1)
+    lesson.status = LessonStatus.CANCELLED
+    lesson.updated_at = utc_now()
+    session.commit()
+    updated = build_student_report(session, student.id, cache=cache)
+    assert updated['status_breakdown'] == {'cancelled': 1, 'complete': 1, 'planned': 1}
+    assert updated['generated_at'] > report['generated_at']
+
+    # Removing a lesson changes the count, even though the latest change is the same
+    session.delete(session.get(Lesson, 2))
+    session.commit()
+    assert build_student_report(session, student.id, cache=cache)['total_lessons'] == 2
+
+
+def test_build_student_reports(session: Session, statements: list[str]):
+    """Test the reports for many students are built with the same few queries as for one"""
+    alice = _create_student_lessons(session)
+    bob = session.get(Student, alice.id + 1)
+    statements.clear()
+
+    reports = build_student_reports(session, [alice.id, bob.id, 999])
+    assert len(statements) == 4
+    alice_report = build_student_report(session, alice.id)
+    assert reports[alice.id] == {
+        key: value for key, value in alice_report.items() if key not in ('last_updated', 'generated_at')
+    }
+    assert reports[bob.id]['total_lessons'] == 1
+    assert reports[bob.id]['average_duration'] == 120
+    assert reports[bob.id]['most_practiced_skills'][0]['name'] == 'vectors'
+    assert reports[999]['total_lessons'] == 0
+    assert reports[999]['analytics'] == {'lessons': 0, 'duration': None, 'cadence': None, 'skill_pairs': []}
+
+
+def test_compute_analytics():
+    """Test each student's analytics are computed from their slice of the arrays"""
+    day = 86400
+    # 2024-01-01, a Monday
+    monday = 1704067200
+    data = LessonData(
+        student_ids=np.array([1, 1, 1, 2]),
+        # Student 1 has lessons on a Monday, the Wednesday of the same week and a Friday three weeks later
+        starts=np.array([monday, monday + 2 * day, monday + 25 * day, monday], dtype=np.float64),
+        durations=np.array([60, 90, 30, 45], dtype=np.float64),
+        tag_student_ids=np.array([1, 1, 1, 1, 1, 1, 2]),
+        tag_lesson_ids=np.array([10, 10, 10, 11, 11, 12, 13]),
+        tag_ids=np.array([3, 2, 1, 3, 2, 1, 1]),
+        tag_names={1: 'graphs', 2: 'fractions', 3: 'decimals'},
+    )
+    results = compute_analytics(data, top_pairs=2)
+    assert results[1]['lessons'] == 3
+    assert results[1]['duration']['p50'] == 60
+    assert results[1]['duration']['max'] == 90
+    assert results[1]['cadence'] == {
+        'active_weeks': 2,
+        'lessons_per_active_week': 1.5,
+        'longest_gap_weeks': 2,
+        'weekday_counts': [1, 0, 1, 0, 1, 0, 0],
+    }
+    assert results[1]['skill_pairs'] == [
+        {'tags': ['decimals', 'fractions'], 'count': 2},
+        {'tags': ['decimals', 'graphs'], 'count': 1},
+    ]
+    assert results[2]['lessons'] == 1
+    assert results[2]['cadence']['longest_gap_weeks'] == 0
+    assert results[2]['skill_pairs'] == []
+
+
+def test_generate_company_report(session: Session, tmp_path, monkeypatch, celery_tasks: Celery):
+    """Test a company's students are reported on in chunks by a chord, written to a single artifact"""
+    company = Company(name='Test Company')
+    session.add(company)
+    session.commit()
+    alice = _create_student_lessons(session)
+    students = session.exec(select(Student)).all()
+    for student in students:
+        student.company_id = company.id
+    session.commit()
+    # A student of another company
+    other = Student(
+        client_id=alice.client_id,
+        first_name='Carol',
+        last_name='Smith',
+        email='carol@example.com',
+        phone='+1111111111',
+        grade='10th Grade',
+    )
+    session.add(other)
+    session.commit()
+
+    monkeypatch.setattr(settings, 'report_artifact_dir', str(tmp_path))
+    monkeypatch.setattr(settings, 'report_chunk_size', 1)
+
+    result = generate_company_report.delay(company.id)
+    job = result.get()
+    assert job == {'job_id': result.id, 'company_id': company.id, 'students': 2, 'chunks': 2}
+
+    progress = get_company_report_progress(result.id)
+    assert progress['status'] == 'complete'
+    assert progress['chunks_done'] == 2
+    assert progress['progress'] == 1
+    assert progress['runtime'] >= 0
+    artifact = json.loads(Path(progress['artifact']).read_text())
+    assert artifact['company_id'] == company.id
+    assert [report['student_id'] for report in artifact['reports']] == [student.id for student in students]
+    assert artifact['reports'][0]['total_lessons'] == 3
+    assert list(tmp_path.iterdir()) == [Path(progress['artifact'])]
+
+    assert get_company_report_progress('unknown') is None
+
+
+def test_generate_company_report_no_students(session: Session, tmp_path, monkeypatch, celery_tasks: Celery):
+    company = Company(name='Test Company')
+    session.add(company)
+    session.commit()
+
+    monkeypatch.setattr(settings, 'report_artifact_dir', str(tmp_path))
+
+    result = generate_company_report.delay(company.id)
+    assert result.get()['chunks'] == 0
+    progress = get_company_report_progress(result.id)
+    assert progress['status'] == 'complete'
+    assert progress['progress'] == 1
+    assert json.loads(Path(progress['artifact']).read_text())['reports'] == []
+
+
+def _create_upcoming_lessons(session: Session) -> list[Student]:
+    client = Client(first_name='John', last_name='Doe', email='john.doe@example.com', phone='+1234567890')
+    session.add(client)
+    session.commit()
+    students = [
+        Student(
+            client_id=client.id,
+            first_name=name,
+            last_name='Smith',
+            email=f'{name.lower()}@example.com',
+            phone='+1111111111',
+            grade='10th Grade',
+        )
+        for name in ('Alice', 'Bob', 'Carol')
+    ]
+    session.add_all(students)
+    session.commit()
+
+    now = utc_now()
+    lessons = [
+        # Alice's two lessons tomorrow are sent in one email
+        (now + timedelta(hours=3), LessonStatus.PLANNED, [0]),
+        (now + timedelta(hours=20), LessonStatus.PLANNED, [0, 1]),
+        # Not within the next day, cancelled or already started
+        (now + timedelta(hours=30), LessonStatus.PLANNED, [0, 1]),
+        (now + timedelta(hours=4), LessonStatus.CANCELLED, [2]),
+        (now - timedelta(hours=1), LessonStatus.PLANNED, [2]),
+    ]
+    for i, (start, status, student_indexes) in enumerate(lessons):
+        lesson = Lesson(
+            start_dt=start,
+            end_dt=start + timedelta(hours=1),
+            subject='Mathematics',
+            topic=f'Topic {i}',
+            notes='Math lesson',
+            status=status,
+        )
+        session.add(lesson)
+        session.commit()
+        session.add_all(LessonStudent(lesson_id=lesson.id, student_id=students[j].id) for j in student_indexes)
+    session.commit()
+    return students
+
+
+def test_dispatch_lesson_reminders(session: Session, smtp_server, celery_tasks: Celery):
+    """Test each student gets one email for their lessons in the next day, sent once over a single connection"""
+    alice, bob, _ = _create_upcoming_lessons(session)
+
+    assert dispatch_lesson_reminders.delay().get() == {'reminders': 2, 'sent': 2}
+    assert sorted(message.rcpt_tos[0] for message in smtp_server.messages) == ['alice@example.com', 'bob@example.com']
+    assert len(set(smtp_server.peers)) == 1
+
+    alice_email = next(m.content.decode() for m in smtp_server.messages if m.rcpt_tos == ['alice@example.com'])
+    assert 'Subject: Reminder: 2 upcoming lessons' in alice_email
+    assert 'Topic 0' in alice_email and 'Topic 1' in alice_email
+    assert 'Topic 2' not in alice_email
+    reminders = session.exec(select(LessonReminder.lesson_id, LessonReminder.student_id)).all()
+    assert sorted(reminders) == [(1, alice.id), (2, alice.id), (2, bob.id)]
+
+    # Reminders aren't sent again
+    assert dispatch_lesson_reminders.delay().get() == {'reminders': 0, 'sent': 0}
+    assert len(smtp_server.messages) == 2
+
+
+def test_dispatch_lesson_reminders_batches(session: Session, smtp_server, monkeypatch, celery_tasks: Celery):
+    """Test a refused recipient isn't recorded as sent, and each batch uses its own connection"""
+    _create_upcoming_lessons(session)
+    monkeypatch.setattr(settings, 'reminder_batch_size', 1)
+    smtp_server.refuse.add('alice@example.com')
+
+    assert dispatch_lesson_reminders() == {'reminders': 2, 'sent': 1}
+    assert [message.rcpt_tos for message in smtp_server.messages] == [['bob@example.com']]
+
+    smtp_server.refuse.clear()
+    assert dispatch_lesson_reminders() == {'reminders': 1, 'sent': 1}
+    assert [message.rcpt_tos for message in smtp_server.messages] == [['bob@example.com'], ['alice@example.com']]
+    assert len(set(smtp_server.peers)) == 2
+
+
+def test_task_routing():
+    """Test each family of tasks is sent to its own queue, so reports can't hold up emails"""
+    router = celery_app.amqp.router
+
+    def queue(task_name: str) -> str:
+        return router.route({}, task_name, (), {})['queue'].name
+
+    assert queue(dispatch_lesson_reminders.name) == settings.celery_email_queue
+    assert queue(generate_company_report.name) == settings.celery_reports_queue
+    assert queue('app.tasks.other.task') == settings.celery_default_queue
+    assert generate_company_report.time_limit == settings.celery_report_time_limit
+    assert celery_app.conf.task_acks_late is settings.celery_acks_late
+
+
+def test_task_results(session: Session):
+    """Test reminder results aren't stored, and reports survive the msgpack result serializer"""
+    assert dispatch_lesson_reminders.ignore_result
+    assert send_lesson_reminder.ignore_result
+    assert not generate_student_report.ignore_result
+
+    student = _create_student_lessons(session)
+    report = build_student_report(session, student.id)
+    sizes = {}
+    for serializer in ('json', 'msgpack'):
+        app = Celery('test', backend='redis://localhost')
+        app.conf.update(result_serializer=serializer, result_accept_content=celery_app.conf.result_accept_content)
+        meta = app.backend._get_result_meta(result=report, state='SUCCESS', traceback=None, request=None)
+        encoded = app.backend.encode(meta)
+        assert app.backend.decode_result(encoded)['result'] == report
+        sizes[serializer] = len(encoded)
+    assert sizes['msgpack'] < sizes['json']
+
+
+def test_coalesced_task(session: Session, cache: InMemoryCache, celery_tasks: Celery):
+    """Test a task sent while a run with the same arguments is queued or running gets that run's result"""
+    student = _create_student_lessons(session)
+
+    key = generate_student_report.coalesce_key((student.id,), {})
+    cache.add(key, 'queued-run', ttl=60)
+    result = generate_student_report.delay(student.id)
+    assert result.id == 'queued-run'
+    # Other arguments aren't coalesced with it
+    assert generate_student_report.delay(999).get()['total_lessons'] == 0
+
+    # Once the run finishes the task can be sent again, and the key is removed when it's done
+    cache.delete(key)
+    result = generate_student_report.delay(student.id)
+    assert result.id != 'queued-run'
+    assert result.get()['total_lessons'] == 3
+    assert cache.get(key) is None
+
+
+@pytest.fixture(name='metrics')
+def metrics_fixture(monkeypatch) -> list[tuple[str, float, dict]]:
+    """The metrics recorded while the fixture is active, as (name, value, attributes)"""
+    recorded = []
+
+    class Instrument:
+        def __init__(self, name: str):
+            self.name = name
+
+        def record(self, value, attributes):
+            recorded.append((self.name, value, attributes))
+
+        add = set = record
+
+    monkeypatch.setattr(monitoring, '_instrument', lambda kind, name, unit: Instrument(name))
+    return recorded
+
+
+def test_task_metrics(session: Session, monkeypatch, celery_tasks: Celery, metrics: list):
+    """Test the time a task waited to be run and its runtime are recorded, and its failures counted"""
+    student = _create_student_lessons(session)
+
+    generate_student_report.apply((student.id,), headers={PUBLISHED_AT_HEADER: time.time() - 5})
+    (wait_name, wait, wait_attributes), (runtime_name, runtime, runtime_attributes) = metrics
+    assert wait_name == 'celery.task.queue_wait'
+    assert 5 <= wait < 10
+    assert wait_attributes == {'task': generate_student_report.name, 'queue': 'eager'}
+    assert runtime_name == 'celery.task.runtime'
+    assert 0 < runtime < wait
+    assert runtime_attributes == {'task': generate_student_report.name, 'state': 'SUCCESS'}
+
+    metrics.clear()
+    monkeypatch.setattr(analytics_tasks, 'engine', None)
+    assert generate_student_report.apply((student.id,), throw=False).failed()
+    assert [name for name, _, _ in metrics] == ['celery.task.failures', 'celery.task.runtime']
+    assert metrics[0][2] == {'task': generate_student_report.name, 'exception': 'UnboundExecutionError'}
+    assert metrics[1][2]['state'] == 'FAILURE'
+
+
+def test_sample_queue_depths(metrics: list):
+    """Test the depth of every queue is recorded, including those nothing has been sent to yet"""
+    with celery_app.connection_for_write() as connection:
+        queue = connection.SimpleQueue(settings.celery_reports_queue)
+        for i in range(3):
+            queue.put({'report': i})
+        try:
+            assert sample_queue_depths() == {
+                settings.celery_default_queue: 0,
+                settings.celery_email_queue: 0,
+                settings.celery_reports_queue: 3,
+            }
+        finally:
+            queue.clear()
+            queue.close()
+    assert ('celery.queue.depth', 3, {'queue': settings.celery_reports_queue}) in metrics
+
+
+def test_broker_config():
+    """Test a memory:// redis_url runs tasks eagerly in process, as the tests do"""
+    assert broker_config('redis://redis:6379/0') == {
+        'broker_url': 'redis://redis:6379/0',
+        'result_backend': 'redis://redis:6379/0',
+    }
+    config = broker_config('memory://')
+    assert config['broker_url'] == 'memory://'
+    assert config['task_always_eager']
+    assert celery_app.conf.broker_url == 'memory://'
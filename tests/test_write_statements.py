@@ -0,0 +1,133 @@
+from datetime import datetime, timezone
+
+from sqlmodel import Session
+
+from app.models import Client, Lesson, LessonStudent, LessonTutor, Student, TutorStudent
+from tests.conftest import AuthenticatedTestClient
+
+# Every authenticated request looks up the current user first
+AUTH_STATEMENTS = 1
+
+
+def _create_client_and_students(session: Session, count: int = 2) -> tuple[Client, list[Student]]:
+    client = Client(first_name='John', last_name='Doe', email='john.doe@example.com', phone='+1234567890')
+    session.add(client)
+    session.commit()
+
+    students = [
+        Student(
+            client_id=client.id,
+            first_name=f'Student{i}',
+            last_name='Smith',
+            email=f'student{i}@example.com',
+            phone='+1111111111',
+            grade='10th Grade',
+        )
+        for i in range(count)
+    ]
+    session.add_all(students)
+    session.commit()
+    return client, students
+
+
+def _create_lesson(session: Session, tutor_id: int, students: list[Student]) -> Lesson:
+    lesson = Lesson(
+        start_dt=datetime(2024, 1, 15, 14, 0, tzinfo=timezone.utc),
+        end_dt=datetime(2024, 1, 15, 15, 0, tzinfo=timezone.utc),
+        subject='Mathematics',
+        topic='Algebra',
+        notes='Math lesson',
+    )
+    session.add(lesson)
+    session.commit()
+    session.add_all([LessonStudent(lesson_id=lesson.id, student_id=student.id) for student in students])
+    session.add(LessonTutor(lesson_id=lesson.id, tutor_id=tutor_id))
+    session.commit()
+    # Start from a cold session, as a real request would
+    session.expunge_all()
+    return lesson
+
+
+def test_create_lesson_statements(auth_client: AuthenticatedTestClient, session: Session, statements: list[str]):
+    """
+    Creating a lesson validates students in one query and inserts the lesson and its associations in one flush. The
+    students are marked as changed with a single UPDATE.
+    """
+    _, students = _create_client_and_students(session, count=3)
+    session.expunge_all()
+    statements.clear()
+
+    lesson_data = {
+        'start_dt': '2024-01-15T14:00:00Z',
+        'end_dt': '2024-01-15T15:00:00Z',
+        'subject': 'Mathematics',
+        'topic': 'Algebra',
+        'notes': 'Math lesson',
+        'student_ids': [student.id for student in students],
+    }
+    r = auth_client.post(auth_client.app.url_path_for('create_lesson'), json=lesson_data)
+    assert r.status_code == 200, r.json()
+    assert len(r.json()['students']) == 3
+    assert len(statements) == AUTH_STATEMENTS + 5
+
+
+def test_update_lesson_statements(auth_client: AuthenticatedTestClient, session: Session, statements: list[str]):
+    """
+    Updating a lesson loads it with its students up front and doesn't refresh it after the commit. The lesson's tutors
+    are loaded once for the lesson.updated event.
+    """
+    _, students = _create_client_and_students(session)
+    lesson = _create_lesson(session, auth_client.user.id, students)
+    statements.clear()
+
+    r = auth_client.put(auth_client.app.url_path_for('update_lesson', lesson_id=lesson.id), json={'topic': 'Geometry'})
+    assert r.status_code == 200, r.json()
+    assert r.json()['topic'] == 'Geometry'
+    assert len(r.json()['students']) == 2
+    assert len(statements) == AUTH_STATEMENTS + 5
+
+
+def test_create_student_statements(auth_client: AuthenticatedTestClient, session: Session, statements: list[str]):
+    """Creating a student relies on the database constraints instead of checking the client and email first"""
+    client, _ = _create_client_and_students(session, count=0)
+    session.expunge_all()
+    statements.clear()
+
+    student_data = {
+        'client_id': client.id,
+        'first_name': 'Alice',
+        'last_name': 'Smith',
+        'email': 'alice.smith@example.com',
+        'phone': '+1111111111',
+        'grade': '10th Grade',
+    }
+    r = auth_client.post(auth_client.app.url_path_for('create_student'), json=student_data)
+    assert r.status_code == 200, r.json()
+    assert r.json()['lessons_completed'] == 0
+    assert len(statements) == AUTH_STATEMENTS + 1
+
+
+def test_update_student_statements(auth_client: AuthenticatedTestClient, session: Session, statements: list[str]):
+    """Updating a student doesn't check the email or refresh the student, and marks its lessons with one UPDATE"""
+    _, students = _create_client_and_students(session, count=1)
+    session.add(TutorStudent(tutor_id=auth_client.user.id, student_id=students[0].id))
+    session.commit()
+    session.expunge_all()
+    statements.clear()
+
+    update_data = {'first_name': 'Alicia', 'email': 'alicia.smith@example.com'}
+    r = auth_client.put(auth_client.app.url_path_for('update_student', student_id=students[0].id), json=update_data)
+    assert r.status_code == 200, r.json()
+    assert r.json()['first_name'] == 'Alicia'
+    assert len(statements) == AUTH_STATEMENTS + 4
+
+
+def test_update_me_statements(auth_client: AuthenticatedTestClient, session: Session, statements: list[str]):
+    """Updating the current user is a single UPDATE"""
+    session.expunge_all()
+    statements.clear()
+
+    r = auth_client.put(auth_client.app.url_path_for('update_current_user'), json={'first_name': 'Updated'})
+    assert r.status_code == 200, r.json()
+    assert r.json()['first_name'] == 'Updated'
+    assert len(statements) == AUTH_STATEMENTS + 1